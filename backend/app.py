@@ -1,21 +1,73 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 import base64
+import contextlib
 import gc
-from io import BytesIO
+import json
+import math
 import os
 import re
 import threading
+import time
+import uuid
 
+from werkzeug.exceptions import RequestEntityTooLarge
 from PIL import Image, ImageDraw
 import torch
 from diffusers import (
     StableDiffusionControlNetImg2ImgPipeline,
+    StableDiffusionImg2ImgPipeline,
     StableDiffusionPipeline,
     ControlNetModel,
+    DPMSolverMultistepScheduler,
+    UniPCMultistepScheduler,
 )
 from controlnet_aux import MidasDetector
 
+from batching import BatchScheduler
+from budget_solver import BudgetSolver
+from caches import DepthCache, PromptEmbeddingCache, ResultCache, image_content_hash, result_cache_key
+from catalog import CatalogStore
+from cpu_tuning import ATTENTION_MODES, CPU_TUNING_PROFILES, apply_threads, autocast as cpu_autocast, tune_pipeline
+from encoders import encode as encode_image, negotiate as negotiate_format, parse_quality
+from furniture_matcher import FurnitureMatcher
+from image_store import EXTENSIONS as IMAGE_EXTENSIONS, ImageStore
+from layout_pool import LayoutPool
+from jobs import (
+    CancelRegistry,
+    CancelToken,
+    JobCancelled,
+    JobQueue,
+    QueueFullError,
+    JOB_SUCCEEDED,
+    JOB_FAILED,
+    JOB_CANCELLED,
+)
+from metrics import CounterSet, Histogram, peak_rss_bytes, reset_peak_rss
+from model_registry import ModelRegistry, ModelUnavailable, MODEL_READY, MODEL_FAILED
+from model_store import (
+    VERIFY_CHANGED,
+    VERIFY_MODES,
+    ModelStore,
+    ModelStoreError,
+    checkpoint_to_safetensors,
+    fetch_file,
+    mmap_module,
+)
+from profiles import (
+    InferenceProfile,
+    ProfilePolicy,
+    SCHEDULER_DEFAULT,
+    SCHEDULER_DPMPP,
+    SCHEDULER_UNIPC,
+)
+from progress import FORMAT_SSE, STREAM_FORMATS, ProgressStream
+from residency import PipelineGate, ResidencyManager
+from resolution import BUCKET_MULTIPLE, ResolutionPolicy, bucket_label
+from serving import CpuPool, EndpointLimits
+from upload_decoder import InvalidUpload, UploadTooLarge, decode_upload
+from worker_pool import WorkerPool, WorkerSpec, in_worker_process
+
 app = Flask(__name__)
 CORS(app)
 
@@ -28,6 +80,7 @@ os.makedirs(GENERATED_FOLDER, exist_ok=True)
 # Model Configuration
 MODEL_ID = "SG161222/Realistic_Vision_V5.1_noVAE"
 CONTROLNET_MODEL_ID = "lllyasviel/sd-controlnet-depth"
+DEPTH_MODEL_ID = "lllyasviel/Annotators"
 device = "cuda" if torch.cuda.is_available() else "cpu"
 USE_LOCAL_MODEL = os.environ.get("USE_LOCAL_MODEL", "true").lower() != "false"
 
@@ -142,19 +195,7 @@ FURNITURE_KEYWORDS = [
 
 def detect_furniture_items(prompt):
     """Return canonical furniture keys and matched phrases found in the prompt."""
-    prompt_normalized = normalize_prompt_text(prompt)
-    matched_keys = []
-    matched_phrases = set()
-
-    for item_key, synonyms in FURNITURE_SYNONYMS.items():
-        for synonym in synonyms:
-            pattern = r"(?<!\w)" + re.escape(synonym) + r"(?!\w)"
-            if re.search(pattern, prompt_normalized):
-                matched_keys.append(item_key)
-                matched_phrases.add(synonym)
-                break
-
-    return matched_keys, matched_phrases
+    return furniture_matcher.detect(normalize_prompt_text(prompt))
 
 
 def extract_furniture_items(prompt):
@@ -177,11 +218,66 @@ def enforce_furniture_in_prompt(base_prompt, furniture_items):
 
 
 # ─── IMPROVEMENT 2: ControlNet + Depth Map Pipeline ────────────────
-# Load model only if local mode is enabled
+# Models are loaded on first use (or by the warm-up thread) through
+# model_registry; see the "Model loading" section at the end of the file.
+# MODEL_LOAD_MODE: "background" (default) warms up after startup,
+# "lazy" loads on the first request, "eager" loads before serving.
+MODEL_LOAD_MODE = os.environ.get("MODEL_LOAD_MODE", "background").lower()
 pipe = None
 depth_estimator = None
 
-if USE_LOCAL_MODEL:
+if not USE_LOCAL_MODEL:
+    print("Local model disabled. Demo mode active.")
+
+# ─── Model store ───────────────────────────────────────────────────
+# With MODEL_STORE_DIR set, every model is loaded from the safetensors
+# copies convert_models.py wrote there, memory-mapped so inference workers
+# share one copy of the weights, and nothing is fetched from the network.
+# MODEL_STORE_VERIFY: "changed" (default) re-hashes files whose size or
+# mtime changed since they last matched the manifest, "full" hashes every
+# file on every start, "off" skips the checks.
+MODEL_STORE_DIR = os.environ.get("MODEL_STORE_DIR")
+MODEL_STORE_VERIFY = os.environ.get("MODEL_STORE_VERIFY", VERIFY_CHANGED).lower()
+if MODEL_STORE_VERIFY not in VERIFY_MODES:
+    print(f"Unknown MODEL_STORE_VERIFY '{MODEL_STORE_VERIFY}', falling back to '{VERIFY_CHANGED}'")
+    MODEL_STORE_VERIFY = VERIFY_CHANGED
+model_store = ModelStore(MODEL_STORE_DIR, verify=MODEL_STORE_VERIFY) if MODEL_STORE_DIR else None
+# controlnet_aux's default checkpoint for MidasDetector.from_pretrained.
+MIDAS_CHECKPOINT = "dpt_hybrid-midas-501f0c75.pt"
+MIDAS_WEIGHTS = "dpt_hybrid.safetensors"
+LORA_WEIGHTS = "pytorch_lora_weights.safetensors"
+
+
+def model_source(model_id, dtype=None):
+    """(path or hub id, extra from_pretrained kwargs) to load ``model_id`` from."""
+    if model_store is None:
+        return model_id, {}
+    return model_store.resolve(model_id, dtype), {'local_files_only': True, 'use_safetensors': True}
+
+
+def build_midas_model():
+    # MidasDetector only calls its model, so the DPT network can stand in for MiDaSInference.
+    from controlnet_aux.midas.midas.dpt_depth import DPTDepthModel
+    return DPTDepthModel(path=None, backbone="vitb_rn50_384", non_negative=True)
+
+
+def load_depth_estimator():
+    global depth_estimator
+
+    # Load depth estimator (Midas)
+    print("Loading Midas depth estimator...")
+    if model_store is None:
+        depth_estimator = MidasDetector.from_pretrained(DEPTH_MODEL_ID)
+    else:
+        weights = os.path.join(model_store.resolve(DEPTH_MODEL_ID, torch.float32), MIDAS_WEIGHTS)
+        depth_estimator = MidasDetector(mmap_module(build_midas_model, weights))
+    print("Depth estimator loaded")
+    return depth_estimator
+
+
+def load_design_pipeline():
+    global pipe, design_pipe
+
     print(f"Loading model on {device}...")
     if device == "cpu":
         print("WARNING: Running on CPU will be VERY slow (30-60 seconds per image)")
@@ -191,41 +287,34 @@ if USE_LOCAL_MODEL:
         # RTX 3050 6GB Optimizations
         print("Optimizing for RTX 3050 (6GB VRAM)...")
 
-        my_dtype = torch.float16 if device == "cuda" else torch.float32
-
-        # Load depth estimator (Midas)
-        print("Loading Midas depth estimator...")
-        depth_estimator = MidasDetector.from_pretrained("lllyasviel/Annotators")
-        print("Depth estimator loaded")
+        my_dtype = get_model_dtype()
 
         # Load ControlNet depth model
         print("Loading ControlNet depth model...")
+        source, store_kwargs = model_source(CONTROLNET_MODEL_ID, my_dtype)
         controlnet = ControlNetModel.from_pretrained(
-            CONTROLNET_MODEL_ID,
+            source,
             torch_dtype=my_dtype,
+            **store_kwargs,
         )
         print("ControlNet loaded")
 
         # Load the full pipeline with ControlNet
         print("Loading Stable Diffusion + ControlNet pipeline...")
+        source, store_kwargs = model_source(MODEL_ID, my_dtype)
         pipe = StableDiffusionControlNetImg2ImgPipeline.from_pretrained(
-            MODEL_ID,
+            source,
             controlnet=controlnet,
             torch_dtype=my_dtype,
             low_cpu_mem_usage=True,
             safety_checker=None,
             requires_safety_checker=False,
+            **store_kwargs,
         )
 
         if device == "cuda":
-            # Enable memory optimizations
-            try:
-                pipe.enable_model_cpu_offload()
-                print("Model CPU offload enabled (saves VRAM)")
-            except Exception:
-                pipe = pipe.to(device)
-                print("CPU offload not available, moved to GPU directly")
-
+            # Enable memory optimizations. Components stay on the CPU until
+            # residency_manager moves them in, which replaces model CPU offload.
             try:
                 pipe.enable_xformers_memory_efficient_attention()
                 print("xFormers memory efficient attention enabled")
@@ -246,27 +335,30 @@ if USE_LOCAL_MODEL:
             except Exception:
                 pass
         else:
-            pipe = pipe.to(device)
+            pipe = optimize_pipeline(pipe.to(device), "design")
 
         print(f"Model loaded successfully on {device}")
         print("VRAM usage optimized for 6GB GPU")
 
-    except Exception as e:
-        print(f"Model loading failed: {e}")
+    except Exception:
         print("Make sure you have:")
         print("   1. Installed PyTorch with CUDA support")
         print("   2. Ensure the model files are available locally")
         print("   3. Enough disk space (~7GB for model)")
-        import traceback
-        traceback.print_exc()
-else:
-    print("Local model disabled. Demo mode active.")
+        raise
+
+    register_pipeline_components("design", pipe)
+    design_pipe = pipe
+    return design_pipe
+
 
 THREE_D_MODEL_ID = MODEL_ID
 LAYOUT_MODEL_ID = os.environ.get("LAYOUT_MODEL_ID", "runwayml/stable-diffusion-v1-5")
 FLOORPLAN_LORA_ID = os.environ.get("FLOORPLAN_LORA_ID")
 FLOORPLAN_LORA_WEIGHT_NAME = os.environ.get("FLOORPLAN_LORA_WEIGHT_NAME")
-LAYOUT_IMAGE_SIZE = int(os.environ.get("LAYOUT_IMAGE_SIZE", 512))
+LAYOUT_IMAGES_PER_PROMPT = 4
+LAYOUT_STEPS = 30
+LAYOUT_GUIDANCE = 8.5
 
 # Future fine-tuning will use the CUBI700 sample structure.
 CUBI700_DATASET_HINT = {
@@ -295,11 +387,145 @@ LAYOUT_ROOM_COUNT_MAP = {
     "Villa": "villa-style residential layout with generous circulation",
 }
 
-design_pipe = pipe
+design_pipe = None
 layout_pipe = None
 layout_lora_loaded = False
-active_pipeline_name = "design" if design_pipe is not None else None
-inference_lock = threading.Lock()
+active_pipeline_name = None
+
+# ─── Pipeline residency ────────────────────────────────────────────
+# Components (UNet, VAE, text encoder, ControlNet) are moved on and off
+# the GPU individually; identical components are shared between pipelines.
+PIPELINE_COMPONENT_ROLES = ("unet", "vae", "text_encoder", "controlnet")
+RESIDENCY_BUDGET_MB = os.environ.get("RESIDENCY_BUDGET_MB")
+PIPELINE_MAX_CONSECUTIVE = int(os.environ.get("PIPELINE_MAX_CONSECUTIVE", 4))
+
+
+def default_residency_budget():
+    if RESIDENCY_BUDGET_MB:
+        return int(float(RESIDENCY_BUDGET_MB) * 1024 * 1024)
+    if device == "cuda":
+        # Leave headroom for activations on small cards.
+        return int(torch.cuda.get_device_properties(0).total_memory * 0.6)
+    return None
+
+
+def release_device_memory():
+    gc.collect()
+    if device == "cuda":
+        torch.cuda.empty_cache()
+
+
+residency_manager = ResidencyManager(
+    device,
+    budget_bytes=default_residency_budget(),
+    share_components=os.environ.get("SHARE_PIPELINE_COMPONENTS", "true").lower() != "false",
+    after_evict=release_device_memory,
+)
+inference_gate = PipelineGate(max_consecutive=PIPELINE_MAX_CONSECUTIVE)
+
+# ─── Environment settings ──────────────────────────────────────────
+def read_env_flag(value):
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def read_env_list(name, parse, default=""):
+    """Parsed entries of a comma-separated setting.
+
+    An entry ``parse(entry)`` rejects with ValueError is skipped with a
+    warning instead of failing startup.
+    """
+    values = []
+    for entry in os.environ.get(name, default).split(","):
+        if not entry.strip():
+            continue
+        try:
+            values.append(parse(entry.strip()))
+        except ValueError as exc:
+            print(f"Ignoring {name} entry '{entry.strip()}': {exc}")
+    return values
+
+
+def read_env_mapping(name, parse, default=""):
+    """(key, value) pairs from a comma-separated "key:value" setting.
+
+    ``parse(key, value)`` returns the pair to keep; bad entries are
+    skipped as in read_env_list.
+    """
+    def parse_entry(entry):
+        key, _, value = entry.partition(":")
+        return parse(key.strip(), value.strip())
+
+    return read_env_list(name, parse_entry, default)
+
+
+# ─── CPU tuning ────────────────────────────────────────────────────
+# On CPU, CPU_TUNING_PROFILE ("none", "standard", "bf16", "compiled")
+# picks channels_last weights, bf16 autocast, VAE tiling, the attention
+# implementation and torch.compile of the UNet. CPU_CHANNELS_LAST,
+# CPU_BF16_AUTOCAST, CPU_VAE_TILE_SIZE, CPU_ATTENTION and CPU_COMPILE_UNET
+# override single settings. CPU_THREADS and CPU_INTEROP_THREADS set torch's
+# thread pools when the server starts; inference workers use
+# INFERENCE_WORKER_THREADS instead of CPU_THREADS.
+CPU_TUNING_PROFILE = os.environ.get("CPU_TUNING_PROFILE", "standard").lower()
+if CPU_TUNING_PROFILE not in CPU_TUNING_PROFILES:
+    print(f"Unknown CPU_TUNING_PROFILE '{CPU_TUNING_PROFILE}', falling back to 'standard'")
+    CPU_TUNING_PROFILE = "standard"
+
+CPU_TUNING_OVERRIDES = {}
+for setting, parse in (
+    ("threads", int),
+    ("interop_threads", int),
+    ("channels_last", read_env_flag),
+    ("bf16_autocast", read_env_flag),
+    ("vae_tile_size", int),
+    ("attention", str.lower),
+    ("compile_unet", read_env_flag),
+):
+    value = os.environ.get(f"CPU_{setting.upper()}")
+    if value is None or not value.strip():
+        continue
+    try:
+        CPU_TUNING_OVERRIDES[setting] = parse(value.strip())
+    except ValueError:
+        print(f"Ignoring invalid CPU_{setting.upper()} '{value}'")
+if CPU_TUNING_OVERRIDES.get("attention") not in (None, *ATTENTION_MODES):
+    print(f"Ignoring CPU_ATTENTION '{CPU_TUNING_OVERRIDES.pop('attention')}': modes are {', '.join(ATTENTION_MODES)}")
+cpu_tuning = CPU_TUNING_PROFILES[CPU_TUNING_PROFILE].replace(**CPU_TUNING_OVERRIDES)
+cpu_threads = None
+cpu_tuned_pipelines = {}
+
+
+def apply_cpu_threads(threads=None):
+    """Set this process's torch thread pools; ``threads`` overrides CPU_THREADS.
+
+    Called by serve.py, ``python app.py`` and inference workers, not on
+    import. Without CPU_THREADS / CPU_INTEROP_THREADS torch keeps its defaults.
+    """
+    global cpu_threads
+    if device != "cpu":
+        return None
+    tuning = cpu_tuning if threads is None else cpu_tuning.replace(threads=threads)
+    cpu_threads = apply_threads(tuning)
+    if cpu_threads['error']:
+        print(f"Could not set CPU inter-op threads: {cpu_threads['error']}")
+    return cpu_threads
+
+
+def pipeline_autocast():
+    """Context for one diffusion pipeline call (bf16 autocast when tuned for it)."""
+    if device != "cpu":
+        return contextlib.nullcontext()
+    return cpu_autocast(cpu_tuning)
+
+
+def cpu_tuning_status():
+    if device != "cpu":
+        return None
+    return {
+        'profile': cpu_tuning.to_dict(),
+        'threads': cpu_threads,
+        'pipelines': dict(cpu_tuned_pipelines),
+    }
 
 
 def get_model_dtype():
@@ -325,6 +551,9 @@ def optimize_pipeline(pipeline, pipeline_name):
             print(f"[{pipeline_name}] VAE slicing enabled")
         except Exception:
             pass
+    elif device == "cpu":
+        cpu_tuned_pipelines[pipeline_name] = tune_pipeline(pipeline, cpu_tuning)
+        print(f"[{pipeline_name}] CPU tuning '{cpu_tuning.name}': {cpu_tuned_pipelines[pipeline_name]}")
 
     return pipeline
 
@@ -336,30 +565,28 @@ def move_pipeline(pipeline, target_device):
     pipeline.to(target_device)
 
 
+def register_pipeline_components(pipeline_name, pipeline):
+    """Hand a pipeline's large modules to the residency manager, adopting shared ones."""
+    modules = {
+        role: getattr(pipeline, role)
+        for role in PIPELINE_COMPONENT_ROLES
+        if getattr(pipeline, role, None) is not None
+    }
+    resolved = residency_manager.register_pipeline(pipeline_name, modules)
+    for role, module in resolved.items():
+        if module is not modules[role]:
+            pipeline.register_modules(**{role: module})
+            print(f"[{pipeline_name}] sharing identical {role} with another pipeline")
+
+
 def activate_pipeline(target_name):
+    """Make ``target_name``'s components resident. Call with inference_gate held."""
     global active_pipeline_name
 
     if device != "cuda":
         return
 
-    if target_name == active_pipeline_name:
-        return
-
-    if target_name == "layout":
-        if design_pipe is not None:
-            move_pipeline(design_pipe, "cpu")
-        gc.collect()
-        torch.cuda.empty_cache()
-        if layout_pipe is not None:
-            move_pipeline(layout_pipe, device)
-    elif target_name == "design":
-        if layout_pipe is not None:
-            move_pipeline(layout_pipe, "cpu")
-        gc.collect()
-        torch.cuda.empty_cache()
-        if design_pipe is not None:
-            move_pipeline(design_pipe, device)
-
+    residency_manager.activate(target_name)
     active_pipeline_name = target_name
 
 
@@ -370,14 +597,15 @@ def load_layout_pipeline():
         return None
 
     print("Loading 2D layout model...")
+    source, store_kwargs = model_source(LAYOUT_MODEL_ID, get_model_dtype())
     layout_pipe = StableDiffusionPipeline.from_pretrained(
-        LAYOUT_MODEL_ID,
+        source,
         torch_dtype=get_model_dtype(),
         low_cpu_mem_usage=True,
         safety_checker=None,
-        requires_safety_checker=False
+        requires_safety_checker=False,
+        **store_kwargs,
     )
-    layout_pipe = optimize_pipeline(layout_pipe, "2D")
 
     if device == "cuda":
         move_pipeline(layout_pipe, "cpu")
@@ -388,29 +616,197 @@ def load_layout_pipeline():
         lora_kwargs = {}
         if FLOORPLAN_LORA_WEIGHT_NAME:
             lora_kwargs["weight_name"] = FLOORPLAN_LORA_WEIGHT_NAME
+        lora_source = FLOORPLAN_LORA_ID
+        if model_store is not None:
+            lora_source = model_store.resolve(FLOORPLAN_LORA_ID)
+            lora_kwargs = {"weight_name": LORA_WEIGHTS, "local_files_only": True}
 
-        layout_pipe.load_lora_weights(FLOORPLAN_LORA_ID, **lora_kwargs)
+        layout_pipe.load_lora_weights(lora_source, **lora_kwargs)
         layout_lora_loaded = True
         print(f"Floor plan LoRA loaded from {FLOORPLAN_LORA_ID}")
     else:
         print("Floor plan LoRA not configured. Set FLOORPLAN_LORA_ID to improve 2D outputs.")
 
+    # After the LoRA, which cannot be loaded into a compiled UNet.
+    layout_pipe = optimize_pipeline(layout_pipe, "2D")
+    # Register after the LoRA so patched modules are never shared.
+    register_pipeline_components("layout", layout_pipe)
     return layout_pipe
 
 
-def image_to_base64(image):
-    buffered = BytesIO()
-    image.save(buffered, format="PNG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return f"data:image/png;base64,{img_str}"
+def convert_model_store(force=False):
+    """Write every configured model into MODEL_STORE_DIR, downloading what is not cached yet."""
+    if model_store is None:
+        raise ModelStoreError("MODEL_STORE_DIR is not set")
+    dtype = get_model_dtype()
+
+    def write_pipeline(model_id):
+        def write(directory):
+            StableDiffusionPipeline.from_pretrained(
+                model_id, torch_dtype=dtype, safety_checker=None, requires_safety_checker=False,
+            ).save_pretrained(directory, safe_serialization=True)
+        return write
+
+    def write_controlnet(directory):
+        ControlNetModel.from_pretrained(CONTROLNET_MODEL_ID, torch_dtype=dtype).save_pretrained(
+            directory, safe_serialization=True
+        )
+
+    def write_midas(directory):
+        checkpoint_to_safetensors(fetch_file(DEPTH_MODEL_ID, MIDAS_CHECKPOINT), os.path.join(directory, MIDAS_WEIGHTS))
+
+    def write_lora(directory):
+        source = fetch_file(FLOORPLAN_LORA_ID, FLOORPLAN_LORA_WEIGHT_NAME or LORA_WEIGHTS)
+        checkpoint_to_safetensors(source, os.path.join(directory, LORA_WEIGHTS))
+
+    # MidasDetector always runs in float32.
+    models = [
+        (DEPTH_MODEL_ID, write_midas, torch.float32),
+        (CONTROLNET_MODEL_ID, write_controlnet, dtype),
+        (MODEL_ID, write_pipeline(MODEL_ID), dtype),
+        (LAYOUT_MODEL_ID, write_pipeline(LAYOUT_MODEL_ID), dtype),
+    ]
+    if FLOORPLAN_LORA_ID:
+        models.append((FLOORPLAN_LORA_ID, write_lora, None))
+    for model_id, write, model_dtype in models:
+        started = time.time()
+        if model_store.convert(model_id, write, model_dtype, force=force):
+            print(f"{model_id}: stored in {model_store.path(model_id)} ({time.time() - started:.0f}s)")
+        else:
+            print(f"{model_id}: already in {model_store.path(model_id)}")
+
+
+# ─── Result image delivery ─────────────────────────────────────────
+# Results are stored once and returned as /api/images/<id> URLs. The old
+# base64 data-URL fields are only added when LEGACY_DATA_URLS=true or the
+# request asks for output=data_url. The encoding is negotiated per request
+# (format/quality parameters or the Accept header, see encoders.py) with
+# per-endpoint defaults.
+DESIGN_OUTPUT_FORMAT = os.environ.get("DESIGN_OUTPUT_FORMAT", "png")
+LAYOUT_OUTPUT_FORMAT = os.environ.get("LAYOUT_OUTPUT_FORMAT", "png-palette")
+IMAGE_STORE_MAX_BYTES = int(os.environ.get("IMAGE_STORE_MAX_BYTES", 512 * 1024 * 1024))
+IMAGE_CACHE_MAX_AGE = int(os.environ.get("IMAGE_CACHE_MAX_AGE", 24 * 60 * 60))
+LEGACY_DATA_URLS = os.environ.get("LEGACY_DATA_URLS", "false").lower() == "true"
+OUTPUT_URL = "url"
+OUTPUT_DATA_URL = "data_url"
+OUTPUT_MULTIPART = "multipart"
+
+image_store = ImageStore(os.path.join(GENERATED_FOLDER, "images"), IMAGE_STORE_MAX_BYTES)
+
+
+# ─── Request concurrency ───────────────────────────────────────────
+# CPU-bound pre/post-processing (upload decoding, image encoding) runs on
+# SERVE_CPU_THREADS threads (default: CPU cores; 0 runs it inline).
+# ENDPOINT_CONCURRENCY caps the requests in flight per endpoint, e.g.
+# "generate_room:8,generate_layout:4" (0 removes a cap). A request over its
+# cap waits ENDPOINT_WAIT_SECONDS for a slot, then gets 429. Streamed
+# responses hold their slot until the stream ends.
+SERVE_CPU_THREADS = int(os.environ.get("SERVE_CPU_THREADS", os.cpu_count() or 1))
+
+
+def read_endpoint_limit(endpoint, limit):
+    if not endpoint:
+        raise ValueError("missing endpoint name")
+    limit = int(limit)
+    if limit < 0:
+        raise ValueError("the cap must be 0 or more")
+    return endpoint, limit
+
+
+ENDPOINT_CONCURRENCY = {
+    "generate_room": 8,
+    "generate_layout": 4,
+    "suggest_furniture_batch": 2,
+    "estimate_pricing_batch": 2,
+    **dict(read_env_mapping("ENDPOINT_CONCURRENCY", read_endpoint_limit)),
+}
+ENDPOINT_WAIT_SECONDS = float(os.environ.get("ENDPOINT_WAIT_SECONDS", 0.5))
+
+cpu_pool = CpuPool(SERVE_CPU_THREADS)
+endpoint_limits = EndpointLimits(
+    {name: limit for name, limit in ENDPOINT_CONCURRENCY.items() if limit > 0},
+    wait_seconds=ENDPOINT_WAIT_SECONDS,
+)
+
+
+@app.before_request
+def acquire_endpoint_slot():
+    slot = endpoint_limits.try_acquire(request.endpoint)
+    if slot is None:
+        response = jsonify({'error': 'Too many concurrent requests for this endpoint. Please retry shortly.'})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+    g.endpoint_slot = slot
+
+
+@app.after_request
+def release_endpoint_slot_on_close(response):
+    # A streamed body is still being produced here; release once the server
+    # closes it. Buffered responses release at teardown.
+    if response.is_streamed:
+        slot = g.pop('endpoint_slot', None)
+        if slot is not None:
+            response.call_on_close(slot.release)
+    return response
+
+
+@app.teardown_request
+def release_endpoint_slot(exc):
+    slot = g.pop('endpoint_slot', None)
+    if slot is not None:
+        slot.release()
+
 
+def negotiate_output_format(requested, default, png_variant="png"):
+    """Resolve the output format for the current request; raises ValueError if invalid."""
+    requested = (requested or '').strip().lower() or None
+    return negotiate_format(requested, request.accept_mimetypes, default, png_variant)
 
-def create_demo_layout(total_area, room_count, variant_index):
-    image = Image.new("RGB", (LAYOUT_IMAGE_SIZE, LAYOUT_IMAGE_SIZE), "white")
+
+def to_data_url(data, content_type):
+    return f"data:{content_type};base64,{base64.b64encode(data).decode()}"
+
+
+def publish_image(image, output=OUTPUT_URL, image_format="png", image_quality=None):
+    """Store an encoded result and return its URL (plus a data URL when requested)."""
+    data, content_type = cpu_pool.run(encode_image, image, image_format, image_quality)
+    published = {'url': f"/api/images/{image_store.put(data, content_type)}"}
+    if LEGACY_DATA_URLS or output == OUTPUT_DATA_URL:
+        published['data_url'] = cpu_pool.run(to_data_url, data, content_type)
+    return published
+
+
+def multipart_response(metadata, images, image_format="png", image_quality=None):
+    """Stream a JSON metadata part followed by raw image parts (multipart/mixed)."""
+    boundary = uuid.uuid4().hex
+
+    def generate():
+        yield f"--{boundary}\r\nContent-Type: application/json\r\n\r\n".encode()
+        yield json.dumps(metadata).encode()
+        for index, image in enumerate(images):
+            data, content_type = cpu_pool.run(encode_image, image, image_format, image_quality)
+            filename = f"layout-{index + 1}{IMAGE_EXTENSIONS[content_type]}"
+            yield (
+                f"\r\n--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Disposition: attachment; filename=\"{filename}\"\r\n"
+                f"Content-Length: {len(data)}\r\n\r\n"
+            ).encode()
+            yield data
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    return Response(generate(), mimetype=f"multipart/mixed; boundary={boundary}")
+
+
+DEMO_LAYOUT_SIZE = 512
+
+
+def create_demo_layout(total_area, room_count, variant_index, size=None):
+    image = Image.new("RGB", (DEMO_LAYOUT_SIZE, DEMO_LAYOUT_SIZE), "white")
     draw = ImageDraw.Draw(image)
     padding = 32
-    width = LAYOUT_IMAGE_SIZE
-    height = LAYOUT_IMAGE_SIZE
+    width = DEMO_LAYOUT_SIZE
+    height = DEMO_LAYOUT_SIZE
     draw.rectangle((padding, padding, width - padding, height - padding), outline="black", width=7)
 
     base_variants = [
@@ -459,6 +855,8 @@ def create_demo_layout(total_area, room_count, variant_index):
         meta_text = f"{meta_text} | {room_count}"
     draw.text((padding + 12, height - padding - 24), meta_text, fill="black")
     draw.text((width - padding - 92, padding + 12), f"Plan {variant_index + 1}", fill="black")
+    if size is not None and tuple(size) != image.size:
+        image = image.resize(size, Image.Resampling.LANCZOS)
     return image
 
 
@@ -473,281 +871,152 @@ def build_layout_prompt(total_area, room_count):
     )
 
 
-if USE_LOCAL_MODEL:
-    try:
-        load_layout_pipeline()
-    except Exception as exc:
-        print(f"2D layout model loading failed: {exc}")
-        layout_pipe = None
-
-# Furniture pricing database (in Indian Rupees)
-FURNITURE_PRICES = {
-    'sofa': {'name': 'Modern Sofa', 'price': 45000},
-    'armchair': {'name': 'Armchair', 'price': 18000},
-    'coffee_table': {'name': 'Coffee Table', 'price': 8000},
-    'side_table': {'name': 'Side Table', 'price': 4500},
-    'floor_lamp': {'name': 'Floor Lamp', 'price': 3500},
-    'table_lamp': {'name': 'Table Lamp', 'price': 2000},
-    'bed': {'name': 'Bed', 'price': 35000},
-    'nightstand': {'name': 'Nightstand', 'price': 6000},
-    'bookshelf': {'name': 'Bookshelf', 'price': 9000},
-    'tv_stand': {'name': 'TV Stand', 'price': 12000},
-    'plant': {'name': 'Decorative Plant', 'price': 800},
-    'artificial_plant': {'name': 'Artificial Plant', 'price': 600},
-    'wall_art': {'name': 'Wall Art', 'price': 2500},
-    'rug': {'name': 'Area Rug', 'price': 6500},
-    'dining_table': {'name': 'Dining Table', 'price': 28000},
-    'dining_chair': {'name': 'Dining Chair (set of 4)', 'price': 16000},
-    'desk': {'name': 'Office Desk', 'price': 12000},
-    'office_chair': {'name': 'Office Chair', 'price': 9000},
-    'curtains': {'name': 'Window Curtains', 'price': 3500},
-    'bathtub': {'name': 'Bathtub', 'price': 45000},
-    'shower': {'name': 'Shower', 'price': 12000},
-    'sink': {'name': 'Sink', 'price': 6000},
-    'mirror': {'name': 'Mirror', 'price': 2000},
-    'gas_stove': {'name': 'Gas Stove', 'price': 9000},
-    'kitchen_cabinet': {'name': 'Kitchen Cabinet Set', 'price': 55000},
-    'refrigerator': {'name': 'Refrigerator', 'price': 35000},
-    'dishwasher': {'name': 'Dishwasher', 'price': 32000},
-    'microwave': {'name': 'Microwave Oven', 'price': 9000},
-}
+# ─── Furniture catalog ─────────────────────────────────────────────
+# Items (INR prices), synonyms, purchase links and room priority lists live
+# in a SQLite catalog seeded from catalog_seed.json. Edits made with
+# `python catalog.py import <file>` are picked up without a restart.
+CATALOG_DB = os.environ.get("CATALOG_DB", "catalog.db")
+CATALOG_SEED = os.environ.get("CATALOG_SEED", os.path.join(os.path.dirname(os.path.abspath(__file__)), "catalog_seed.json"))
+CATALOG_CACHE_ENTRIES = int(os.environ.get("CATALOG_CACHE_ENTRIES", 4096))
+CATALOG_RELOAD_SECONDS = float(os.environ.get("CATALOG_RELOAD_SECONDS", 5))
 
-EXTRA_FURNITURE_SYNONYMS = {
-    'sofa': ['sofa', 'couch'],
-    'armchair': ['armchair', 'arm chair'],
-    'coffee_table': ['coffee table'],
-    'side_table': ['side table'],
-    'floor_lamp': ['floor lamp', 'standing lamp'],
-    'table_lamp': ['table lamp', 'desk lamp'],
-    'nightstand': ['nightstand', 'night stand', 'bedside table'],
-    'bookshelf': ['bookshelf', 'book shelf'],
-    'tv_stand': ['tv stand', 'television stand', 'media console', 'tv unit'],
-    'plant': ['plant'],
-    'artificial_plant': ['artificial plant'],
-    'wall_art': ['wall art', 'painting', 'art frame'],
-    'rug': ['rug', 'carpet'],
-    'dining_table': ['dining table'],
-    'dining_chair': ['dining chair'],
-    'office_chair': ['office chair', 'task chair'],
-    'curtains': ['curtain', 'curtains', 'drape', 'drapes', 'window curtain'],
-    'bathtub': ['bathtub', 'bath tub', 'tub'],
-    'gas_stove': ['gas stove', 'stove', 'cooktop', 'range'],
-    'kitchen_cabinet': ['kitchen cabinet', 'cabinets', 'cabinet'],
-    'refrigerator': ['refrigerator', 'fridge'],
-    'microwave': ['microwave', 'microwave oven', 'oven'],
-}
 
+def fallback_purchase_links(furniture_key):
+    """Generic search links for items without stored links"""
+    search_query = furniture_key.replace('_', '+')
+    return {
+        'amazon': f'https://www.amazon.in/s?k={search_query}+furniture',
+        'flipkart': f'https://www.flipkart.com/search?q={search_query}'
+    }
 
-def build_furniture_synonyms():
-    synonyms = {}
-    for item_key in FURNITURE_PRICES.keys():
-        base = item_key.replace('_', ' ')
-        synonyms[item_key] = {base, item_key}
 
-    for item_key, terms in EXTRA_FURNITURE_SYNONYMS.items():
-        synonyms.setdefault(item_key, set()).update(terms)
+catalog = CatalogStore(
+    CATALOG_DB,
+    seed_path=CATALOG_SEED,
+    cache_entries=CATALOG_CACHE_ENTRIES,
+    fallback_links=fallback_purchase_links,
+)
 
-    normalized = {}
-    for item_key, terms in synonyms.items():
-        normalized[item_key] = sorted({normalize_prompt_text(term) for term in terms if term})
 
-    return normalized
+def furniture_synonyms(item_key, terms):
+    """Normalized match phrases for an item: its key, spaced key and synonyms."""
+    phrases = {item_key, item_key.replace('_', ' '), *terms}
+    return sorted({normalize_prompt_text(term) for term in phrases if term})
 
 
-FURNITURE_SYNONYMS = build_furniture_synonyms()
-FURNITURE_KEYWORDS = sorted(
-    set(FURNITURE_KEYWORDS)
-    | {term for terms in FURNITURE_SYNONYMS.values() for term in terms}
-)
+def build_furniture_synonyms():
+    return {item_key: furniture_synonyms(item_key, terms) for item_key, terms in catalog.all_synonyms()}
+
+
+furniture_matcher = FurnitureMatcher(build_furniture_synonyms())
 
-# Purchase links for furniture (Amazon, Flipkart)
-FURNITURE_LINKS = {
-    'sofa': {
-        'amazon': 'https://www.amazon.in/s?k=modern+sofa+3+seater',
-        'flipkart': 'https://www.flipkart.com/search?q=modern+sofa'
-    },
-    'armchair': {
-        'amazon': 'https://www.amazon.in/s?k=armchair+living+room',
-        'flipkart': 'https://www.flipkart.com/search?q=armchair'
-    },
-    'coffee_table': {
-        'amazon': 'https://www.amazon.in/s?k=coffee+table+wooden',
-        'flipkart': 'https://www.flipkart.com/search?q=coffee+table'
-    },
-    'side_table': {
-        'amazon': 'https://www.amazon.in/s?k=side+table+living+room',
-        'flipkart': 'https://www.flipkart.com/search?q=side+table'
-    },
-    'floor_lamp': {
-        'amazon': 'https://www.amazon.in/s?k=floor+lamp+standing',
-        'flipkart': 'https://www.flipkart.com/search?q=floor+lamp'
-    },
-    'table_lamp': {
-        'amazon': 'https://www.amazon.in/s?k=table+lamp+bedside',
-        'flipkart': 'https://www.flipkart.com/search?q=table+lamp'
-    },
-    'bed': {
-        'amazon': 'https://www.amazon.in/s?k=king+size+bed+wooden',
-        'flipkart': 'https://www.flipkart.com/search?q=king+bed'
-    },
-    'nightstand': {
-        'amazon': 'https://www.amazon.in/s?k=nightstand+bedside+table',
-        'flipkart': 'https://www.flipkart.com/search?q=nightstand'
-    },
-    'bookshelf': {
-        'amazon': 'https://www.amazon.in/s?k=bookshelf+wooden',
-        'flipkart': 'https://www.flipkart.com/search?q=bookshelf'
-    },
-    'tv_stand': {
-        'amazon': 'https://www.amazon.in/s?k=tv+stand+unit',
-        'flipkart': 'https://www.flipkart.com/search?q=tv+stand'
-    },
-    'plant': {
-        'amazon': 'https://www.amazon.in/s?k=indoor+plants+natural',
-        'flipkart': 'https://www.flipkart.com/search?q=indoor+plants'
-    },
-    'artificial_plant': {
-        'amazon': 'https://www.amazon.in/s?k=artificial+plants+indoor',
-        'flipkart': 'https://www.flipkart.com/search?q=artificial+plant'
-    },
-    'wall_art': {
-        'amazon': 'https://www.amazon.in/s?k=wall+art+painting',
-        'flipkart': 'https://www.flipkart.com/search?q=wall+art'
-    },
-    'rug': {
-        'amazon': 'https://www.amazon.in/s?k=area+rug+carpet',
-        'flipkart': 'https://www.flipkart.com/search?q=area+rug'
-    },
-    'dining_table': {
-        'amazon': 'https://www.amazon.in/s?k=dining+table+6+seater',
-        'flipkart': 'https://www.flipkart.com/search?q=dining+table'
-    },
-    'dining_chair': {
-        'amazon': 'https://www.amazon.in/s?k=dining+chairs+set+of+4',
-        'flipkart': 'https://www.flipkart.com/search?q=dining+chairs'
-    },
-    'desk': {
-        'amazon': 'https://www.amazon.in/s?k=office+desk+computer+table',
-        'flipkart': 'https://www.flipkart.com/search?q=office+desk'
-    },
-    'office_chair': {
-        'amazon': 'https://www.amazon.in/s?k=office+chair+ergonomic',
-        'flipkart': 'https://www.flipkart.com/search?q=office+chair'
-    },
-    'curtains': {
-        'amazon': 'https://www.amazon.in/s?k=window+curtains+door',
-        'flipkart': 'https://www.flipkart.com/search?q=curtains'
-    },
-    'bathtub': {
-        'amazon': 'https://www.amazon.in/s?k=bathtub+freestanding',
-        'flipkart': 'https://www.flipkart.com/search?q=bathtub'
-    },
-    'shower': {
-        'amazon': 'https://www.amazon.in/s?k=shower+head+bathroom',
-        'flipkart': 'https://www.flipkart.com/search?q=shower+head'
-    },
-    'sink': {
-        'amazon': 'https://www.amazon.in/s?k=bathroom+sink+wash+basin',
-        'flipkart': 'https://www.flipkart.com/search?q=wash+basin'
-    },
-    'mirror': {
-        'amazon': 'https://www.amazon.in/s?k=wall+mirror+bathroom',
-        'flipkart': 'https://www.flipkart.com/search?q=wall+mirror'
-    },
-    'gas_stove': {
-        'amazon': 'https://www.amazon.in/s?k=gas+stove+3+burner',
-        'flipkart': 'https://www.flipkart.com/search?q=gas+stove'
-    },
-    'kitchen_cabinet': {
-        'amazon': 'https://www.amazon.in/s?k=kitchen+cabinet+modular',
-        'flipkart': 'https://www.flipkart.com/search?q=kitchen+cabinet'
-    },
-    'refrigerator': {
-        'amazon': 'https://www.amazon.in/s?k=refrigerator+double+door',
-        'flipkart': 'https://www.flipkart.com/search?q=refrigerator'
-    },
-    'dishwasher': {
-        'amazon': 'https://www.amazon.in/s?k=dishwasher+automatic',
-        'flipkart': 'https://www.flipkart.com/search?q=dishwasher'
-    },
-    'microwave': {
-        'amazon': 'https://www.amazon.in/s?k=microwave+oven',
-        'flipkart': 'https://www.flipkart.com/search?q=microwave+oven'
-    }
-}
 
 def get_purchase_links(furniture_key):
     """Get purchase links for a furniture item"""
-    if furniture_key in FURNITURE_LINKS:
-        return FURNITURE_LINKS[furniture_key]
-    # Generate generic search links for unknown items
-    search_query = furniture_key.replace('_', '+')
+    return catalog.links(furniture_key)
+
+# Extra copies a bundle may include; everything else is capped at one.
+FURNITURE_QUANTITY_LIMITS = {
+    'nightstand': 2,
+    'side_table': 2,
+    'table_lamp': 2,
+    'plant': 3,
+    'wall_art': 3,
+    'dining_chair': 2,
+}
+BUDGET_TOP_K = int(os.environ.get("BUDGET_TOP_K", 3))
+BUDGET_PRICE_UNIT = int(os.environ.get("BUDGET_PRICE_UNIT", 100))
+BUDGET_MAX = int(os.environ.get("BUDGET_MAX", 1_000_000))
+
+budget_solver = BudgetSolver(
+    catalog.skus,
+    catalog.room_items,
+    quantity_limits=FURNITURE_QUANTITY_LIMITS,
+    price_unit=BUDGET_PRICE_UNIT,
+    max_budget=BUDGET_MAX,
+    top_k=BUDGET_TOP_K,
+)
+# Inference workers import this module too but never serve budget requests.
+if not in_worker_process():
+    budget_solver.precompute(catalog.room_types())
+
+
+def reload_catalog():
+    """Apply catalog edits to the matcher and budget tables; returns CatalogChanges or None."""
+    changes = catalog.reload()
+    if not changes:
+        return changes
+    for item_key in changes.updated | changes.removed:
+        furniture_matcher.remove(item_key)
+    for item_key in changes.updated:
+        furniture_matcher.add(item_key, furniture_synonyms(item_key, catalog.synonyms(item_key)))
+    budget_solver.invalidate(changes.rooms)
+    print(f"Catalog reloaded: {changes}")
+    return changes
+
+
+def watch_catalog():
+    while True:
+        time.sleep(CATALOG_RELOAD_SECONDS)
+        try:
+            reload_catalog()
+        except Exception as exc:
+            print(f"Catalog reload failed: {exc}")
+
+
+if CATALOG_RELOAD_SECONDS > 0 and not in_worker_process():
+    threading.Thread(target=watch_catalog, name="catalog-reload", daemon=True).start()
+
+
+def format_budget_bundle(bundle, budget):
+    items = []
+    for item in bundle['items']:
+        sku = item['sku']
+        items.append({
+            'name': sku['name'],
+            'key': item['key'],
+            'price': sku['price'] * item['quantity'],
+            'unit_price': sku['price'],
+            'quantity': item['quantity'],
+            'priority': item['priority'],
+            'links': get_purchase_links(item['key'])
+        })
+    remaining_budget = budget - bundle['cost']
     return {
-        'amazon': f'https://www.amazon.in/s?k={search_query}+furniture',
-        'flipkart': f'https://www.flipkart.com/search?q={search_query}'
+        'items': items,
+        'total_cost': bundle['cost'],
+        'remaining_budget': remaining_budget,
+        'budget_utilization': round((bundle['cost'] / budget) * 100, 1) if budget > 0 else 0,
+        'item_count': len(items),
+        'score': bundle['value'],
     }
 
-# Room type priority mapping for budget suggestions
-ROOM_PRIORITIES = {
-    'living_room': [
-        'sofa', 'coffee_table', 'tv_stand', 'rug', 'floor_lamp', 
-        'curtains', 'plant', 'side_table', 'wall_art'
-    ],
-    'bedroom': [
-        'bed', 'nightstand', 'table_lamp', 'rug', 'curtains', 
-        'mirror', 'plant', 'bookshelf'
-    ],
-    'kitchen': [
-        'refrigerator', 'gas_stove', 'kitchen_cabinet', 'microwave', 
-        'sink', 'dishwasher', 'dining_table', 'dining_chair'
-    ],
-    'bathroom': [
-        'bathtub', 'shower', 'sink', 'mirror', 'curtains'
-    ],
-    'office': [
-        'desk', 'office_chair', 'bookshelf', 'floor_lamp', 
-        'plant', 'rug', 'curtains'
-    ],
-    'dining_room': [
-        'dining_table', 'dining_chair', 'rug', 'curtains', 
-        'plant', 'wall_art', 'mirror'
-    ]
-}
 
-def suggest_furniture_by_budget(room_type, budget, room_dimensions=None):
+def suggest_furniture_by_budget(room_type, budget, room_dimensions=None, must_have=(), top_k=None):
     """
     Suggest furniture items based on budget and room type
-    Uses priority-based selection to maximize value
+    Picks the highest-priority bundle that fits (see budget_solver) and
+    returns the runners-up as alternatives
     
     Args:
         room_type: Type of room (living_room, bedroom, etc.)
         budget: Total budget in INR
         room_dimensions: Optional dict with 'length', 'width', 'height' in feet
+        must_have: Item keys every bundle has to include
+        top_k: Number of bundles to return (best + alternatives)
     
     Returns:
-        Dict with suggested items, total cost, and remaining budget
+        Dict with suggested items, total cost, remaining budget and
+        alternative bundles, or None if the must-have items do not fit
     """
     room_type_normalized = room_type.lower().replace(' ', '_')
-    priorities = ROOM_PRIORITIES.get(room_type_normalized, ROOM_PRIORITIES['living_room'])
-    
-    selected = []
-    remaining_budget = budget
-    
-    # Priority items first
-    for item_key in priorities:
-        if item_key in FURNITURE_PRICES:
-            item_info = FURNITURE_PRICES[item_key]
-            price = item_info['price']
-            
-            if price <= remaining_budget:
-                selected.append({
-                    'name': item_info['name'],
-                    'key': item_key,
-                    'price': price,
-                    'priority': 'essential' if priorities.index(item_key) < 4 else 'optional',
-                    'links': get_purchase_links(item_key)
-                })
-                remaining_budget -= price
+    if not catalog.room_items(room_type_normalized):
+        room_type_normalized = 'living_room'
+
+    bundles = budget_solver.solve(room_type_normalized, budget, must_have=must_have, top_k=top_k)
+    if not bundles:
+        return None
+    best, alternatives = bundles[0], bundles[1:]
     
     # Calculate room area if dimensions provided
     area_info = None
@@ -766,19 +1035,16 @@ def suggest_furniture_by_budget(room_type, budget, room_dimensions=None):
                 'size_category': 'small' if area_sqft < 100 else 'medium' if area_sqft < 200 else 'large'
             }
     
-    return {
-        'items': selected,
-        'total_cost': budget - remaining_budget,
-        'remaining_budget': remaining_budget,
-        'budget_utilization': round(((budget - remaining_budget) / budget) * 100, 1) if budget > 0 else 0,
-        'item_count': len(selected),
-        'room_area': area_info
-    }
+    suggestion = format_budget_bundle(best, budget)
+    suggestion['room_area'] = area_info
+    suggestion['alternatives'] = [format_budget_bundle(bundle, budget) for bundle in alternatives]
+    return suggestion
 
-def estimate_furniture_pricing(room_type, style, prompt, uploaded_image=None):
+def estimate_furniture_pricing(room_type, style, prompt, uploaded_image=None, detected=None):
     """
     Estimate furniture items and pricing based ONLY on items explicitly mentioned in the prompt
     Uses very strict matching to avoid false positives
+    ``detected`` may carry a detect_furniture_items() result for the same prompt.
     """
     items = []
     prompt_lower = normalize_prompt_text(prompt)
@@ -787,7 +1053,7 @@ def estimate_furniture_pricing(room_type, style, prompt, uploaded_image=None):
     if not prompt_lower:
         return {'items': [], 'total': 0}
     
-    mentioned_items, matched_keywords = detect_furniture_items(prompt_lower)
+    mentioned_items, matched_keywords = detected or detect_furniture_items(prompt_lower)
     mentioned_items = set(mentioned_items)
 
     if 'artificial_plant' in mentioned_items and 'plant' in mentioned_items:
@@ -795,10 +1061,11 @@ def estimate_furniture_pricing(room_type, style, prompt, uploaded_image=None):
     
     # Build pricing list for known items
     for item_key in sorted(mentioned_items):
-        if item_key in FURNITURE_PRICES:
+        item = catalog.get(item_key)
+        if item is not None:
             items.append({
-                'name': FURNITURE_PRICES[item_key]['name'],
-                'price': FURNITURE_PRICES[item_key]['price'],
+                'name': item['name'],
+                'price': item['price'],
                 'custom': False,
                 'links': get_purchase_links(item_key)
             })
@@ -813,7 +1080,7 @@ def estimate_furniture_pricing(room_type, style, prompt, uploaded_image=None):
             continue
         segment_lower = normalize_prompt_text(original_segment)
         # Skip if this segment already matched a known keyword
-        if any(re.search(r'(?<!\w)' + re.escape(keyword) + r'(?!\w)', segment_lower) for keyword in matched_keywords):
+        if any(match.phrase in matched_keywords for match in furniture_matcher.find(segment_lower)):
             continue
         # Remove filler words
         filtered_words = [w for w in re.split(r'\s+', original_segment) if w and w.lower() not in filler_words]
@@ -845,8 +1112,550 @@ def estimate_furniture_pricing(room_type, style, prompt, uploaded_image=None):
     }
 
 
+# ─── Prompt-embedding cache ────────────────────────────────────────
+PROMPT_CACHE_MAX_BYTES = int(os.environ.get("PROMPT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+LAYOUT_TEXT_MODEL_KEY = f"{LAYOUT_MODEL_ID}+{FLOORPLAN_LORA_ID}" if FLOORPLAN_LORA_ID else LAYOUT_MODEL_ID
+
+prompt_cache = PromptEmbeddingCache(PROMPT_CACHE_MAX_BYTES)
+
+
+def prompt_encoder(pipeline):
+    """Encode a single prompt with ``pipeline``'s CLIP text encoder."""
+    def encode(text):
+        prompt_embeds, _ = pipeline.encode_prompt(
+            text, pipeline._execution_device, 1, False
+        )
+        return prompt_embeds
+    return encode
+
+
+def get_prompt_embeds(pipeline, model_key, prompts):
+    """Stacked, cached text embeddings for a list of prompts."""
+    encode = prompt_encoder(pipeline)
+    return torch.cat([prompt_cache.get_or_encode(model_key, text, encode) for text in prompts])
+
+
+def pin_negative_prompts(pipeline_name):
+    """Encode a pipeline's constant negative prompt once so requests never re-encode it."""
+    with inference_gate.hold(pipeline_name):
+        activate_pipeline(pipeline_name)
+        if pipeline_name == "design":
+            prompt_cache.pin(MODEL_ID, NEGATIVE_PROMPT, prompt_encoder(design_pipe))
+        else:
+            prompt_cache.pin(LAYOUT_TEXT_MODEL_KEY, LAYOUT_NEGATIVE_PROMPT, prompt_encoder(layout_pipe))
+
+
+# ─── Cancellation ──────────────────────────────────────────────────
+# Generations are cancelled by a client disconnect (streamed requests),
+# POST /api/generate/<request_id>/cancel or a job cancel. The denoising
+# loop stops at its next step callback once every request in the batch is
+# cancelled; the inference gate is released and memory freed.
+CANCEL_LATENCY_MS_BOUNDS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+cancel_registry = CancelRegistry()
+cancellations = CounterSet()
+cancel_latency_ms = Histogram(CANCEL_LATENCY_MS_BOUNDS)
+
+
+def is_cancelled(cancel_check):
+    try:
+        cancel_check()
+    except JobCancelled:
+        return True
+    return False
+
+
+def record_cancellation(source, cancelled_at):
+    """Count a generation that stopped early; ``cancelled_at`` is when it was asked to."""
+    cancellations.inc(source)
+    if cancelled_at is not None:
+        cancel_latency_ms.observe(max(0.0, time.time() - cancelled_at) * 1000)
+
+
+def parse_request_id(value):
+    if value in (None, ''):
+        return None
+    if not REQUEST_ID_PATTERN.match(value):
+        raise ValueError("request_id must be 1-64 letters, digits, '-' or '_'")
+    return value
+
+
+# ─── Guidance truncation ───────────────────────────────────────────
+# Late denoising steps mostly refine texture, where classifier-free
+# guidance changes little. A profile's cfg_cutoff keeps guidance on for
+# that fraction of the steps; the rest run the conditional branch alone,
+# which halves the UNet (and ControlNet) batch for those steps.
+cfg_truncation = CounterSet()
+
+
+def cfg_cutoff_step(total, cfg_cutoff):
+    """Number of guided steps out of ``total``, or None when guidance runs to the end."""
+    if not total or cfg_cutoff >= 1:
+        return None
+    cutoff = max(1, math.ceil(total * cfg_cutoff))
+    return cutoff if cutoff < total else None
+
+
+def cfg_tensor_inputs(pipeline, cfg_cutoff):
+    """``callback_on_step_end_tensor_inputs`` for a call truncated at ``cfg_cutoff``."""
+    if cfg_cutoff >= 1:
+        return ['latents']
+    return ['latents'] + [
+        name for name in ('prompt_embeds', 'control_image') if name in getattr(pipeline, '_callback_tensor_inputs', ())
+    ]
+
+
+def truncate_cfg(pipeline, step, cfg_cutoff, callback_kwargs):
+    """Switch guidance off after the cutoff step; returns the updated callback_kwargs.
+
+    The pipeline concatenates [unconditional, conditional] embeddings (and
+    doubles the ControlNet image), so keeping the second half and zeroing
+    the guidance scale makes every later step a single conditional pass.
+    """
+    total = getattr(pipeline, 'num_timesteps', None)
+    cutoff = cfg_cutoff_step(total, cfg_cutoff)
+    if cutoff is None or step + 1 != cutoff or not getattr(pipeline, 'do_classifier_free_guidance', False):
+        return callback_kwargs
+    pipeline._guidance_scale = 0.0
+    for name in ('prompt_embeds', 'control_image'):
+        if name in callback_kwargs:
+            callback_kwargs[name] = callback_kwargs[name].chunk(2)[1]
+    cfg_truncation.inc('truncated_calls')
+    cfg_truncation.inc('unet_rows_skipped', (total - cutoff) * len(callback_kwargs['latents']))
+    return callback_kwargs
+
+
+def layout_step_callback(cfg_cutoff, cancel_check=None):
+    """``callback_on_step_end`` that calls ``cancel_check`` (which raises to stop) and truncates guidance."""
+    if cfg_cutoff >= 1 and cancel_check is None:
+        return None
+
+    def on_step_end(pipeline, step, timestep, callback_kwargs):
+        if cancel_check is not None:
+            cancel_check()
+        return truncate_cfg(pipeline, step, cfg_cutoff, callback_kwargs)
+
+    return on_step_end
+
+
+# ─── Cross-request micro-batching ──────────────────────────────────
+DESIGN_BATCH_WINDOW_MS = float(os.environ.get("DESIGN_BATCH_WINDOW_MS", 50))
+DESIGN_MAX_BATCH_SIZE = int(os.environ.get("DESIGN_MAX_BATCH_SIZE", 4))
+
+
+def batch_cancelled(items):
+    """True when every item in the batch can be and has been cancelled."""
+    checks = [item.get('cancel_check') for item in items]
+    return all(checks) and all(is_cancelled(check) for check in checks)
+
+
+def design_step_callback(items, cfg_cutoff=1.0):
+    """``callback_on_step_end`` that reports progress per item, aborts a cancelled
+    batch and truncates guidance at ``cfg_cutoff``.
+
+    Each item's progress hook gets its own slice of the latents. A batch
+    keeps running while any of its requests still wants the result.
+    """
+    hooks = [(index, item['progress']) for index, item in enumerate(items) if item.get('progress')]
+    cancellable = all(item.get('cancel_check') for item in items)
+    if not hooks and not cancellable and cfg_cutoff >= 1:
+        return None
+
+    def on_step_end(pipeline, step, timestep, callback_kwargs):
+        total = getattr(pipeline, 'num_timesteps', None)
+        if cancellable and batch_cancelled(items):
+            cancellations.inc('aborted_mid_step')
+            if total:
+                cancellations.inc('steps_skipped', total - step - 1)
+            raise JobCancelled(f"design batch cancelled after step {step + 1}")
+
+        latents = callback_kwargs['latents']
+        for index, progress in hooks:
+            progress(step + 1, total, latents[index:index + 1])
+        return truncate_cfg(pipeline, step, cfg_cutoff, callback_kwargs)
+
+    return on_step_end
+
+
+def run_design_batch(batch_key, items):
+    """Run a group of compatible design requests as one batched pipeline call.
+
+    A ``conditioning_scale`` of None selects the plain img2img pipeline.
+    """
+    try:
+        return run_design_pipeline(batch_key, items)
+    except JobCancelled:
+        # The gate is already released; drop the aborted step's activations.
+        release_device_memory()
+        raise
+
+
+def run_design_pipeline(batch_key, items):
+    strength, steps, guidance, conditioning_scale, _size, scheduler, cfg_cutoff = batch_key
+    generators = [make_generator(item['seed']) for item in items]
+    callback = design_step_callback(items, cfg_cutoff)
+
+    with inference_gate.hold("design"):
+        if batch_cancelled(items):
+            cancellations.inc('aborted_before_start')
+            raise JobCancelled("design batch cancelled before it started")
+        activate_pipeline("design")
+        prompt_embeds = get_prompt_embeds(
+            design_pipe, MODEL_ID, [item['prompt'] for item in items]
+        )
+        negative_prompt_embeds = get_prompt_embeds(
+            design_pipe, MODEL_ID, [item['negative_prompt'] for item in items]
+        )
+
+        if conditioning_scale is None:
+            pipeline = get_refine_pipe()
+            use_scheduler(pipeline, scheduler)
+            with pipeline_autocast():
+                return pipeline(
+                    prompt_embeds=prompt_embeds,
+                    negative_prompt_embeds=negative_prompt_embeds,
+                    image=[item['image'] for item in items],
+                    strength=strength,
+                    num_inference_steps=steps,
+                    guidance_scale=guidance,
+                    generator=generators,
+                    callback_on_step_end=callback,
+                    callback_on_step_end_tensor_inputs=cfg_tensor_inputs(pipeline, cfg_cutoff),
+                ).images
+
+        use_scheduler(design_pipe, scheduler)
+        with pipeline_autocast():
+            return design_pipe(
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=negative_prompt_embeds,
+                image=[item['image'] for item in items],
+                control_image=[item['control_image'] for item in items],
+                strength=strength,
+                num_inference_steps=steps,
+                guidance_scale=guidance,
+                controlnet_conditioning_scale=conditioning_scale,
+                generator=generators,
+                callback_on_step_end=callback,
+                callback_on_step_end_tensor_inputs=cfg_tensor_inputs(design_pipe, cfg_cutoff),
+            ).images
+
+
+design_batcher = BatchScheduler(
+    run_design_batch,
+    window_seconds=DESIGN_BATCH_WINDOW_MS / 1000,
+    max_batch_size=DESIGN_MAX_BATCH_SIZE,
+    name="design",
+)
+
+
+def run_design_pass(image_pil, control_image, prompt, negative_prompt,
+                    strength, steps, guidance, conditioning_scale, seed=None, progress=None,
+                    cancel_check=None, scheduler=SCHEDULER_DEFAULT, cfg_cutoff=1.0):
+    """Queue a single design pass on the batcher and wait for its image.
+
+    ``progress(step, total, latents)`` is called after every denoising step;
+    ``cancel_check`` raises JobCancelled once the caller no longer wants it.
+    Guidance is dropped after the ``cfg_cutoff`` fraction of the steps.
+    """
+    batch_key = (strength, steps, guidance, conditioning_scale, image_pil.size, scheduler, cfg_cutoff)
+    return design_batcher.submit(batch_key, {
+        'prompt': prompt,
+        'negative_prompt': negative_prompt,
+        'image': image_pil,
+        'control_image': control_image,
+        'seed': seed,
+        'progress': progress,
+        'cancel_check': cancel_check,
+    })
+
+
+# ─── Seeds & result cache ──────────────────────────────────────────
+# A request that carries a seed is repeatable, so its images are cached
+# under a hash of everything that determines them.
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+RESULT_CACHE_DISK = os.environ.get("RESULT_CACHE_DISK", "true").lower() == "true"
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get("RESULT_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+LAYOUT_DEFAULT_SEED = os.environ.get("LAYOUT_DEFAULT_SEED")
+MAX_SEED = 2 ** 32 - 1
+
+result_cache = ResultCache(
+    RESULT_CACHE_MAX_BYTES,
+    disk_dir=os.path.join(GENERATED_FOLDER, "result_cache") if RESULT_CACHE_DISK else None,
+    disk_max_bytes=RESULT_CACHE_DISK_MAX_BYTES,
+)
+
+
+def parse_seed(value):
+    if value in (None, ''):
+        return None
+    try:
+        seed = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("seed must be an integer")
+    if not 0 <= seed <= MAX_SEED:
+        raise ValueError(f"seed must be between 0 and {MAX_SEED}")
+    return seed
+
+
+def make_generator(seed):
+    """CPU generator so a seed gives the same noise on every device."""
+    generator = torch.Generator("cpu")
+    if seed is None:
+        generator.seed()
+    else:
+        generator.manual_seed(seed)
+    return generator
+
+
+# ─── Depth-map cache ───────────────────────────────────────────────
+DEPTH_CACHE_MAX_BYTES = int(os.environ.get("DEPTH_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+DEPTH_CACHE_DISK = os.environ.get("DEPTH_CACHE_DISK", "false").lower() == "true"
+DEPTH_CACHE_DISK_MAX_BYTES = int(os.environ.get("DEPTH_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+
+depth_cache = DepthCache(
+    DEPTH_CACHE_MAX_BYTES,
+    disk_dir=os.path.join(GENERATED_FOLDER, "depth_cache") if DEPTH_CACHE_DISK else None,
+    disk_max_bytes=DEPTH_CACHE_DISK_MAX_BYTES,
+    model_id=DEPTH_MODEL_ID,
+)
+
+
+def estimate_depth(image_pil):
+    with inference_gate.hold("design"):
+        depth = depth_estimator(image_pil)
+    # MiDaS answers at its own detect resolution; ControlNet needs the image's size.
+    if depth.size != image_pil.size:
+        depth = depth.resize(image_pil.size, Image.Resampling.BILINEAR)
+    return depth
+
+
+def estimate_depth_cached(image_pil):
+    """Depth map for an uploaded room, reused across re-generations of the same image."""
+    return depth_cache.get_or_compute(image_pil, estimate_depth)
+
+
 # ─── IMPROVEMENT 2 & 5: ControlNet Generation + Two-Stage Hi-Res ──
-def generate_with_controlnet(image_pil, prompt, negative_prompt, strength=0.70):
+REFINE_MODE_REUSE = "reuse"
+REFINE_MODE_IMG2IMG = "img2img"
+REFINE_MODE_RECOMPUTE = "recompute"
+REFINE_MODES = (REFINE_MODE_REUSE, REFINE_MODE_IMG2IMG, REFINE_MODE_RECOMPUTE)
+REFINE_MODE = os.environ.get("REFINE_MODE", REFINE_MODE_REUSE).lower()
+if REFINE_MODE not in REFINE_MODES:
+    print(f"Unknown REFINE_MODE '{REFINE_MODE}', falling back to '{REFINE_MODE_REUSE}'")
+    REFINE_MODE = REFINE_MODE_REUSE
+
+# Stage 1 (ControlNet) and stage 2 (refinement) settings
+CONTROLNET_STEPS = 50
+CONTROLNET_GUIDANCE = 8.5
+CONTROLNET_CONDITIONING_SCALE = 0.45
+STAGE1_STRENGTH = 0.82
+STAGE2_STRENGTH = 0.18
+STAGE2_STEPS = 30
+STAGE2_GUIDANCE = 8.0
+STAGE2_CONDITIONING_SCALE = 0.2
+
+refine_pipe = None
+
+
+def get_refine_pipe():
+    """Plain img2img view of design_pipe that shares its weights but skips ControlNet."""
+    global refine_pipe
+
+    if refine_pipe is None:
+        refine_pipe = StableDiffusionImg2ImgPipeline.from_pipe(
+            design_pipe, scheduler=default_scheduler(design_pipe)
+        )
+    return refine_pipe
+
+
+# ─── Inference profiles ────────────────────────────────────────────
+# Requests pick "fast", "balanced" or "quality" with a `profile` field;
+# INFERENCE_PROFILE is the default. While PROFILE_DOWNGRADE_DEPTH or more
+# requests are waiting for the GPU, costlier profiles are downgraded to
+# PROFILE_DOWNGRADE_TO. "quality" keeps the original sampler settings.
+# PROFILE_CFG_CUTOFFS overrides how long each profile keeps classifier-free
+# guidance on, e.g. "fast:0.4,balanced:0.6,quality:1.0".
+PROFILE_CFG_CUTOFFS = {"fast": 0.4, "balanced": 0.6, "quality": 1.0}
+
+
+def read_cfg_cutoff(name, value):
+    name = name.lower()
+    if name not in PROFILE_CFG_CUTOFFS:
+        raise ValueError(f"profiles are {', '.join(PROFILE_CFG_CUTOFFS)}")
+    cutoff = float(value)
+    if not 0 < cutoff <= 1:
+        raise ValueError("the cutoff must be in (0, 1]")
+    return name, cutoff
+
+
+PROFILE_CFG_CUTOFFS.update(read_env_mapping("PROFILE_CFG_CUTOFFS", read_cfg_cutoff))
+INFERENCE_PROFILES = [
+    InferenceProfile(
+        "fast", SCHEDULER_UNIPC,
+        design_steps=14, design_guidance=7.0,
+        refine=False, refine_steps=0, refine_guidance=STAGE2_GUIDANCE,
+        layout_steps=12, layout_guidance=7.5,
+        cfg_cutoff=PROFILE_CFG_CUTOFFS["fast"],
+    ),
+    InferenceProfile(
+        "balanced", SCHEDULER_DPMPP,
+        design_steps=25, design_guidance=7.5,
+        refine=True, refine_steps=20, refine_guidance=7.5,
+        layout_steps=20, layout_guidance=8.0,
+        cfg_cutoff=PROFILE_CFG_CUTOFFS["balanced"],
+    ),
+    InferenceProfile(
+        "quality", SCHEDULER_DEFAULT,
+        design_steps=CONTROLNET_STEPS, design_guidance=CONTROLNET_GUIDANCE,
+        refine=True, refine_steps=STAGE2_STEPS, refine_guidance=STAGE2_GUIDANCE,
+        layout_steps=LAYOUT_STEPS, layout_guidance=LAYOUT_GUIDANCE,
+        cfg_cutoff=PROFILE_CFG_CUTOFFS["quality"],
+    ),
+]
+INFERENCE_PROFILE = os.environ.get("INFERENCE_PROFILE", "quality").lower()
+PROFILE_DOWNGRADE_DEPTH = int(os.environ.get("PROFILE_DOWNGRADE_DEPTH", 3))
+PROFILE_DOWNGRADE_TO = os.environ.get("PROFILE_DOWNGRADE_TO", "fast").lower()
+PROFILE_NAMES = [profile.name for profile in INFERENCE_PROFILES]
+if INFERENCE_PROFILE not in PROFILE_NAMES:
+    print(f"Unknown INFERENCE_PROFILE '{INFERENCE_PROFILE}', falling back to 'quality'")
+    INFERENCE_PROFILE = "quality"
+if PROFILE_DOWNGRADE_TO not in PROFILE_NAMES:
+    print(f"Unknown PROFILE_DOWNGRADE_TO '{PROFILE_DOWNGRADE_TO}', falling back to 'fast'")
+    PROFILE_DOWNGRADE_TO = "fast"
+
+SCHEDULER_CLASSES = {
+    SCHEDULER_DPMPP: (DPMSolverMultistepScheduler, {'algorithm_type': 'dpmsolver++', 'use_karras_sigmas': True}),
+    SCHEDULER_UNIPC: (UniPCMultistepScheduler, {}),
+}
+pipeline_schedulers = {}
+
+
+def inference_backlog():
+    """Requests waiting for the GPU: queued jobs, queued design passes and gate waiters
+    (or jobs queued on the inference workers)."""
+    backlog = job_queue.depth() + design_batcher.queued() + inference_gate.stats()['waiting']
+    if worker_pool is not None:
+        backlog += worker_pool.queued()
+    return backlog
+
+
+profile_policy = ProfilePolicy(
+    INFERENCE_PROFILES,
+    INFERENCE_PROFILE,
+    downgrade_depth=PROFILE_DOWNGRADE_DEPTH,
+    downgrade_to=PROFILE_DOWNGRADE_TO,
+    load=inference_backlog,
+)
+
+
+def default_scheduler(pipeline):
+    """The scheduler ``pipeline`` was loaded with."""
+    return pipeline_schedulers.setdefault(id(pipeline), {SCHEDULER_DEFAULT: pipeline.scheduler})[SCHEDULER_DEFAULT]
+
+
+def use_scheduler(pipeline, name):
+    """Switch ``pipeline`` to the ``name`` sampler, built once from its own config.
+
+    Schedulers keep per-call state, so call this with inference_gate held.
+    """
+    schedulers = pipeline_schedulers.setdefault(id(pipeline), {SCHEDULER_DEFAULT: pipeline.scheduler})
+    if name not in schedulers:
+        scheduler_class, options = SCHEDULER_CLASSES[name]
+        schedulers[name] = scheduler_class.from_config(schedulers[SCHEDULER_DEFAULT].config, **options)
+    pipeline.scheduler = schedulers[name]
+
+
+def read_profile(value):
+    """Validate a requested profile name; None means the default."""
+    name = (value or '').strip().lower() or None
+    profile_policy.get(name)
+    return name
+
+
+# ─── Resolution buckets ────────────────────────────────────────────
+# Room photos keep their aspect ratio: each is resized to the closest
+# multiple-of-64 bucket of its resolution tier. RESOLUTION_TIERS gives each
+# tier's area budget as a side length, e.g. "draft:384,standard:512".
+# Requests pick a tier with a "resolution" field. RESOLUTION_MAX_TIER caps
+# every request, and RESOLUTION_LOAD_MAX_TIER caps them while
+# RESOLUTION_LOAD_DEPTH or more requests wait for inference. "upscale"
+# turns a lower-tier room into a RESOLUTION_UPSCALE_TO one: stage 2 refines
+# the resized stage-1 image. Layouts use the tier's square bucket.
+def read_resolution_tier(name, side):
+    if not name:
+        raise ValueError("missing tier name")
+    side = int(side)
+    if side < BUCKET_MULTIPLE or side % 8:
+        raise ValueError(f"the side must be a multiple of 8 and at least {BUCKET_MULTIPLE}")
+    return name.lower(), side
+
+
+RESOLUTION_TIERS = dict(sorted({
+    "draft": 384, "standard": 512, "large": 768,
+    **dict(read_env_mapping("RESOLUTION_TIERS", read_resolution_tier)),
+}.items(), key=lambda tier: tier[1]))
+RESOLUTION_DEFAULT = os.environ.get("RESOLUTION_DEFAULT", "standard").lower()
+RESOLUTION_MAX_TIER = os.environ.get("RESOLUTION_MAX_TIER", "large").lower()
+RESOLUTION_LOAD_MAX_TIER = os.environ.get("RESOLUTION_LOAD_MAX_TIER", "standard").lower()
+RESOLUTION_LOAD_DEPTH = int(os.environ.get("RESOLUTION_LOAD_DEPTH", PROFILE_DOWNGRADE_DEPTH))
+RESOLUTION_UPSCALE_TO = os.environ.get("RESOLUTION_UPSCALE_TO", "standard").lower()
+if RESOLUTION_DEFAULT not in RESOLUTION_TIERS:
+    print(f"Unknown RESOLUTION_DEFAULT '{RESOLUTION_DEFAULT}', falling back to 'standard'")
+    RESOLUTION_DEFAULT = "standard"
+if RESOLUTION_MAX_TIER not in RESOLUTION_TIERS:
+    print(f"Unknown RESOLUTION_MAX_TIER '{RESOLUTION_MAX_TIER}', falling back to the largest tier")
+    RESOLUTION_MAX_TIER = None
+if RESOLUTION_LOAD_MAX_TIER not in RESOLUTION_TIERS:
+    print(f"Unknown RESOLUTION_LOAD_MAX_TIER '{RESOLUTION_LOAD_MAX_TIER}', falling back to 'standard'")
+    RESOLUTION_LOAD_MAX_TIER = "standard"
+if RESOLUTION_UPSCALE_TO not in RESOLUTION_TIERS:
+    print(f"Unknown RESOLUTION_UPSCALE_TO '{RESOLUTION_UPSCALE_TO}', falling back to 'standard'")
+    RESOLUTION_UPSCALE_TO = "standard"
+
+resolution_policy = ResolutionPolicy(
+    RESOLUTION_TIERS,
+    RESOLUTION_DEFAULT,
+    max_tier=RESOLUTION_MAX_TIER,
+    load_max_tier=RESOLUTION_LOAD_MAX_TIER,
+    load_depth=RESOLUTION_LOAD_DEPTH,
+    load=inference_backlog,
+    upscale_to=RESOLUTION_UPSCALE_TO,
+)
+
+
+def read_resolution(value):
+    """Validate a requested tier and apply the caps; returns (tier, capped)."""
+    return resolution_policy.choose((value or '').strip().lower() or None)
+
+
+def layout_size(tier=None):
+    """Layouts are square: the tier's 1:1 bucket."""
+    return resolution_policy.bucket(tier, 1, 1)
+
+
+def observe_generation(pipeline, label, generate):
+    """Run ``generate()`` and record its latency and peak memory under the ``label`` bucket.
+
+    Peak memory is the CUDA allocator peak on GPU and the process peak RSS
+    on CPU (approximate when generations overlap; not measured when the
+    pipelines run in worker processes).
+    """
+    track_rss = device != "cuda" and worker_pool is None and reset_peak_rss()
+    if device == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+    started = time.perf_counter()
+    result = generate()
+    if device == "cuda":
+        peak = torch.cuda.max_memory_allocated()
+    else:
+        peak = peak_rss_bytes() if track_rss else None
+    resolution_policy.observe(pipeline, label, time.perf_counter() - started, peak)
+    return result
+
+
+def generate_with_controlnet(image_pil, prompt, negative_prompt, strength=0.70, depth_image=None, seed=None,
+                             progress=None, cancel_check=None, profile=None):
     """
     Generate an image using ControlNet depth conditioning.
     Extracts a depth map from the original image so the room structure
@@ -854,65 +1663,152 @@ def generate_with_controlnet(image_pil, prompt, negative_prompt, strength=0.70):
     """
     if depth_estimator is None or design_pipe is None:
         raise RuntimeError("Models not loaded. Check startup logs.")
+    profile = profile or profile_policy.get()
 
     # Extract depth map from the original room image
-    depth_image = depth_estimator(image_pil)
+    if depth_image is None:
+        depth_image = estimate_depth_cached(image_pil)
 
-    result = design_pipe(
-        prompt=prompt,
-        negative_prompt=negative_prompt,
-        image=image_pil,
-        control_image=depth_image,
+    return run_design_pass(
+        image_pil, depth_image, prompt, negative_prompt,
         strength=strength,
-        num_inference_steps=50,
-        guidance_scale=8.5,
-        controlnet_conditioning_scale=0.45,
-    ).images[0]
+        steps=profile.design_steps,
+        guidance=profile.design_guidance,
+        conditioning_scale=CONTROLNET_CONDITIONING_SCALE,
+        seed=seed,
+        progress=progress,
+        cancel_check=cancel_check,
+        scheduler=profile.scheduler,
+        cfg_cutoff=profile.cfg_cutoff,
+    )
 
-    return result
+
+def stage_progress(progress, stage):
+    if progress is None:
+        return None
+    return lambda step, total, latents: progress(stage, step, total, latents)
 
 
-def two_stage_generation(image_pil, prompt, negative_prompt):
+def two_stage_generation(image_pil, prompt, negative_prompt, cancel_check=None, refine_mode=None, seed=None,
+                         progress=None, profile=None, upscale_size=None):
     """
     IMPROVEMENT 5: Two-stage generation (hi-res fix).
     Stage 1 — Full ControlNet generation (adds furniture, preserves room).
     Stage 2 — Light refinement pass (sharpens details, keeps layout).
+    ``refine_mode`` picks the stage-2 conditioning (see REFINE_MODES) and
+    ``cancel_check`` is called between stages and after every denoising
+    step, and raises JobCancelled to abort.
+    A ``seed`` makes both stages deterministic.
+    ``progress(stage, step, total, latents)`` reports the denoising steps of
+    the "generate" and "refine" stages. The inference ``profile`` sets the
+    sampler and step counts and may skip stage 2.
+    With an ``upscale_size`` the stage-1 result is resized to it and stage 2
+    refines it there.
+    With inference workers configured, both stages run in a worker process.
     """
+    refine_mode = refine_mode or REFINE_MODE
+    profile = profile or profile_policy.get()
+    if refine_mode not in REFINE_MODES:
+        raise ValueError(f"Unknown refine mode: {refine_mode}")
+
+    if worker_pool is not None:
+        return worker_pool.submit("design", "design", {
+            'image': image_pil,
+            'prompt': prompt,
+            'negative_prompt': negative_prompt,
+            'refine_mode': refine_mode,
+            'seed': seed,
+            'profile': profile.name,
+            'upscale_size': upscale_size,
+        }, progress=progress, cancel_check=cancel_check)
+
+    if cancel_check is not None:
+        cancel_check()
+
     # Stage 1: Main generation with ControlNet (high strength)
+    depth_image = estimate_depth_cached(image_pil)
     stage1_result = generate_with_controlnet(
-        image_pil, prompt, negative_prompt, strength=0.82
+        image_pil, prompt, negative_prompt, strength=STAGE1_STRENGTH, depth_image=depth_image, seed=seed,
+        progress=stage_progress(progress, "generate"), cancel_check=cancel_check, profile=profile,
+    )
+    if upscale_size is not None:
+        # The low-resolution stage 1 feeds the upscale; stage 2 restores detail at the larger size.
+        stage1_result = stage1_result.resize(upscale_size, Image.Resampling.LANCZOS)
+        depth_image = depth_image.resize(upscale_size, Image.Resampling.BILINEAR)
+    if not profile.refine:
+        return stage1_result
+
+    if cancel_check is not None:
+        cancel_check()
+
+    # Stage 2: Detail refinement pass (very low strength — only adds detail).
+    # Stage 1 was conditioned on the room's depth, so by default the same
+    # depth map is reused instead of running MiDaS on the stage-1 output.
+    if refine_mode == REFINE_MODE_IMG2IMG:
+        control_image, conditioning_scale = None, None
+    elif refine_mode == REFINE_MODE_RECOMPUTE:
+        control_image, conditioning_scale = estimate_depth(stage1_result), STAGE2_CONDITIONING_SCALE
+    else:
+        control_image, conditioning_scale = depth_image, STAGE2_CONDITIONING_SCALE
+
+    stage2_result = run_design_pass(
+        stage1_result, control_image, prompt, negative_prompt,
+        strength=STAGE2_STRENGTH,
+        steps=profile.refine_steps,
+        guidance=profile.refine_guidance,
+        conditioning_scale=conditioning_scale,
+        seed=seed,
+        progress=stage_progress(progress, "refine"),
+        cancel_check=cancel_check,
+        scheduler=profile.scheduler,
+        cfg_cutoff=profile.cfg_cutoff,
     )
-
-    # Stage 2: Detail refinement pass (very low strength — only adds detail)
-    # Uses the same pipeline but without ControlNet conditioning in the
-    # second pass to avoid re-altering structure. We simply pass the
-    # stage-1 output back as a standard img2img with low strength.
-    stage2_result = design_pipe(
-        prompt=prompt,
-        negative_prompt=negative_prompt,
-        image=stage1_result,
-        control_image=depth_estimator(stage1_result),
-        strength=0.18,
-        num_inference_steps=30,
-        guidance_scale=8.0,
-        controlnet_conditioning_scale=0.2,
-    ).images[0]
 
     return stage2_result
 
 
+def run_furniture_suggestion(data):
+    """Validate one suggestion request and solve it; returns (suggestions, error, status)."""
+    if not isinstance(data, dict):
+        return None, 'Request body must be a JSON object', 400
+    room_type = data.get('room_type', 'living_room')
+    budget = data.get('budget', 100000)  # Default 1 lakh
+    room_dimensions = data.get('dimensions')  # Optional: {length, width, height}
+    must_have = data.get('must_have') or []
+    top_k = data.get('alternatives')
+
+    if not isinstance(room_type, str):
+        return None, 'room_type must be a string', 400
+    if isinstance(budget, bool) or not isinstance(budget, (int, float)) or budget < 0:
+        return None, 'budget must be a non-negative number', 400
+    if room_dimensions is not None and not isinstance(room_dimensions, dict):
+        return None, 'dimensions must be an object', 400
+    if not isinstance(must_have, list) or not all(isinstance(key, str) for key in must_have):
+        return None, 'must_have must be a list of item keys', 400
+    if top_k is not None:
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 0:
+            return None, 'alternatives must be a non-negative integer', 400
+        top_k += 1
+
+    try:
+        suggestions = suggest_furniture_by_budget(room_type, budget, room_dimensions,
+                                                  must_have=must_have, top_k=top_k)
+    except ValueError as exc:
+        return None, str(exc), 400
+    if suggestions is None:
+        return None, 'Budget does not cover the must-have items', 422
+    return suggestions, None, 200
+
+
 @app.route('/api/suggest-furniture', methods=['POST'])
 def suggest_furniture():
     """
     Endpoint to suggest furniture based on budget and room type
     """
     try:
-        data = request.get_json()
-        room_type = data.get('room_type', 'living_room')
-        budget = data.get('budget', 100000)  # Default 1 lakh
-        room_dimensions = data.get('dimensions')  # Optional: {length, width, height}
-        
-        suggestions = suggest_furniture_by_budget(room_type, budget, room_dimensions)
+        suggestions, error, status = run_furniture_suggestion(request.get_json(silent=True))
+        if error:
+            return jsonify({'error': error}), status
         
         return jsonify({
             'success': True,
@@ -924,84 +1820,462 @@ def suggest_furniture():
         return jsonify({'error': str(e)}), 500
 
 
+# ─── Batch quoting endpoints ─────────────────────────────────────────
+# Both endpoints take a JSON array (or {"items": [...]}) and stream one
+# NDJSON line per item as it is processed, followed by a summary line.
+# A failing item produces an error line; the rest of the batch carries on.
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", 8 * 1024 * 1024))
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 5000))
+
+
+def read_batch_items():
+    """Return (items, error response) for a batch request body."""
+    if request.content_length is not None and request.content_length > BATCH_MAX_BYTES:
+        return None, (jsonify({'error': f'Request body exceeds {BATCH_MAX_BYTES} bytes'}), 413)
+    body = request.stream.read(BATCH_MAX_BYTES + 1)
+    if len(body) > BATCH_MAX_BYTES:
+        return None, (jsonify({'error': f'Request body exceeds {BATCH_MAX_BYTES} bytes'}), 413)
+
+    try:
+        data = json.loads(body or b'null')
+    except ValueError:
+        return None, (jsonify({'error': 'Request body must be JSON'}), 400)
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return None, (jsonify({'error': 'Expected a JSON array of items'}), 400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return None, (jsonify({'error': f'Batch exceeds {BATCH_MAX_ITEMS} items'}), 413)
+    return items, None
+
+
+def stream_batch(items, process):
+    """NDJSON response running ``process(item)`` -> (result, error, status) per item."""
+    def generate():
+        failed = 0
+        for index, item in enumerate(items):
+            try:
+                result, error, status = process(item)
+            except Exception as exc:
+                print(f"Batch item {index} failed: {exc}")
+                result, error, status = None, str(exc), 500
+            if error:
+                failed += 1
+                line = {'index': index, 'ok': False, 'status': status, 'error': error}
+            else:
+                line = {'index': index, 'ok': True, 'result': result}
+            yield json.dumps(line) + '\n'
+        yield json.dumps({'done': True, 'count': len(items), 'failed': failed}) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+
+def run_pricing_estimate(data, memo):
+    """Validate one pricing request; identical requests in a batch share ``memo``."""
+    if not isinstance(data, dict):
+        return None, 'Each item must be a JSON object', 400
+    prompt = data.get('prompt', '')
+    room_type = data.get('room_type', 'living_room')
+    style = data.get('style', 'modern')
+    if not all(isinstance(value, str) for value in (prompt, room_type, style)):
+        return None, 'prompt, room_type and style must be strings', 400
+
+    key = (room_type, style, prompt)
+    pricing = memo.get(key)
+    if pricing is None:
+        pricing = estimate_furniture_pricing(room_type, style, prompt)
+        memo[key] = pricing
+    return pricing, None, 200
+
+
+@app.route('/api/suggest-furniture/batch', methods=['POST'])
+def suggest_furniture_batch():
+    """
+    Budget suggestions for many rooms at once, streamed as NDJSON
+    """
+    items, error_response = read_batch_items()
+    if error_response:
+        return error_response
+    return stream_batch(items, run_furniture_suggestion)
+
+
+@app.route('/api/estimate-pricing/batch', methods=['POST'])
+def estimate_pricing_batch():
+    """
+    Price many prompts from the catalog alone (no image models), streamed as NDJSON
+    """
+    items, error_response = read_batch_items()
+    if error_response:
+        return error_response
+    memo = {}
+    return stream_batch(items, lambda item: run_pricing_estimate(item, memo))
+
+
+@app.route('/api/catalog/items', methods=['GET'])
+def catalog_items():
+    """
+    Look up catalog items by key, synonym, room type and/or price range
+    """
+    key = request.args.get('key')
+    phrase = request.args.get('q')
+    room_type = request.args.get('room_type')
+    try:
+        min_price = int(request.args['min_price']) if request.args.get('min_price') else None
+        max_price = int(request.args['max_price']) if request.args.get('max_price') else None
+        limit = min(int(request.args.get('limit', 100)), 1000)
+    except ValueError:
+        return jsonify({'error': 'min_price, max_price and limit must be integers'}), 400
+
+    if key or phrase:
+        keys = [key] if key else catalog.keys_for_synonym(normalize_prompt_text(phrase))
+        items = [catalog.get(item_key) for item_key in keys]
+        items = [
+            item for item in items
+            if item is not None
+            and (min_price is None or item['price'] >= min_price)
+            and (max_price is None or item['price'] <= max_price)
+            and (not room_type or item['key'] in catalog.room_items(room_type))
+        ][:limit]
+    else:
+        items = catalog.items_in_price_range(min_price, max_price, room_type=room_type, limit=limit)
+
+    return jsonify({
+        'items': [dict(item, links=get_purchase_links(item['key'])) for item in items],
+        'revision': catalog.revision,
+    })
+
+
+@app.route('/api/catalog/reload', methods=['POST'])
+def catalog_reload():
+    """
+    Apply catalog edits now instead of waiting for the next poll
+    """
+    changes = reload_catalog()
+    return jsonify({
+        'revision': catalog.revision,
+        'updated': sorted(changes.updated) if changes else [],
+        'removed': sorted(changes.removed) if changes else [],
+        'room_types': sorted(changes.rooms) if changes else [],
+    })
+
+
+def design_result_key(input_image, prompt, negative_prompt, seed, refine_mode, profile, upscale_size=None):
+    # The input hash covers its bucket size.
+    return result_cache_key(
+        "design", image_content_hash(input_image), prompt, negative_prompt, seed,
+        refine_mode or REFINE_MODE, profile.design_key(), upscale_size,
+        (STAGE1_STRENGTH, CONTROLNET_CONDITIONING_SCALE, STAGE2_STRENGTH, STAGE2_CONDITIONING_SCALE),
+        (MODEL_ID, CONTROLNET_MODEL_ID, DEPTH_MODEL_ID),
+    )
+
+
+def run_room_generation(input_image, prompt, room_type, style, cancel_check=None, refine_mode=None,
+                        output=OUTPUT_URL, image_format=DESIGN_OUTPUT_FORMAT, image_quality=None, seed=None,
+                        progress=None, profile=None, resolution=None, resolution_capped=False, upscale=False):
+    """Run the full room-design flow and return the JSON-ready response body.
+
+    With a ``seed`` the result is deterministic and served from result_cache
+    when the same request has been generated before. ``progress`` receives
+    step callbacks as in two_stage_generation. ``profile`` names the
+    requested inference profile; profile_policy may downgrade it under load.
+    ``input_image`` is already sized to a bucket of the ``resolution`` tier;
+    ``upscale`` asks for a RESOLUTION_UPSCALE_TO result from it.
+    """
+    prompt_clean = prompt.strip()
+    profile, downgraded = profile_policy.choose(profile)
+    resolution = resolution_policy.get(resolution)
+    upscale_size = resolution_policy.upscale_size(resolution, input_image.size) if upscale else None
+
+    # Detect items upfront so we can reuse results for prompt + pricing
+    detected = detect_furniture_items(prompt_clean)
+    pricing_preview = estimate_furniture_pricing(room_type, style, prompt, input_image, detected=detected)
+
+    # ── IMPROVEMENT 1 + 4: Build structured prompt with enforcement ──
+    room_name = room_type.replace('-', ' ')
+
+    # Step 1: Build structured prompt only when needed.
+    if is_already_structured_prompt(prompt_clean):
+        structured_prompt = prompt_clean
+    else:
+        structured_prompt = build_structured_prompt(prompt_clean, room_name, style)
+
+    # Step 2: Extract and enforce furniture items
+    furniture_keys, _ = detected
+    furniture_items = [item_key.replace('_', ' ') for item_key in furniture_keys]
+    final_prompt = enforce_furniture_in_prompt(structured_prompt, furniture_items)
+    final_prompt = shorten_prompt_for_clip(final_prompt, max_words=70)
+
+    # Use the global negative prompt (Improvement 1)
+    negative = NEGATIVE_PROMPT
+
+    # Generate image
+    use_local = design_models_ready()
+    cache_key = None
+    cached = None
+    if use_local and seed is not None:
+        cache_key = design_result_key(input_image, final_prompt, negative, seed, refine_mode, profile, upscale_size)
+        cached = result_cache.get(cache_key)
+
+    if cached is not None:
+        print(f"Result cache hit for seed {seed}")
+        generated_image = cached[0]
+    elif use_local:
+        print(f"Generating with ControlNet on {device} ({profile.name} profile"
+              f"{', downgraded under load' if downgraded else ''})...")
+        print(f"Final Prompt: {final_prompt}")
+        print(f"Negative: {negative[:80]}...")
+        print(f"Furniture items detected: {furniture_keys}")
+
+        if device == "cpu":
+            print("This will take 60-120 seconds on CPU with ControlNet...")
+
+        # ── IMPROVEMENT 2 + 5: ControlNet + Two-Stage generation ──
+        # Each pass goes through design_batcher, which holds inference_gate.
+        label = bucket_label(input_image.size)
+        if upscale_size is not None:
+            label = f"{label}->{bucket_label(upscale_size)}"
+        generated_image = observe_generation("design", label, lambda: two_stage_generation(
+            input_image, final_prompt, negative,
+            cancel_check=cancel_check, refine_mode=refine_mode, seed=seed, progress=progress,
+            profile=profile, upscale_size=upscale_size,
+        ))
+        if cache_key is not None:
+            result_cache.put(cache_key, [generated_image])
+
+        # Clear GPU cache after generation
+        if device == "cuda":
+            torch.cuda.empty_cache()
+            print("GPU cache cleared")
+
+        print("Generation complete!")
+    else:
+        # Demo mode: Return enhanced original image with overlay
+        print("Demo mode: Returning processed input image")
+        generated_image = input_image
+        if upscale_size is not None:
+            generated_image = input_image.resize(upscale_size, Image.Resampling.LANCZOS)
+        # You could add simple PIL filters here for demo purposes
+
+    # Use previously calculated pricing
+    pricing = pricing_preview
+
+    published = publish_image(generated_image, output, image_format, image_quality)
+    response = {
+        'image_url': published['url'],
+        'pricing': pricing,
+        'furniture_detected': furniture_items,
+        'message': 'Image generated successfully' if use_local else 'Demo mode active',
+        'mode': 'local' if use_local else 'demo',
+        'seed': seed,
+        'cached': cached is not None,
+        'profile': profile.name,
+        'profile_downgraded': downgraded,
+        'resolution': resolution,
+        'resolution_capped': resolution_capped,
+        'width': generated_image.size[0],
+        'height': generated_image.size[1],
+    }
+    if 'data_url' in published:
+        response['image'] = published['data_url']
+    return response
+
+
+# ─── Upload decoding ───────────────────────────────────────────────
+# Room photos are turned away with 413 when the request body exceeds
+# UPLOAD_MAX_BYTES or the image header reports more than UPLOAD_MAX_PIXELS
+# pixels, before any pixels are decoded. JPEGs are decoded at a reduced DCT
+# scale near the resolution bucket and the EXIF orientation is applied.
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 25 * 1024 * 1024))
+UPLOAD_MAX_PIXELS = int(os.environ.get("UPLOAD_MAX_PIXELS", 64_000_000))
+UPLOAD_ENDPOINTS = ('generate_room', 'submit_generate_job')
+
+
+class ApiRequest(Request):
+    """Request that caps the body size of the image upload endpoints."""
+
+    @property
+    def max_content_length(self):
+        if self.endpoint in UPLOAD_ENDPOINTS:
+            return UPLOAD_MAX_BYTES
+        return super().max_content_length
+
+
+app.request_class = ApiRequest
+
+
+def upload_too_large_response(e):
+    """413 for a body over UPLOAD_MAX_BYTES or an image over UPLOAD_MAX_PIXELS."""
+    message = str(e) if isinstance(e, UploadTooLarge) else f'Upload exceeds {UPLOAD_MAX_BYTES} bytes'
+    return jsonify({'error': message}), 413
+
+
+def decode_room_upload(image_file, resolution):
+    """Decode the upload straight to its ``resolution`` bucket."""
+    return decode_upload(
+        image_file.stream, lambda width, height: resolution_policy.bucket(resolution, width, height),
+        UPLOAD_MAX_PIXELS,
+    )
+
+
+def read_generate_form():
+    """Parse the multipart form shared by /api/generate and /api/jobs/generate.
+
+    Returns the keyword arguments for run_room_generation and an error
+    message (or None) for invalid option values.
+    """
+    image_file = request.files['image']
+    refine_mode = (request.form.get('refine_mode') or '').strip().lower() or None
+    if refine_mode is not None and refine_mode not in REFINE_MODES:
+        return None, f"refine_mode must be one of: {', '.join(REFINE_MODES)}"
+    output = (request.form.get('output') or OUTPUT_URL).strip().lower()
+    if output not in (OUTPUT_URL, OUTPUT_DATA_URL):
+        return None, f"output must be '{OUTPUT_URL}' or '{OUTPUT_DATA_URL}'"
+    try:
+        image_format = negotiate_output_format(request.form.get('format'), DESIGN_OUTPUT_FORMAT)
+        image_quality = parse_quality(request.form.get('quality'))
+        seed = parse_seed(request.form.get('seed'))
+        profile = read_profile(request.form.get('profile'))
+        resolution, resolution_capped = read_resolution(request.form.get('resolution'))
+    except ValueError as e:
+        return None, str(e)
+    upscale = (request.form.get('upscale') or '').strip().lower() in ('1', 'true')
+
+    # Load and process the image (UploadTooLarge propagates to the caller)
+    try:
+        input_image = cpu_pool.run(decode_room_upload, image_file, resolution)
+    except InvalidUpload as e:
+        return None, str(e)
+    return {
+        'input_image': input_image,
+        'prompt': request.form.get('prompt', ''),
+        'room_type': request.form.get('room_type', 'living-room'),
+        'style': request.form.get('style', 'modern'),
+        'refine_mode': refine_mode,
+        'output': output,
+        'image_format': image_format,
+        'image_quality': image_quality,
+        'seed': seed,
+        'profile': profile,
+        'resolution': resolution,
+        'resolution_capped': resolution_capped,
+        'upscale': upscale,
+    }, None
+
+
+# ─── Streamed generation progress ──────────────────────────────────
+# /api/generate with stream=sse (or Accept: text/event-stream) or
+# stream=ndjson answers with step progress events, low-resolution latent
+# previews every GENERATE_PREVIEW_EVERY steps and a final result event.
+GENERATE_PREVIEW_EVERY = int(os.environ.get("GENERATE_PREVIEW_EVERY", 5))
+GENERATE_PREVIEW_SIZE = int(os.environ.get("GENERATE_PREVIEW_SIZE", 128))
+GENERATE_PREVIEW_QUALITY = 70
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("STREAM_HEARTBEAT_SECONDS", 15))
+
+
+def encode_preview(image):
+    return to_data_url(*encode_image(image, "jpeg", GENERATE_PREVIEW_QUALITY))
+
+
+def requested_stream_format():
+    """Streaming format asked for by the current request, or None; raises ValueError if invalid."""
+    requested = (request.form.get('stream') or request.args.get('stream') or '').strip().lower()
+    if requested in ('', 'false', '0'):
+        return FORMAT_SSE if request.accept_mimetypes.best == 'text/event-stream' else None
+    if requested in ('true', '1'):
+        return FORMAT_SSE
+    if requested not in STREAM_FORMATS:
+        raise ValueError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+    return requested
+
+
+def run_cancellable_generation(params, token, request_id, progress=None):
+    """run_room_generation that stops when ``token`` is cancelled.
+
+    Returns the response body, or None when the generation was cancelled.
+    ``request_id`` (if any) is dropped from cancel_registry afterwards.
+    """
+    try:
+        return run_room_generation(**params, cancel_check=token.raise_if_cancelled, progress=progress)
+    except JobCancelled:
+        print(f"Generation {request_id or ''} cancelled ({token.reason})")
+        record_cancellation(token.reason, token.cancelled_at)
+        return None
+    finally:
+        if request_id is not None:
+            cancel_registry.unregister(request_id)
+
+
+def stream_room_generation(params, stream_format, token, request_id):
+    """Run run_room_generation on a worker thread and stream its progress events."""
+    stream = ProgressStream(
+        preview_every=GENERATE_PREVIEW_EVERY,
+        preview_size=GENERATE_PREVIEW_SIZE,
+        encode_preview=encode_preview,
+        stream_format=stream_format,
+        heartbeat_seconds=STREAM_HEARTBEAT_SECONDS,
+        token=token,
+    )
+
+    def run():
+        try:
+            result = run_cancellable_generation(params, stream.token, request_id, progress=stream.step)
+            if result is None:
+                stream.fail('Generation cancelled', 409)
+            else:
+                stream.finish(result)
+        except ModelUnavailable as e:
+            stream.fail(str(e), 503)
+        except Exception as e:
+            print(f"Streamed generation error: {str(e)}")
+            stream.fail(str(e))
+
+    stream.emit('start', {
+        'request_id': request_id,
+        'stages': ['generate', 'refine'],
+        'preview_every': GENERATE_PREVIEW_EVERY,
+    })
+    threading.Thread(target=run, name="generate-stream", daemon=True).start()
+    mimetype = 'text/event-stream' if stream_format == FORMAT_SSE else 'application/x-ndjson'
+    return Response(stream.events(), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/api/generate', methods=['POST'])
 def generate_room():
     try:
         # Get uploaded image
         if 'image' not in request.files:
             return jsonify({'error': 'No image uploaded'}), 400
-        
-        image_file = request.files['image']
-        prompt = request.form.get('prompt', '')
-        room_type = request.form.get('room_type', 'living-room')
-        style = request.form.get('style', 'modern')
-        
-        # Load and process the image
-        input_image = Image.open(image_file).convert('RGB').resize((512, 512))
-        
-        # Detect items upfront so we can reuse results for prompt + pricing
-        pricing_preview = estimate_furniture_pricing(room_type, style, prompt, input_image)
-        
-        # ── IMPROVEMENT 1 + 4: Build structured prompt with enforcement ──
-        room_name = room_type.replace('-', ' ')
-        prompt_clean = prompt.strip()
-
-        # Step 1: Build the structured prompt
-        # Step 1: Build structured prompt only when needed.
-        if is_already_structured_prompt(prompt_clean):
-            structured_prompt = prompt_clean
-        else:
-            structured_prompt = build_structured_prompt(prompt_clean, room_name, style)
-
-        # Step 2: Extract and enforce furniture items
-        furniture_keys, _ = detect_furniture_items(prompt_clean)
-        furniture_items = [item_key.replace('_', ' ') for item_key in furniture_keys]
-        final_prompt = enforce_furniture_in_prompt(structured_prompt, furniture_items)
-        final_prompt = shorten_prompt_for_clip(final_prompt, max_words=70)
-
-        # Use the global negative prompt (Improvement 1)
-        negative = NEGATIVE_PROMPT
-
-        # Generate image
-        if USE_LOCAL_MODEL and design_pipe is not None:
-            print(f"Generating with ControlNet on {device}...")
-            print(f"Final Prompt: {final_prompt}")
-            print(f"Negative: {negative[:80]}...")
-            print(f"Furniture items detected: {furniture_keys}")
-            
-            if device == "cpu":
-                print("This will take 60-120 seconds on CPU with ControlNet...")
-            
-            # ── IMPROVEMENT 2 + 5: ControlNet + Two-Stage generation ──
-            with inference_lock:
-                activate_pipeline("design")
-                generated_image = two_stage_generation(
-                    input_image, final_prompt, negative
-                )
-            
-            # Clear GPU cache after generation
-            if device == "cuda":
-                torch.cuda.empty_cache()
-                print("GPU cache cleared")
-            
-            print("Generation complete!")
-        else:
-            # Demo mode: Return enhanced original image with overlay
-            print("Demo mode: Returning processed input image")
-            generated_image = input_image
-            # You could add simple PIL filters here for demo purposes
-        
-        # Use previously calculated pricing
-        pricing = pricing_preview
-        
-        return jsonify({
-            'image': image_to_base64(generated_image),
-            'pricing': pricing,
-            'furniture_detected': furniture_items,
-            'message': 'Image generated successfully' if USE_LOCAL_MODEL and design_pipe is not None else 'Demo mode active',
-            'mode': 'local' if USE_LOCAL_MODEL and design_pipe is not None else 'demo'
-        })
-        
+
+        try:
+            stream_format = requested_stream_format()
+            request_id = parse_request_id(request.form.get('request_id'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        params, error = read_generate_form()
+        if error:
+            return jsonify({'error': error}), 400
+        if stream_format is not None and request_id is None:
+            request_id = uuid.uuid4().hex
+        token = CancelToken()
+        if request_id is not None:
+            try:
+                cancel_registry.register(request_id, token)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 409
+        if stream_format is not None:
+            return stream_room_generation(params, stream_format, token, request_id)
+
+        # Without a stream there is no write to notice a disconnect on, so
+        # clients cancel through /api/generate/<request_id>/cancel instead.
+        result = run_cancellable_generation(params, token, request_id)
+        if result is None:
+            return jsonify({'error': 'Generation cancelled', 'request_id': request_id}), 409
+        return jsonify(result)
+
+    except (RequestEntityTooLarge, UploadTooLarge) as e:
+        return upload_too_large_response(e)
+    except ModelUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"Error: {str(e)}")
         import traceback
@@ -1009,6 +2283,183 @@ def generate_room():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/generate/<request_id>/cancel', methods=['POST'])
+def cancel_generation(request_id):
+    """Stop a running /api/generate request sent with this ``request_id``."""
+    if cancel_registry.cancel(request_id) is None:
+        return jsonify({'error': 'No running generation with this request_id'}), 404
+    return jsonify({'request_id': request_id, 'cancelled': True}), 200
+
+
+# ─── Async generation jobs ─────────────────────────────────────────
+JOB_QUEUE_MAX_DEPTH = int(os.environ.get("JOB_QUEUE_MAX_DEPTH", 8))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 600))
+
+
+def handle_generate_job(job):
+    try:
+        return run_room_generation(**job.payload, cancel_check=job.raise_if_cancelled)
+    except JobCancelled:
+        record_cancellation('job', job.cancelled_at)
+        raise
+
+
+job_queue = JobQueue(
+    {'generate': handle_generate_job},
+    max_depth=JOB_QUEUE_MAX_DEPTH,
+    ttl_seconds=JOB_TTL_SECONDS,
+)
+
+
+@app.route('/api/jobs/generate', methods=['POST'])
+def submit_generate_job():
+    try:
+        if 'image' not in request.files:
+            return jsonify({'error': 'No image uploaded'}), 400
+
+        params, error = read_generate_form()
+        if error:
+            return jsonify({'error': error}), 400
+        job = job_queue.submit('generate', params)
+        return jsonify({'job': job.to_dict(), 'queue_depth': job_queue.depth()}), 202
+
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '30'}
+    except (RequestEntityTooLarge, UploadTooLarge) as e:
+        return upload_too_large_response(e)
+    except Exception as e:
+        print(f"Job submit error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify({'job': job.to_dict()}), 200
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    if job.status == JOB_SUCCEEDED:
+        return jsonify(job.result), 200
+    if job.status == JOB_FAILED:
+        return jsonify({'error': job.error, 'job': job.to_dict()}), 500
+    if job.status == JOB_CANCELLED:
+        return jsonify({'error': 'Job was cancelled', 'job': job.to_dict()}), 409
+    return jsonify({'job': job.to_dict()}), 202
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    return jsonify({'job': job.to_dict()}), 200
+
+
+def run_layout_pipeline(layout_prompt, seed=None, profile=None, size=None, cancel_check=None):
+    """Run the layout pipeline once and return its LAYOUT_IMAGES_PER_PROMPT images of ``size``.
+
+    ``cancel_check`` runs after every denoising step and raises JobCancelled to stop.
+    """
+    profile = profile or profile_policy.get()
+    width, height = size or layout_size()
+    if worker_pool is not None:
+        return worker_pool.submit("layout", "layout", {
+            'layout_prompt': layout_prompt,
+            'seed': seed,
+            'profile': profile.name,
+            'size': (width, height),
+        }, cancel_check=cancel_check)
+    with inference_gate.hold("layout"):
+        activate_pipeline("layout")
+        use_scheduler(layout_pipe, profile.scheduler)
+        with pipeline_autocast():
+            result = layout_pipe(
+                prompt_embeds=get_prompt_embeds(
+                    layout_pipe, LAYOUT_TEXT_MODEL_KEY, [layout_prompt]
+                ),
+                negative_prompt_embeds=get_prompt_embeds(
+                    layout_pipe, LAYOUT_TEXT_MODEL_KEY, [LAYOUT_NEGATIVE_PROMPT]
+                ),
+                num_images_per_prompt=LAYOUT_IMAGES_PER_PROMPT,
+                num_inference_steps=profile.layout_steps,
+                guidance_scale=profile.layout_guidance,
+                width=width,
+                height=height,
+                generator=make_generator(seed),
+                callback_on_step_end=layout_step_callback(profile.cfg_cutoff, cancel_check),
+                callback_on_step_end_tensor_inputs=cfg_tensor_inputs(layout_pipe, profile.cfg_cutoff),
+            )
+
+    if device == "cuda":
+        torch.cuda.empty_cache()
+    return result.images
+
+
+# ─── Layout variant pool ───────────────────────────────────────────
+# Unseeded layout requests are served from pre-generated variants per
+# (area bucket, room count) when available; the pool refills while the
+# inference worker is idle and abandons a refill when a request arrives.
+LAYOUT_POOL_SIZE = int(os.environ.get("LAYOUT_POOL_SIZE", 2))
+
+
+def read_bucket_edge(edge):
+    edge = int(edge)
+    if edge <= 0:
+        raise ValueError("an area edge must be positive")
+    return edge
+
+
+LAYOUT_POOL_BUCKETS = read_env_list("LAYOUT_POOL_BUCKETS", read_bucket_edge, "400,700,900,1100,1300,1700,2200,3000")
+# "area:room count" pairs refilled before anyone asks, e.g. "1000:2 BHK,1400:3 BHK"
+LAYOUT_POOL_WARM = read_env_mapping("LAYOUT_POOL_WARM", lambda area, room_count: (int(area), room_count))
+LAYOUT_POOL_PRIORITY = os.environ.get("LAYOUT_POOL_PRIORITY", "demand").lower()
+LAYOUT_POOL_IDLE_SECONDS = float(os.environ.get("LAYOUT_POOL_IDLE_SECONDS", 2))
+
+
+def yield_to_requests():
+    """Stop a pool refill (between denoising steps) as soon as a request is waiting for inference."""
+    if inference_backlog() > 0:
+        raise JobCancelled("layout pool refill yielded to a waiting request")
+
+
+def generate_pool_layouts(total_area, room_count, seed):
+    return run_layout_pipeline(build_layout_prompt(total_area, room_count), seed, cancel_check=yield_to_requests)
+
+
+def layout_pool_idle():
+    """Refill only when the layout model is loaded and nothing else wants the GPU."""
+    if worker_pool is not None:
+        return worker_pool.idle("layout") and job_queue.depth() == 0
+    if not USE_LOCAL_MODEL or not model_registry.is_ready("layout"):
+        return False
+    gate = inference_gate.stats()
+    return not gate['busy'] and gate['waiting'] == 0 and job_queue.depth() == 0
+
+
+layout_pool = LayoutPool(
+    os.path.join(GENERATED_FOLDER, "layout_pool", result_cache_key(
+        LAYOUT_MODEL_ID, FLOORPLAN_LORA_ID, FLOORPLAN_LORA_WEIGHT_NAME,
+        profile_policy.get().layout_key(), layout_size(),
+    )[:12]),
+    generate_pool_layouts,
+    LAYOUT_POOL_BUCKETS,
+    LAYOUT_ROOM_COUNT_MAP,
+    size=LAYOUT_POOL_SIZE,
+    image_count=LAYOUT_IMAGES_PER_PROMPT,
+    is_idle=layout_pool_idle,
+    warm=LAYOUT_POOL_WARM,
+    priority=LAYOUT_POOL_PRIORITY,
+    idle_poll_seconds=LAYOUT_POOL_IDLE_SECONDS,
+)
+
+
 @app.route('/api/generate-layout', methods=['POST'])
 def generate_layout():
     try:
@@ -1027,48 +2478,269 @@ def generate_layout():
         if total_area <= 0:
             return jsonify({'error': 'Total area must be greater than 0'}), 400
 
+        output = (data.get('output') or OUTPUT_URL).strip().lower()
+        if output not in (OUTPUT_URL, OUTPUT_DATA_URL, OUTPUT_MULTIPART):
+            return jsonify({'error': f"output must be one of: {OUTPUT_URL}, {OUTPUT_DATA_URL}, {OUTPUT_MULTIPART}"}), 400
+
+        try:
+            image_format = negotiate_output_format(
+                data.get('format'), LAYOUT_OUTPUT_FORMAT, png_variant="png-palette"
+            )
+            image_quality = parse_quality(data.get('quality'))
+            seed = parse_seed(data.get('seed', LAYOUT_DEFAULT_SEED))
+            requested_profile = read_profile(data.get('profile'))
+            resolution, resolution_capped = read_resolution(data.get('resolution'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         normalized_room_count = (room_count or '').strip()
         if normalized_room_count.lower() == 'let ai decide':
             normalized_room_count = ''
 
         layout_prompt = build_layout_prompt(total_area, normalized_room_count)
 
-        if USE_LOCAL_MODEL and layout_pipe is not None:
-            with inference_lock:
-                activate_pipeline("layout")
-                result = layout_pipe(
-                    prompt=layout_prompt,
-                    negative_prompt=LAYOUT_NEGATIVE_PROMPT,
-                    num_images_per_prompt=4,
-                    num_inference_steps=30,
-                    guidance_scale=8.5,
-                    width=LAYOUT_IMAGE_SIZE,
-                    height=LAYOUT_IMAGE_SIZE,
-                )
-                layouts = result.images
-
-            if device == "cuda":
-                torch.cuda.empty_cache()
+        use_local = layout_model_ready()
+        cache_key = None
+        layouts = None
+        pooled = None
+        size = layout_size(resolution)
+        # Pool variants are generated with the default profile and resolution.
+        profile, downgraded = profile_policy.get(), False
+        if (use_local and seed is None and requested_profile in (None, profile.name)
+                and resolution == resolution_policy.default):
+            pooled = layout_pool.take(total_area, normalized_room_count)
+        if pooled is None:
+            profile, downgraded = profile_policy.choose(requested_profile)
+        if pooled is not None:
+            layouts, seed, pool_area = pooled
+            layout_prompt = build_layout_prompt(pool_area, normalized_room_count)
+        elif use_local and seed is not None:
+            cache_key = result_cache_key(
+                "layout", layout_prompt, LAYOUT_NEGATIVE_PROMPT, seed, LAYOUT_IMAGES_PER_PROMPT,
+                profile.layout_key(), size,
+                LAYOUT_MODEL_ID, FLOORPLAN_LORA_ID, FLOORPLAN_LORA_WEIGHT_NAME, layout_lora_loaded,
+            )
+            layouts = result_cache.get(cache_key, count=LAYOUT_IMAGES_PER_PROMPT)
+        cached = layouts is not None and pooled is None
+
+        if pooled is not None:
+            print(f"Layout pool hit for {pool_area} sq ft / {normalized_room_count or 'any'}")
+        elif cached:
+            print(f"Result cache hit for layout seed {seed}")
+        elif use_local:
+            layouts = observe_generation(
+                "layout", bucket_label(size), lambda: run_layout_pipeline(layout_prompt, seed, profile, size)
+            )
+            if cache_key is not None:
+                result_cache.put(cache_key, layouts)
         else:
             layouts = [
-                create_demo_layout(total_area, normalized_room_count, variant_index)
-                for variant_index in range(4)
+                create_demo_layout(total_area, normalized_room_count, variant_index, size)
+                for variant_index in range(LAYOUT_IMAGES_PER_PROMPT)
             ]
 
-        return jsonify({
-            'images': [image_to_base64(layout) for layout in layouts],
+        response = {
             'prompt': layout_prompt,
-            'message': '4 layout options generated successfully' if USE_LOCAL_MODEL and layout_pipe is not None else 'Demo layout mode active',
-            'mode': 'local' if USE_LOCAL_MODEL and layout_pipe is not None else 'demo',
+            'message': '4 layout options generated successfully' if use_local else 'Demo layout mode active',
+            'mode': 'local' if use_local else 'demo',
             'layout_model': LAYOUT_MODEL_ID,
             'layout_lora_loaded': layout_lora_loaded,
-            'dataset_hint': CUBI700_DATASET_HINT
-        }), 200
-
+            'dataset_hint': CUBI700_DATASET_HINT,
+            'seed': seed,
+            'cached': cached,
+            'pooled': pooled is not None,
+            'profile': profile.name,
+            'profile_downgraded': downgraded,
+            'resolution': resolution,
+            'resolution_capped': resolution_capped,
+            'width': size[0],
+            'height': size[1],
+        }
+        if output == OUTPUT_MULTIPART:
+            return multipart_response(response, layouts, image_format, image_quality)
+
+        published = [publish_image(layout, output, image_format, image_quality) for layout in layouts]
+        response['image_urls'] = [item['url'] for item in published]
+        if all('data_url' in item for item in published):
+            response['images'] = [item['data_url'] for item in published]
+        return jsonify(response), 200
+
+    except ModelUnavailable as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         print(f"Layout generation error: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/images/<image_id>', methods=['GET'])
+def get_image(image_id):
+    """Serve a stored result with ETag, conditional GET and Range support."""
+    found = image_store.lookup(image_id)
+    if found is None:
+        return jsonify({'error': 'Image not found or expired'}), 404
+
+    path, content_type = found
+    return send_file(
+        path,
+        mimetype=content_type,
+        conditional=True,
+        etag=image_id,
+        max_age=IMAGE_CACHE_MAX_AGE,
+    )
+
+
+# ─── Model loading ─────────────────────────────────────────────────
+def load_design_models():
+    load_design_pipeline()
+    try:
+        pin_negative_prompts("design")
+    except Exception as exc:
+        print(f"Negative prompt pre-encoding failed: {exc}")
+    return design_pipe
+
+
+def load_layout_models():
+    load_layout_pipeline()
+    try:
+        pin_negative_prompts("layout")
+    except Exception as exc:
+        print(f"Layout negative prompt pre-encoding failed: {exc}")
+    return layout_pipe
+
+
+model_registry = ModelRegistry()
+model_registry.register("depth_estimator", load_depth_estimator)
+model_registry.register("design", load_design_models)
+model_registry.register("layout", load_layout_models)
+
+
+def design_models_ready():
+    """Load the room-design models on first use; False means serve demo output.
+
+    Raises ModelUnavailable when USE_LOCAL_MODEL is on but the models (or
+    every worker serving them) failed to load; endpoints answer 503.
+    """
+    if not USE_LOCAL_MODEL:
+        return False
+    if worker_pool is not None:
+        error = worker_pool.unavailable("design")
+        if error is not None:
+            raise ModelUnavailable(error)
+        return True
+    model_registry.require("depth_estimator", "design")
+    return True
+
+
+def layout_model_ready():
+    if not USE_LOCAL_MODEL:
+        return False
+    if worker_pool is not None:
+        error = worker_pool.unavailable("layout")
+        if error is not None:
+            raise ModelUnavailable(error)
+        return True
+    model_registry.require("layout")
+    return True
+
+
+def models_settled():
+    """True once no model is waiting to load (lazy mode loads on demand, so it is always settled)."""
+    if not USE_LOCAL_MODEL or MODEL_LOAD_MODE == "lazy":
+        return True
+    if worker_pool is not None:
+        return worker_pool.settled()
+    return all(
+        info['state'] in (MODEL_READY, MODEL_FAILED)
+        for info in model_registry.status().values()
+    )
+
+
+# ─── Inference worker processes ────────────────────────────────────
+# INFERENCE_WORKERS lists worker processes by the pipelines they serve:
+# "design,layout" starts one of each, "design,design,layout" two design
+# workers, "design+layout" one worker for both. Each worker loads its own
+# models and uses INFERENCE_WORKER_THREADS torch threads (default: CPU
+# cores / workers). Empty (the default) runs inference in this process.
+WORKER_PIPELINES = ("design", "layout")
+INFERENCE_WORKERS = []
+for entry in os.environ.get("INFERENCE_WORKERS", "").split(","):
+    pipelines = tuple(name.strip().lower() for name in entry.split("+") if name.strip())
+    if not pipelines:
+        continue
+    if set(pipelines) - set(WORKER_PIPELINES):
+        print(f"Ignoring INFERENCE_WORKERS entry '{entry.strip()}': pipelines are {', '.join(WORKER_PIPELINES)}")
+        continue
+    INFERENCE_WORKERS.append(pipelines)
+INFERENCE_WORKER_THREADS = int(os.environ.get("INFERENCE_WORKER_THREADS", 0)) or max(
+    1, (os.cpu_count() or 1) // max(1, len(INFERENCE_WORKERS))
+)
+INFERENCE_WORKER_INIT = os.environ.get("INFERENCE_WORKER_INIT", "app:init_inference_worker")
+INFERENCE_WORKER_RESTART_SECONDS = float(os.environ.get("INFERENCE_WORKER_RESTART_SECONDS", 1))
+
+
+def inference_worker_handlers():
+    """Job handlers a worker process runs for WorkerPool.submit()."""
+
+    def design(payload, progress, cancel_check):
+        if progress is not None:
+            report = progress
+
+            def progress(stage, step, total, latents):
+                # Latents cross the process boundary as numpy.
+                if hasattr(latents, "detach"):
+                    latents = latents.detach().float().cpu().numpy()
+                report(stage, step, total, latents)
+
+        return two_stage_generation(
+            payload['image'], payload['prompt'], payload['negative_prompt'],
+            cancel_check=cancel_check, refine_mode=payload['refine_mode'], seed=payload['seed'],
+            progress=progress, profile=profile_policy.get(payload['profile']),
+            upscale_size=payload['upscale_size'],
+        )
+
+    def layout(payload, progress, cancel_check):
+        return run_layout_pipeline(
+            payload['layout_prompt'], seed=payload['seed'], profile=profile_policy.get(payload['profile']),
+            size=payload['size'], cancel_check=cancel_check,
+        )
+
+    return {'design': design, 'layout': layout}
+
+
+def init_inference_worker(pipelines, threads):
+    """Default INFERENCE_WORKER_INIT: load this worker's models and return its handlers."""
+    if device == "cpu":
+        apply_cpu_threads(threads)
+    else:
+        torch.set_num_threads(threads)
+    # A worker runs one job at a time, so there is nothing to batch with.
+    design_batcher.window_seconds = 0
+    for name in pipelines:
+        ready = design_models_ready() if name == "design" else layout_model_ready()
+        if not ready:
+            raise RuntimeError(f"{name} models failed to load")
+    return inference_worker_handlers()
+
+
+worker_pool = None
+if USE_LOCAL_MODEL and INFERENCE_WORKERS and not in_worker_process():
+    worker_pool = WorkerPool(
+        [
+            WorkerSpec(f"{index}-{'+'.join(pipelines)}", pipelines, INFERENCE_WORKER_THREADS)
+            for index, pipelines in enumerate(INFERENCE_WORKERS)
+        ],
+        INFERENCE_WORKER_INIT,
+        restart_delay=INFERENCE_WORKER_RESTART_SECONDS,
+    )
+    worker_pool.start()
+
+# Workers load their own models in init_inference_worker().
+if USE_LOCAL_MODEL and MODEL_LOAD_MODE != "lazy" and worker_pool is None and not in_worker_process():
+    model_registry.warm_up(background=MODEL_LOAD_MODE != "eager")
+
+if USE_LOCAL_MODEL and not in_worker_process():
+    layout_pool.start()
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
@@ -1080,11 +2752,61 @@ def health_check():
         'mode': 'local' if USE_LOCAL_MODEL else 'demo',
         'gpu_available': torch.cuda.is_available(),
         'layout_lora_loaded': layout_lora_loaded,
-        'layout_ready': layout_pipe is not None,
-        'depth_estimator_ready': depth_estimator is not None,
+        # With a worker pool the models live in the workers, not in this process.
+        'layout_ready': worker_pool.ready("layout") if worker_pool is not None else layout_pipe is not None,
+        'depth_estimator_ready': (
+            worker_pool.ready("design") if worker_pool is not None else depth_estimator is not None
+        ),
+        'model_load_mode': MODEL_LOAD_MODE,
+        'ready': models_settled(),
+        'models': model_registry.status(),
+        'jobs': job_queue.stats(),
+        'depth_cache': depth_cache.stats(),
+        'refine_mode': REFINE_MODE,
+        'inference_profile': INFERENCE_PROFILE,
+        'inference_workers': worker_pool.stats() if worker_pool is not None else None,
+        'cpu_tuning': cpu_tuning_status(),
+        'model_store': model_store.stats() if model_store is not None else None,
     })
 
-if __name__ == '__main__':
+
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    ready = models_settled()
+    return jsonify({
+        'ready': ready,
+        'models': model_registry.status(),
+    }), 200 if ready else 503
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'design_batching': design_batcher.stats(),
+        'profiles': profile_policy.stats(),
+        'resolution': resolution_policy.stats(),
+        'cfg_truncation': cfg_truncation.snapshot(),
+        'jobs': job_queue.stats(),
+        'cancellations': {
+            'counts': cancellations.snapshot(),
+            'latency_ms': cancel_latency_ms.snapshot(),
+            'in_flight': len(cancel_registry),
+        },
+        'depth_cache': depth_cache.stats(),
+        'prompt_cache': prompt_cache.stats(),
+        'result_cache': result_cache.stats(),
+        'layout_pool': layout_pool.stats(),
+        'budget_solver': budget_solver.stats(),
+        'catalog': catalog.stats(),
+        'residency': residency_manager.stats(),
+        'inference_gate': inference_gate.stats(),
+        'image_store': image_store.stats(),
+        'cpu_pool': cpu_pool.stats(),
+        'endpoint_limits': endpoint_limits.stats(),
+    })
+
+
+def print_startup_banner():
     print("\n" + "="*60)
     print("HOMELYTICS BACKEND SERVER")
     print("="*60)
@@ -1092,9 +2814,12 @@ if __name__ == '__main__':
     print(f"Model: {THREE_D_MODEL_ID}")
     print(f"ControlNet: {CONTROLNET_MODEL_ID}")
     print(f"2D Model: {LAYOUT_MODEL_ID}")
-    print(f"Local Model: {'Loaded' if USE_LOCAL_MODEL and design_pipe else 'Disabled (Demo Mode)'}")
-    print(f"Depth Estimator: {'Ready' if depth_estimator else 'Not loaded'}")
-    print(f"Layout Model: {'Loaded' if layout_pipe else 'Unavailable'}")
+    print(f"Local Model: {'Enabled' if USE_LOCAL_MODEL else 'Disabled (Demo Mode)'}")
+    if USE_LOCAL_MODEL:
+        print(f"Model Loading: {MODEL_LOAD_MODE} (see /api/health for per-model status)")
+    if device == "cpu":
+        print(f"CPU Tuning: {cpu_tuning.name} ({torch.get_num_threads()} threads, "
+              f"{torch.get_num_interop_threads()} inter-op)")
     if device == "cpu" and USE_LOCAL_MODEL:
         print("\nWARNING: Running on CPU!")
         print("For fast generation:")
@@ -1102,5 +2827,10 @@ if __name__ == '__main__':
         print("   Option 2: Rent cloud GPU (RunPod, Paperspace, etc.)")
         print("   Option 3: Set USE_LOCAL_MODEL=False for demo mode")
     print("="*60 + "\n")
-    
+
+
+if __name__ == '__main__':
+    apply_cpu_threads()
+    print_startup_banner()
+    # Development server; use serve.py in production.
     app.run(debug=False, port=5000)
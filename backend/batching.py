@@ -0,0 +1,120 @@
+"""Cross-request micro-batching for the diffusion pipelines.
+
+Callers submit work items under a compatibility key (for the design
+pipeline: strength, steps, guidance, conditioning scale and image size).
+A dispatcher thread waits up to ``window_seconds`` after the oldest pending
+item for more items with the same key, runs them as one batched call and
+hands each caller its own result.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+from metrics import Histogram
+
+BATCH_SIZE_BOUNDS = [1, 2, 4, 8, 16]
+WAIT_MS_BOUNDS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 30000]
+
+
+class _Pending:
+    def __init__(self, item):
+        self.item = item
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchScheduler:
+    """Group compatible requests and run them through ``runner`` together.
+
+    ``runner(key, items)`` must return one result per item, in order.
+    """
+
+    def __init__(self, runner, window_seconds=0.05, max_batch_size=4, name="batch"):
+        self.runner = runner
+        self.window_seconds = window_seconds
+        self.max_batch_size = max(1, max_batch_size)
+        self.name = name
+        self.batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+        self.wait_ms = Histogram(WAIT_MS_BOUNDS)
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, key, item):
+        """Queue ``item`` and block until its batch has run."""
+        pending = _Pending(item)
+        with self._cond:
+            self._pending.setdefault(key, []).append(pending)
+            self._ensure_thread()
+            self._cond.notify()
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def queued(self):
+        with self._cond:
+            return sum(len(items) for items in self._pending.values())
+
+    def stats(self):
+        queued = self.queued()
+        return {
+            'window_ms': round(self.window_seconds * 1000, 1),
+            'max_batch_size': self.max_batch_size,
+            'queued': queued,
+            'batch_size': self.batch_sizes.snapshot(),
+            'wait_ms': self.wait_ms.snapshot(),
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-scheduler", daemon=True)
+            self._thread.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            # Serve the key holding the oldest request first.
+            key = next(iter(self._pending))
+            deadline = self._pending[key][0].enqueued_at + self.window_seconds
+            while len(self._pending[key]) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            items = self._pending[key]
+            batch = items[:self.max_batch_size]
+            if len(items) > len(batch):
+                self._pending[key] = items[len(batch):]
+            else:
+                del self._pending[key]
+            return key, batch
+
+    def _run(self):
+        while True:
+            key, batch = self._next_batch()
+            started = time.monotonic()
+            self.batch_sizes.observe(len(batch))
+            for pending in batch:
+                self.wait_ms.observe((started - pending.enqueued_at) * 1000)
+
+            try:
+                results = self.runner(key, [pending.item for pending in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(
+                        f"{self.name} runner returned {len(results)} results for {len(batch)} items"
+                    )
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as exc:
+                for pending in batch:
+                    pending.error = exc
+            finally:
+                for pending in batch:
+                    pending.done.set()
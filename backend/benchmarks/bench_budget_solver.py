@@ -0,0 +1,142 @@
+"""Budget suggestions: knapsack solver vs the old greedy walk.
+
+Counts on random budgets how often the solver's best bundle beats greedy
+and how much of the budget each leaves unspent, then times solves against
+the built-in catalog and a synthetic catalog with thousands of SKUs.
+
+    python benchmarks/bench_budget_solver.py --budgets 2000 --skus-per-item 120
+"""
+import argparse
+import json
+import os
+import random
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+
+from common import summarize, time_call  # noqa: E402
+
+import app  # noqa: E402
+from budget_solver import BudgetSolver  # noqa: E402
+
+
+def legacy_greedy(solver, room_type, budget):
+    """The pre-solver implementation: take each priority item if it still fits."""
+    remaining = budget
+    chosen = []
+    for item_key in solver.room_items(room_type):
+        skus = solver.skus(item_key)
+        if skus:
+            price = skus[0]['price']
+            if price <= remaining:
+                chosen.append(item_key)
+                remaining -= price
+    return chosen, budget - remaining
+
+
+def bundle_value(solver, room_type, quantities):
+    """Score ``{item_key: quantity}`` with the solver's own weights."""
+    groups = {group.key: group for group in solver._groups(room_type, frozenset())}
+    return sum(groups[key].options[quantity - 1][1] for key, quantity in quantities.items())
+
+
+def compare_with_greedy(solver, rooms, budgets, rng):
+    """How often the best bundle beats greedy, and how much of the budget each leaves unspent.
+
+    Correctness (budget, must-haves, ordering, never worse than greedy) is
+    covered by tests/test_budget_solver.py.
+    """
+    wins = 0
+    unspent_greedy = 0
+    unspent_solver = 0
+    for budget in budgets:
+        room_type = rng.choice(rooms)
+        best = solver.solve(room_type, budget)[0]
+        greedy_keys, greedy_cost = legacy_greedy(solver, room_type, budget)
+        if best['value'] > bundle_value(solver, room_type, {key: 1 for key in greedy_keys}):
+            wins += 1
+        unspent_greedy += budget - greedy_cost
+        unspent_solver += budget - best['cost']
+
+    count = len(budgets)
+    return {
+        'budgets': count,
+        'solver_better_than_greedy': wins,
+        'mean_unspent_greedy': round(unspent_greedy / count),
+        'mean_unspent_solver': round(unspent_solver / count),
+    }
+
+
+def expanded_catalog(skus_per_item, extra_items, seed):
+    """Every built-in item gets ``skus_per_item`` priced variants, and every
+    room gets ``extra_items`` more synthetic items."""
+    rng = random.Random(seed)
+    catalog = {}
+    for key, _ in app.catalog.all_synonyms():
+        info = app.catalog.get(key)
+        catalog[key] = [
+            {'name': f"{info['name']} #{i}", 'price': int(info['price'] * rng.uniform(0.4, 3.0))}
+            for i in range(skus_per_item)
+        ]
+    priorities = {}
+    for room_type in app.catalog.room_types():
+        keys = app.catalog.room_items(room_type)
+        extra = []
+        for n in range(extra_items):
+            key = f"{room_type}_extra_{n}"
+            base = rng.randint(500, 60000)
+            catalog[key] = [
+                {'name': f"{key} #{i}", 'price': int(base * rng.uniform(0.5, 2.5))}
+                for i in range(skus_per_item)
+            ]
+            extra.append(key)
+        priorities[room_type] = list(keys) + extra
+    for skus in catalog.values():
+        skus.sort(key=lambda sku: sku['price'])
+    return catalog, priorities
+
+
+def time_solves(solver, rooms, budgets, rng):
+    picks = [(rng.choice(rooms), budget) for budget in budgets]
+
+    def run():
+        for room_type, budget in picks:
+            solver.solve(room_type, budget)
+
+    _, timings = time_call(run, repeats=3)
+    per_solve = [t / len(picks) for t in timings]
+    return summarize(per_solve)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budgets", type=int, default=2000)
+    parser.add_argument("--skus-per-item", type=int, default=120)
+    parser.add_argument("--extra-items", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rooms = app.catalog.room_types()
+    budgets = [rng.randint(5_000, 1_000_000) for _ in range(args.budgets)]
+
+    builtin = app.budget_solver
+    report = {'builtin': compare_with_greedy(builtin, rooms, budgets, rng)}
+    report['builtin']['solve'] = time_solves(builtin, rooms, budgets, rng)
+
+    catalog, priorities = expanded_catalog(args.skus_per_item, args.extra_items, args.seed)
+    expanded = BudgetSolver(lambda key: catalog.get(key, []), lambda room: priorities.get(room, []),
+                            quantity_limits=app.FURNITURE_QUANTITY_LIMITS)
+    _, build_timings = time_call(lambda: expanded.precompute(rooms), repeats=1, warmup=0)
+    report['expanded'] = {
+        'skus': sum(len(skus) for skus in catalog.values()),
+        'precompute_ms': round(build_timings[0] * 1000, 1),
+        'solve': time_solves(expanded, rooms, budgets, rng),
+        'solve_at_10_lakh': time_solves(expanded, rooms, [1_000_000] * 200, rng),
+        'tables': expanded.stats(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Cancelling in-flight room generations against the fake step-callback pipeline.
+
+Each scenario starts a generation, waits for a few denoising steps and
+then cancels it: an explicit POST /api/generate/<request_id>/cancel, a
+streaming client that disconnects, and a job cancel. It reports how many
+steps ran after the cancel (the target is at most one) and how long the
+request took to end. A second request queued behind the cancelled one
+shows how soon the gate is handed on.
+
+    python benchmarks/bench_cancellation.py --step-ms 40
+"""
+import argparse
+import json
+import threading
+import time
+
+from bench_generate_stream import install_fake_pipeline, post_generate, read_stream, room_upload
+
+import app  # noqa: E402
+
+
+def wait_for_steps(fake, count, timeout=30):
+    deadline = time.time() + timeout
+    while fake.steps < count and time.time() < deadline:
+        time.sleep(0.002)
+
+
+def cancel_and_measure(fake, cancel, finished, settle_seconds):
+    """Call ``cancel()`` and report the steps run until ``finished`` is set, plus the delay."""
+    steps_at_cancel = fake.steps
+    started = time.perf_counter()
+    cancel()
+    finished.wait(30)
+    stopped_ms = (time.perf_counter() - started) * 1000
+    time.sleep(settle_seconds)
+    return {
+        'steps_after_cancel': fake.steps - steps_at_cancel,
+        'stopped_ms': round(stopped_ms, 1),
+    }
+
+
+def explicit_cancel(fake, client, settle_seconds):
+    result = {}
+    finished = threading.Event()
+
+    def run():
+        response = app.app.test_client().post(
+            '/api/generate',
+            data={'image': (room_upload(), 'room.png'), 'request_id': 'bench-explicit'},
+            content_type='multipart/form-data',
+        )
+        result['status'] = response.status_code
+        finished.set()
+
+    worker = threading.Thread(target=run)
+    fake.steps = 0
+    worker.start()
+    wait_for_steps(fake, 3)
+    report = cancel_and_measure(
+        fake, lambda: client.post('/api/generate/bench-explicit/cancel'), finished, settle_seconds,
+    )
+    worker.join()
+    report['status'] = result['status']
+    return report
+
+
+def disconnect(fake, client, settle_seconds):
+    seen = app.cancellations.snapshot().get('disconnect', 0)
+    finished = threading.Event()
+
+    def watch():
+        while app.cancellations.snapshot().get('disconnect', 0) == seen:
+            time.sleep(0.002)
+        finished.set()
+
+    fake.steps = 0
+    response = post_generate(client, stream='sse')
+    read_stream(response, stop_after=lambda name, data: data.get('step') == 3)
+    threading.Thread(target=watch, daemon=True).start()
+    # Closing the response is the disconnect; it already happened in read_stream.
+    return cancel_and_measure(fake, lambda: None, finished, settle_seconds)
+
+
+def job_cancel(fake, client, settle_seconds):
+    fake.steps = 0
+    response = client.post('/api/jobs/generate', data={'image': (room_upload(), 'room.png')},
+                           content_type='multipart/form-data')
+    job_id = response.get_json()['job']['id']
+    wait_for_steps(fake, 3)
+    finished = threading.Event()
+
+    def watch():
+        while app.job_queue.get(job_id).finished_at is None:
+            time.sleep(0.002)
+        finished.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    report = cancel_and_measure(fake, lambda: client.post(f'/api/jobs/{job_id}/cancel'), finished, settle_seconds)
+    report['status'] = app.job_queue.get(job_id).status
+    return report
+
+
+def queued_behind(fake, client, step_seconds):
+    """Latency of a request queued behind one that is cancelled after three steps."""
+    timings = {}
+
+    def run(name, request_id):
+        started = time.perf_counter()
+        response = app.app.test_client().post(
+            '/api/generate',
+            data={'image': (room_upload(), 'room.png'), 'request_id': request_id},
+            content_type='multipart/form-data',
+        )
+        timings[name] = (response.status_code, time.perf_counter() - started)
+
+    fake.steps = 0
+    first = threading.Thread(target=run, args=('cancelled', 'bench-first'))
+    first.start()
+    wait_for_steps(fake, 1)
+    second = threading.Thread(target=run, args=('queued', 'bench-second'))
+    second.start()
+    wait_for_steps(fake, 3)
+    client.post('/api/generate/bench-first/cancel')
+    first.join()
+    second.join()
+    full_run = (int(app.CONTROLNET_STEPS * app.STAGE1_STRENGTH)
+                + int(app.STAGE2_STEPS * app.STAGE2_STRENGTH)) * step_seconds
+    return {
+        'cancelled_status': timings['cancelled'][0],
+        'queued_status': timings['queued'][0],
+        'queued_ms': round(timings['queued'][1] * 1000, 1),
+        'queued_ms_if_not_cancelled': round(2 * full_run * 1000, 1),
+        'queued_ms_lower_bound': round((full_run + 3 * step_seconds) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--step-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    step_seconds = args.step_ms / 1000
+    fake = install_fake_pipeline(step_seconds)
+    client = app.app.test_client()
+    settle_seconds = 3 * step_seconds
+
+    report = {
+        'explicit': explicit_cancel(fake, client, settle_seconds),
+        'disconnect': disconnect(fake, client, settle_seconds),
+        'job': job_cancel(fake, client, settle_seconds),
+        'queued_behind_cancelled': queued_behind(fake, client, step_seconds),
+        'metrics': app.app.test_client().get('/api/metrics').get_json()['cancellations'],
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Catalog lookups and incremental reload on a large synthetic catalog.
+
+Builds a SQLite catalog with ``--items`` items, then times point lookups
+(uncached and cached), synonym / room / price-range queries, and a hot reload
+of ``--edits`` items including the matcher and budget-table updates.
+
+    python benchmarks/bench_catalog.py --items 50000 --edits 200
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+from common import time_call
+
+from budget_solver import BudgetSolver
+from catalog import CatalogStore
+from furniture_matcher import FurnitureMatcher
+
+WORDS = [
+    "oak", "teak", "walnut", "velvet", "linen", "rattan", "marble", "steel", "cane", "boucle",
+    "compact", "grand", "nordic", "classic", "curved", "modular", "tufted", "slim", "floating", "vintage",
+]
+KINDS = [
+    "sofa", "chair", "table", "lamp", "shelf", "cabinet", "bench", "stool", "mirror", "rug",
+    "bed", "desk", "dresser", "ottoman", "console", "planter", "sideboard", "wardrobe", "cart", "screen",
+]
+ROOMS = ["living_room", "bedroom", "kitchen", "bathroom", "office", "dining_room"]
+
+
+def synthetic_catalog(count, room_size, seed):
+    rng = random.Random(seed)
+    items = {}
+    for index in range(count):
+        words = rng.sample(WORDS, 2) + [rng.choice(KINDS)]
+        key = f"{'_'.join(words)}_{index}"
+        items[key] = {
+            'name': " ".join(words).title(),
+            'price': rng.randint(5, 2000) * 100,
+            'synonyms': [" ".join(words), f"{words[0]} {words[2]} {index}"],
+        }
+    keys = list(items)
+    rooms = {room: rng.sample(keys, room_size) for room in ROOMS}
+    return {'items': items, 'rooms': rooms}
+
+
+def per_call(fn, args_list):
+    def run():
+        for args in args_list:
+            fn(*args)
+    _, timings = time_call(run, repeats=3, warmup=0)
+    per = sorted(t / len(args_list) for t in timings)
+    return {'mean_us': round(sum(per) / len(per) * 1e6, 1), 'p50_us': round(per[len(per) // 2] * 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--room-size", type=int, default=60)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    data = synthetic_catalog(args.items, args.room_size, args.seed)
+    report = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "catalog.db")
+        started = time.perf_counter()
+        store = CatalogStore(path, cache_entries=4096)
+        store.import_data(data)
+        store.revision = store.current_revision()
+        report['import_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        report['db_bytes'] = os.path.getsize(path)
+
+        started = time.perf_counter()
+        matcher = FurnitureMatcher(dict(store.all_synonyms()))
+        report['matcher_build_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        solver = BudgetSolver(store.skus, store.room_items, price_unit=100)
+        started = time.perf_counter()
+        solver.precompute(ROOMS)
+        report['solver_precompute_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        keys = list(data['items'])
+        sample = [(rng.choice(keys),) for _ in range(args.lookups)]
+        report['get_uncached'] = per_call(lambda key: (store._items.clear(), store.get(key)), sample[:500])
+        report['get_cached'] = per_call(store.get, [(key,) for key in keys[:1000]] * 3)
+        report['links'] = per_call(store.links, sample)
+        phrases = [(data['items'][key]['synonyms'][0],) for (key,) in sample[:1000]]
+        report['keys_for_synonym'] = per_call(store.keys_for_synonym, phrases)
+        report['room_items'] = per_call(store.room_items, [(room,) for room in ROOMS] * 100)
+        ranges = [(low, low + 5000, None, 50) for low in (rng.randint(500, 190000) for _ in range(500))]
+        report['price_range'] = per_call(store.items_in_price_range, ranges)
+        report['solve'] = per_call(solver.solve, [(rng.choice(ROOMS), rng.randint(10_000, 1_000_000)) for _ in range(500)])
+
+        edited = rng.sample(keys, args.edits)
+        writer = CatalogStore(path)
+        writer.import_data({'items': {
+            key: dict(data['items'][key], price=data['items'][key]['price'] + 100,
+                      synonyms=data['items'][key]['synonyms'] + [f"edited {key}"])
+            for key in edited
+        }})
+
+        started = time.perf_counter()
+        changes = store.reload()
+        for key in changes.updated | changes.removed:
+            matcher.remove(key)
+        for key in changes.updated:
+            matcher.add(key, store.synonyms(key))
+        solver.invalidate(changes.rooms)
+        report['reload_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        report['reload_changes'] = repr(changes)
+        report['matches_after_reload'] = len(matcher.find(f"edited {edited[0]}"))
+        report['cached_items'] = len(store._items)
+        report['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
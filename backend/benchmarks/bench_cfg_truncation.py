@@ -0,0 +1,119 @@
+"""UNet work and wall time saved by truncating classifier-free guidance.
+
+Drives /api/generate and /api/generate-layout through the Flask test client
+with the tiny CPU pipelines from tiny_sd.py, once with guidance on for every
+step and once per ``--cutoffs`` value. The UNet and ControlNet forwards are
+wrapped to count calls and batch rows, so the report shows how many
+unconditional rows each cutoff removed next to the request latency.
+
+    python benchmarks/bench_cfg_truncation.py --cutoffs 1.0,0.6,0.4 --repeats 1
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+os.environ.setdefault("RESULT_CACHE_DISK", "false")
+os.environ.setdefault("DESIGN_BATCH_WINDOW_MS", "0")
+
+from common import summarize  # noqa: E402
+
+import torch  # noqa: E402
+
+import app  # noqa: E402
+from bench_generate_stream import room_upload  # noqa: E402
+import tiny_sd  # noqa: E402
+
+
+class ForwardCounter:
+    """Wraps a module's forward to count calls and batch rows."""
+
+    def __init__(self, module):
+        self.calls = 0
+        self.rows = 0
+        forward = module.forward
+
+        def counted(sample, *args, **kwargs):
+            self.calls += 1
+            self.rows += sample.shape[0]
+            return forward(sample, *args, **kwargs)
+
+        module.forward = counted
+
+    def reset(self):
+        self.calls = self.rows = 0
+
+
+def run(client, counters, endpoint, repeats, seed):
+    """Time ``repeats`` requests; returns timings plus per-request forward counts."""
+    timings = []
+    for counter in counters.values():
+        counter.reset()
+    for index in range(repeats):
+        started = time.perf_counter()
+        if endpoint == "room":
+            response = client.post('/api/generate', data={
+                'image': (room_upload(), 'room.png'),
+                'prompt': 'sofa, rug, floor lamp',
+                'profile': 'quality',
+                'seed': str(seed + index),
+            }, content_type='multipart/form-data')
+        else:
+            response = client.post('/api/generate-layout', json={
+                'total_area': 1000, 'room_count': '2 BHK', 'profile': 'quality', 'seed': seed + index,
+            })
+        assert response.status_code == 200, response.get_data(as_text=True)
+        timings.append(time.perf_counter() - started)
+    return {
+        'latency': summarize(timings),
+        **{
+            f"{name}_{field}": getattr(counter, field) // repeats
+            for name, counter in counters.items() for field in ('calls', 'rows')
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cutoffs", default="1.0,0.75,0.6,0.4")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--layout-size", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    design, layout = tiny_sd.install(app)
+    app.layout_model_ready = lambda: True
+    app.layout_size = lambda tier=None: (args.layout_size, args.layout_size)
+    counters = {
+        'unet': ForwardCounter(design.unet),
+        'controlnet': ForwardCounter(design.controlnet),
+    }
+    client = app.app.test_client()
+    profile = app.profile_policy.get("quality")
+    configured = {p.name: p.cfg_cutoff for p in app.INFERENCE_PROFILES}
+    cutoffs = sorted({float(value) for value in args.cutoffs.split(",")} | {1.0}, reverse=True)
+
+    report = {'threads': args.threads, 'configured_cutoffs': configured, 'room': {}, 'layout': {}}
+    seed = 1
+    for cutoff in cutoffs:
+        profile.cfg_cutoff = cutoff
+        for endpoint in ("room", "layout"):
+            # Fresh seeds each time so the result cache never answers.
+            run(client, counters, endpoint, 1, seed + args.repeats)
+            report[endpoint][f"cutoff_{cutoff}"] = run(client, counters, endpoint, args.repeats, seed)
+            seed += args.repeats + 1
+
+    for endpoint in ("room", "layout"):
+        full = report[endpoint]["cutoff_1.0"]
+        for entry in report[endpoint].values():
+            entry['unet_rows_saved'] = round(1 - entry['unet_rows'] / full['unet_rows'], 3)
+            entry['speedup'] = round(full['latency']['p50_ms'] / entry['latency']['p50_ms'], 2)
+    report['cfg_truncation'] = app.cfg_truncation.snapshot()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""CPU tuning profiles compared on tiny randomly initialised pipelines.
+
+Every profile in cpu_tuning.CPU_TUNING_PROFILES runs in a fresh spawned
+process (thread pools can only be configured once per process, and peak
+RSS has to be its own): apply the profile, build the tiny SD 1.x-shaped
+pipelines from tiny_sd.py, tune them, then time a ControlNet img2img call
+(the design pipeline) and a text-to-image call (the layout pipeline) at
+``--size``, plus a VAE encode/decode round trip at ``--large-size``, where
+VAE tiling applies, with its peak RSS growth. The first call is reported
+separately because it pays for torch.compile. Outputs are compared with
+the "none" profile, which shows how far bf16 autocast and tiling move the
+pixels.
+
+    python benchmarks/bench_cpu_tuning.py --size 256 --repeats 3
+"""
+import argparse
+import json
+import multiprocessing
+import time
+
+from common import ssim, summarize
+
+import numpy as np
+from PIL import Image
+
+from metrics import peak_rss_bytes, reset_peak_rss
+
+PROMPT = "sofa, rug, floor lamp"
+
+
+def measure(profile, threads, size, large_size, steps, repeats):
+    """Runs in a fresh process; returns timings, what took effect and the output images."""
+    import torch
+
+    from cpu_tuning import CPU_TUNING_PROFILES, apply_threads, autocast, tune_pipeline
+    import tiny_sd
+
+    tuning = CPU_TUNING_PROFILES[profile].replace(threads=threads)
+    thread_state = apply_threads(tuning)
+    design, layout = tiny_sd.tiny_pipelines()
+    applied = tune_pipeline(design, tuning)
+    # The layout pipeline shares its modules; this only tunes what is not tuned yet.
+    tune_pipeline(layout, tuning)
+
+    room = Image.fromarray(
+        np.random.default_rng(0).integers(0, 255, (size, size, 3), dtype=np.uint8)
+    )
+    depth = room.convert("L").convert("RGB")
+
+    def design_call():
+        with torch.inference_mode(), autocast(tuning):
+            return design(
+                PROMPT, image=room, control_image=depth, strength=0.75, num_inference_steps=steps,
+                generator=torch.Generator().manual_seed(0), output_type="pil",
+            ).images[0]
+
+    def layout_call(side):
+        with torch.inference_mode(), autocast(tuning):
+            return layout(
+                PROMPT, width=side, height=side, num_inference_steps=steps,
+                generator=torch.Generator().manual_seed(0),
+            ).images[0]
+
+    report = {'threads': thread_state, 'applied': applied}
+    outputs = {}
+    for name, call in (('design', design_call), ('layout', lambda: layout_call(size))):
+        started = time.perf_counter()
+        outputs[name] = call()
+        report[f'{name}_first_call_ms'] = round((time.perf_counter() - started) * 1000)
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            call()
+            timings.append(time.perf_counter() - started)
+        report[name] = summarize(timings)
+
+    # Peak RSS of the whole run, before the large round trip gets its own watermark.
+    report['peak_rss_mb'] = round(peak_rss_bytes() / 1024 / 1024, 1)
+
+    pixels = np.asarray(room.resize((large_size, large_size), Image.Resampling.BICUBIC), dtype=np.float32)
+    sample = torch.from_numpy(pixels / 127.5 - 1).permute(2, 0, 1)[None]
+    reset_peak_rss()
+    baseline = peak_rss_bytes()
+    started = time.perf_counter()
+    with torch.inference_mode(), autocast(tuning):
+        latents = design.vae.encode(sample).latent_dist.mode()
+        decoded = design.vae.decode(latents).sample
+    report['vae_large_ms'] = round((time.perf_counter() - started) * 1000)
+    report['vae_large_peak_growth_mb'] = round((peak_rss_bytes() - baseline) / 1024 / 1024, 1)
+    decoded = ((decoded[0].float().permute(1, 2, 0) + 1) * 127.5).clamp(0, 255).to(torch.uint8).numpy()
+    outputs['vae_large'] = Image.fromarray(decoded)
+    return report, {name: np.asarray(image) for name, image in outputs.items()}
+
+
+def compare(image, reference):
+    difference = np.abs(image.astype(np.int16) - reference.astype(np.int16))
+    return {
+        'max_abs_diff': int(difference.max()),
+        'mean_abs_diff': round(float(difference.mean()), 2),
+        'ssim': round(ssim(Image.fromarray(reference), Image.fromarray(image)), 4),
+    }
+
+
+def main():
+    from cpu_tuning import CPU_TUNING_PROFILES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profiles", default=",".join(CPU_TUNING_PROFILES))
+    parser.add_argument("--threads", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--large-size", type=int, default=1536)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    # "none" runs first; the other profiles are compared with it.
+    profiles = ["none"] + [name.strip() for name in args.profiles.split(",") if name.strip() not in ("", "none")]
+
+    context = multiprocessing.get_context("spawn")
+    report = {'threads': args.threads, 'size': args.size, 'large_size': args.large_size, 'steps': args.steps}
+    reference = None
+    for profile in profiles:
+        with context.Pool(1) as pool:
+            result, outputs = pool.apply(
+                measure, (profile, args.threads, args.size, args.large_size, args.steps, args.repeats)
+            )
+        if profile == "none":
+            reference = outputs
+        else:
+            result['vs_none'] = {name: compare(outputs[name], reference[name]) for name in outputs}
+            result['design_speedup'] = round(report['none']['design']['mean_ms'] / result['design']['mean_ms'], 2)
+            result['layout_speedup'] = round(report['none']['layout']['mean_ms'] / result['layout']['mean_ms'], 2)
+        report[profile] = result
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Encode time and size per output format for design and layout results.
+
+    python benchmarks/bench_encoders.py [--image generated_room.png]
+
+Without --image a synthetic photo-like 512x512 image stands in for a
+design result. Layouts come from create_demo_layout. ``legacy-png`` is the
+old image_to_base64 path (Pillow default PNG, then base64).
+"""
+import argparse
+import base64
+from io import BytesIO
+import json
+import os
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+
+from common import summarize, time_call  # noqa: E402
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import app  # noqa: E402
+from encoders import OUTPUT_FORMATS, encode  # noqa: E402
+
+DESIGN_FORMATS = ("png", "jpeg", "webp", "webp-lossless")
+
+
+def legacy_png_base64(image):
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue())
+
+
+def synthetic_room(size=512, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size]
+    base = np.stack([x * 0.4 + 60, y * 0.3 + 80, (x + y) * 0.2 + 50], axis=-1)
+    noise = rng.normal(0, 12, size=(size, size, 3))
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8))
+
+
+def bench(image, formats, repeats):
+    report = {}
+    data, timings = time_call(lambda: legacy_png_base64(image), repeats=repeats)
+    report['legacy-png'] = dict(summarize(timings), bytes=len(data))
+    for fmt in formats:
+        (data, _), timings = time_call(lambda: encode(image, fmt), repeats=repeats)
+        report[fmt] = dict(summarize(timings), bytes=len(data))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", help="design result to encode")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    design = Image.open(args.image).convert("RGB") if args.image else synthetic_room()
+    layout = app.create_demo_layout(1000, "2 BHK", 0)
+
+    print(json.dumps({
+        'design': bench(design, DESIGN_FORMATS, args.repeats),
+        'layout': bench(layout, OUTPUT_FORMATS, args.repeats),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
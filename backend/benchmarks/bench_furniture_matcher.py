@@ -0,0 +1,108 @@
+"""Throughput of furniture detection and pricing: compiled matcher vs the old per-synonym regex loop.
+
+    python benchmarks/bench_furniture_matcher.py --prompts 20000
+"""
+import argparse
+import json
+import os
+import random
+import re
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+
+from common import time_call  # noqa: E402
+
+import app  # noqa: E402
+
+SYNONYMS = app.build_furniture_synonyms()
+
+FILLERS = [
+    "add", "a", "cozy", "with", "and", "near the window", "in walnut", "please",
+    "modern", "beige", "large", "small", "for reading", "by the wall", "plus",
+]
+
+
+def legacy_detect(prompt):
+    """The pre-matcher implementation: one re.search per synonym per key."""
+    prompt_normalized = app.normalize_prompt_text(prompt)
+    matched_keys = []
+    matched_phrases = set()
+    for item_key, synonyms in SYNONYMS.items():
+        for synonym in synonyms:
+            pattern = r"(?<!\w)" + re.escape(synonym) + r"(?!\w)"
+            if re.search(pattern, prompt_normalized):
+                matched_keys.append(item_key)
+                matched_phrases.add(synonym)
+                break
+    return matched_keys, matched_phrases
+
+
+def legacy_segments_skipped(prompt, matched_keywords):
+    skipped = 0
+    for segment in re.split(r',|/|\.|;|\n|\r|\band\b|\bwith\b|\bplus\b|\b&\b', prompt):
+        segment_lower = app.normalize_prompt_text(segment.strip())
+        if any(re.search(r'(?<!\w)' + re.escape(k) + r'(?!\w)', segment_lower) for k in matched_keywords):
+            skipped += 1
+    return skipped
+
+
+def matcher_segments_skipped(prompt, matched_keywords):
+    skipped = 0
+    for segment in re.split(r',|/|\.|;|\n|\r|\band\b|\bwith\b|\bplus\b|\b&\b', prompt):
+        segment_lower = app.normalize_prompt_text(segment.strip())
+        if any(m.phrase in matched_keywords for m in app.furniture_matcher.find(segment_lower)):
+            skipped += 1
+    return skipped
+
+
+def make_corpus(count, seed):
+    rng = random.Random(seed)
+    phrases = [p for synonyms in SYNONYMS.values() for p in synonyms]
+    corpus = []
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(3, 10)):
+            parts.append(rng.choice(phrases) if rng.random() < 0.5 else rng.choice(FILLERS))
+        corpus.append(", ".join(parts))
+    return corpus
+
+
+def run(corpus, detect, skip_segments):
+    def scan():
+        for prompt in corpus:
+            _, phrases = detect(prompt)
+            skip_segments(prompt, phrases)
+
+    _, timings = time_call(scan, repeats=1, warmup=0)
+    return {'seconds': round(timings[0], 3), 'prompts_per_second': round(len(corpus) / timings[0], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.prompts, args.seed)
+    legacy = run(corpus, legacy_detect, legacy_segments_skipped)
+    matcher = run(corpus, app.detect_furniture_items, matcher_segments_skipped)
+
+    # Longest-match intentionally differs where one synonym contains another
+    # ("artificial plant" no longer also yields "plant").
+    differing = sum(
+        1 for prompt in corpus
+        if set(legacy_detect(prompt)[0]) != set(app.detect_furniture_items(prompt)[0])
+    )
+
+    print(json.dumps({
+        'prompts': len(corpus),
+        'phrases': app.furniture_matcher.phrase_count,
+        'legacy': legacy,
+        'matcher': matcher,
+        'speedup': round(legacy['seconds'] / matcher['seconds'], 1),
+        'prompts_with_different_keys': differing,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
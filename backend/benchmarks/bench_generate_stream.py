@@ -0,0 +1,156 @@
+"""Streamed /api/generate against a fake pipeline that drives the step callback.
+
+The fake design pipeline sleeps ``--step-ms`` per denoising step and hands
+random latents to ``callback_on_step_end`` like diffusers does, so the full
+request path (batcher, two-stage flow, ProgressStream, SSE framing) runs
+without model weights. Reports time to first event and first preview
+against total latency and the cost of preview encoding.
+bench_cancellation.py reuses the fake pipeline.
+
+    python benchmarks/bench_generate_stream.py --step-ms 40 --requests 5
+"""
+import argparse
+from io import BytesIO
+import json
+import os
+import time
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+os.environ.setdefault("RESULT_CACHE_DISK", "false")
+os.environ.setdefault("DESIGN_BATCH_WINDOW_MS", "0")
+
+from common import summarize  # noqa: E402
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+import torch  # noqa: E402
+
+import app  # noqa: E402
+from progress import latents_to_preview  # noqa: E402
+
+
+class FakeDesignPipeline:
+    """Stands in for the ControlNet and img2img pipelines."""
+
+    _execution_device = "cpu"
+    scheduler = None
+
+    def __init__(self, step_seconds):
+        self.step_seconds = step_seconds
+        self.calls = 0
+        self.steps = 0
+        self.num_timesteps = 0
+
+    def encode_prompt(self, text, device, count, do_cfg):
+        return torch.zeros(1, 77, 768), None
+
+    def __call__(self, image, num_inference_steps, strength, callback_on_step_end=None, **kwargs):
+        self.calls += 1
+        self.num_timesteps = max(1, int(num_inference_steps * strength))
+        width, height = image[0].size
+        rng = np.random.default_rng(self.calls)
+        latents = rng.standard_normal((len(image), 4, height // 8, width // 8)).astype(np.float32)
+        for step in range(self.num_timesteps):
+            time.sleep(self.step_seconds)
+            self.steps += 1
+            latents = latents * 0.9
+            if callback_on_step_end is not None:
+                callback_on_step_end(self, step, step, {'latents': latents})
+        return type("Output", (), {'images': list(image)})()
+
+
+def room_upload():
+    buffer = BytesIO()
+    Image.new("RGB", (512, 512), (180, 170, 150)).save(buffer, format="PNG")
+    buffer.seek(0)
+    return buffer
+
+
+def post_generate(client, **form):
+    data = {'image': (room_upload(), 'room.png'), 'prompt': 'sofa, rug, floor lamp', **form}
+    return client.post('/api/generate', data=data, content_type='multipart/form-data', buffered=False)
+
+
+def read_stream(response, stop_after=None):
+    """Consume an SSE response; returns (events, first event s, first preview s)."""
+    started = time.perf_counter()
+    events, first_event, first_preview = [], None, None
+    buffer = ""
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while "\n\n" in buffer:
+            block, buffer = buffer.split("\n\n", 1)
+            if block.startswith(":"):
+                continue
+            name = block.split("\n")[0][len("event: "):]
+            data = json.loads(block.split("\n")[1][len("data: "):])
+            elapsed = time.perf_counter() - started
+            if name == 'progress':
+                first_event = first_event or elapsed
+                if 'preview' in data:
+                    first_preview = first_preview or elapsed
+            events.append((name, data))
+            if stop_after is not None and stop_after(name, data):
+                response.close()
+                return events, first_event, first_preview
+    return events, first_event, first_preview
+
+
+def install_fake_pipeline(step_seconds):
+    fake = FakeDesignPipeline(step_seconds)
+    app.design_pipe = fake
+    app.refine_pipe = fake
+    app.depth_estimator = lambda image: image.convert("L").convert("RGB")
+    app.design_models_ready = lambda: True
+    return fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--step-ms", type=float, default=40)
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    install_fake_pipeline(args.step_ms / 1000)
+    client = app.app.test_client()
+    report = {}
+
+    timings = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        response = post_generate(client)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        timings.append(time.perf_counter() - started)
+    report['blocking'] = summarize(timings)
+
+    for label, every in (('stream', app.GENERATE_PREVIEW_EVERY), ('stream_no_previews', 0)):
+        app.GENERATE_PREVIEW_EVERY = every
+        totals, firsts, previews, counts = [], [], [], []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            events, first_event, first_preview = read_stream(post_generate(client, stream='sse'))
+            totals.append(time.perf_counter() - started)
+            assert events[-1][0] == 'result', events[-1]
+            firsts.append(first_event)
+            if first_preview is not None:
+                previews.append(first_preview)
+            counts.append(sum(1 for _, data in events if 'preview' in data))
+        report[label] = {
+            'total': summarize(totals),
+            'first_progress': summarize(firsts),
+            'first_preview': summarize(previews) if previews else None,
+            'previews_per_request': counts[0],
+            'events_per_request': len(events),
+        }
+
+    latents = np.random.default_rng(0).standard_normal((1, 4, 64, 64)).astype(np.float32)
+    started = time.perf_counter()
+    for _ in range(100):
+        app.encode_preview(latents_to_preview(latents, app.GENERATE_PREVIEW_SIZE))
+    report['preview_encode_ms'] = round((time.perf_counter() - started) * 10, 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Layout pool: pooled hits vs on-demand generation, with create_demo_layout as the generator.
+
+``--generate-ms`` adds a sleep per generation to stand in for the real
+30-step pipeline. The run fills the warm slots, replays a request mix,
+lets the idle refill thread top the pool back up, and reopens the pool
+directory to check that variants survive a restart.
+
+    python benchmarks/bench_layout_pool.py --requests 200 --generate-ms 300
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+
+from common import summarize  # noqa: E402
+
+import app  # noqa: E402
+from layout_pool import LayoutPool  # noqa: E402
+
+POPULAR = [(1000, "2 BHK"), (1450, "3 BHK"), (650, "1 BHK"), (1000, "")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--generate-ms", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    def generate(total_area, room_count, seed):
+        time.sleep(args.generate_ms / 1000)
+        return [app.create_demo_layout(total_area, room_count, (seed + i) % 4)
+                for i in range(app.LAYOUT_IMAGES_PER_PROMPT)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def make_pool(**kwargs):
+            return LayoutPool(tmp, generate, app.LAYOUT_POOL_BUCKETS, app.LAYOUT_ROOM_COUNT_MAP,
+                              size=args.pool_size, image_count=app.LAYOUT_IMAGES_PER_PROMPT,
+                              warm=POPULAR, idle_poll_seconds=0.05, **kwargs)
+
+        pool = make_pool()
+        started = time.perf_counter()
+        while pool.refill_once():
+            pass
+        fill_seconds = time.perf_counter() - started
+
+        hit_times, miss_times = [], []
+        for _ in range(args.requests):
+            area, rooms = rng.choice(POPULAR)
+            area += rng.randint(-120, 120)
+            started = time.perf_counter()
+            taken = pool.take(area, rooms)
+            if taken is None:
+                generate(area, rooms, rng.randint(0, 1000))
+                miss_times.append(time.perf_counter() - started)
+            else:
+                hit_times.append(time.perf_counter() - started)
+            # Let the idle refill catch up between some requests.
+            if rng.random() < 0.3:
+                pool.refill_once()
+
+        refill_pool = make_pool(is_idle=lambda: True)
+        refill_pool.start()
+        deadline = time.time() + 30
+        while refill_pool._next_slot() is not None and time.time() < deadline:
+            time.sleep(0.05)
+        restarted = make_pool()
+
+        report = {
+            'warm_fill_seconds': round(fill_seconds, 2),
+            'hits': len(hit_times),
+            'misses': len(miss_times),
+            'hit_latency': summarize(hit_times) if hit_times else None,
+            'miss_latency': summarize(miss_times) if miss_times else None,
+            'ready_after_restart': sum(slot['ready'] for slot in restarted.stats()['slots']),
+            'stats': pool.stats(),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
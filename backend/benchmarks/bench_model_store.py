@@ -0,0 +1,217 @@
+"""Worker startup time and memory: pickle checkpoints vs the memory-mapped model store.
+
+Generates stand-in weights locally: the tiny pipeline from tiny_sd.py with
+a larger UNet (``--unet-channels``, about 370 MB in float32 by default)
+saved the way many hub repos ship it (``.bin`` pickles), plus a
+``.pt`` training checkpoint of a convolution stack standing in for the
+MiDaS network. Both are converted into a ModelStore. Then ``--workers``
+processes at a time start the way inference workers do and run one small
+generation, in four modes:
+
+* ``pickle``: from_pretrained on the .bin files, which recent diffusers
+  memory-maps; the checkpoint goes through torch.load as in controlnet_aux
+* ``pickle_copied``: the same with ``disable_mmap=True``, which copies the
+  weights into each process as diffusers 0.30 (requirements.txt) does
+* ``store``: resolve() plus from_pretrained(local_files_only=True) and mmap_module
+* ``store+channels_last``: ``store`` followed by the CPU tuning's channels_last
+
+With all workers alive, each reports its anonymous and file-backed RSS and
+its PSS (shared pages split between the processes that map them). The
+store's hash check is timed separately for "full" and "changed".
+
+    python benchmarks/bench_model_store.py --workers 3
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import summarize
+
+CHECKPOINT_CHANNELS = 640
+CHECKPOINT_LAYERS = 12
+
+
+def memory_mb():
+    """Anonymous / file-backed RSS and PSS of this process in MB."""
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(('RssAnon:', 'RssFile:')):
+                values[line.split(':')[0]] = int(line.split()[1])
+    with open('/proc/self/smaps_rollup') as rollup:
+        for line in rollup:
+            if line.startswith('Pss:'):
+                values['Pss'] = int(line.split()[1])
+    return {
+        'rss_anon_mb': round(values['RssAnon'] / 1024, 1),
+        'rss_file_mb': round(values['RssFile'] / 1024, 1),
+        'pss_mb': round(values['Pss'] / 1024, 1),
+    }
+
+
+def build_checkpoint_model():
+    """A stack of convolutions standing in for the depth network (about 170 MB)."""
+    import torch.nn as nn
+    layers = [nn.Conv2d(3, CHECKPOINT_CHANNELS, 3, padding=1)]
+    for _ in range(CHECKPOINT_LAYERS - 1):
+        layers += [nn.GELU(), nn.Conv2d(CHECKPOINT_CHANNELS, CHECKPOINT_CHANNELS, 3, padding=1)]
+    return nn.Sequential(*layers)
+
+
+def write_stand_ins(directory, unet_channels):
+    """Pickle-format stand-ins: a pipeline directory and a training checkpoint."""
+    import torch
+    from diffusers import StableDiffusionPipeline, UNet2DConditionModel
+
+    import tiny_sd
+
+    parts = tiny_sd.tiny_components()
+    parts.pop('controlnet')
+    parts['unet'] = UNet2DConditionModel(
+        sample_size=32,
+        block_out_channels=unet_channels,
+        layers_per_block=1,
+        down_block_types=("CrossAttnDownBlock2D",) * (len(unet_channels) - 1) + ("DownBlock2D",),
+        up_block_types=("UpBlock2D",) + ("CrossAttnUpBlock2D",) * (len(unet_channels) - 1),
+        cross_attention_dim=tiny_sd.CROSS_ATTENTION_DIM,
+        norm_num_groups=32,
+    )
+    pipeline = StableDiffusionPipeline(**parts, safety_checker=None, feature_extractor=None,
+                                       requires_safety_checker=False)
+    pipeline_dir = os.path.join(directory, "hub", "pipeline")
+    pipeline.save_pretrained(pipeline_dir, safe_serialization=False)
+    checkpoint = os.path.join(directory, "hub", "depth.pt")
+    torch.save({'model': build_checkpoint_model().state_dict(), 'optimizer': {}}, checkpoint)
+    return pipeline_dir, checkpoint
+
+
+def convert(store, pipeline_dir, checkpoint):
+    import torch
+    from diffusers import StableDiffusionPipeline
+
+    from model_store import checkpoint_to_safetensors
+
+    def write_pipeline(directory):
+        StableDiffusionPipeline.from_pretrained(pipeline_dir).save_pretrained(
+            directory, safe_serialization=True
+        )
+
+    timings = {}
+    for model_id, write in (
+        ("stand-in/pipeline", write_pipeline),
+        ("stand-in/depth", lambda directory: checkpoint_to_safetensors(
+            checkpoint, os.path.join(directory, "depth.safetensors"))),
+    ):
+        started = time.perf_counter()
+        store.convert(model_id, write, torch.float32, force=True)
+        timings[model_id] = round(time.perf_counter() - started, 2)
+    return timings
+
+
+def worker(mode, store_root, pipeline_dir, checkpoint, loaded, done, results):
+    """One stand-in inference worker: import, load, generate once, report memory while all are alive."""
+    started = time.perf_counter()
+    import torch
+    from diffusers import StableDiffusionPipeline
+
+    from cpu_tuning import CpuTuning, tune_pipeline
+    from model_store import ModelStore, mmap_module
+    torch.set_num_threads(1)
+    imported = time.perf_counter()
+
+    if mode in ("pickle", "pickle_copied"):
+        pipeline = StableDiffusionPipeline.from_pretrained(pipeline_dir, disable_mmap=mode == "pickle_copied")
+        depth = build_checkpoint_model()
+        depth.load_state_dict(torch.load(checkpoint, map_location="cpu", weights_only=True)['model'])
+    else:
+        store = ModelStore(store_root)
+        pipeline = StableDiffusionPipeline.from_pretrained(
+            store.resolve("stand-in/pipeline", torch.float32), local_files_only=True, use_safetensors=True,
+        )
+        depth = mmap_module(
+            build_checkpoint_model, os.path.join(store.resolve("stand-in/depth"), "depth.safetensors")
+        )
+        if mode == "store+channels_last":
+            tune_pipeline(pipeline, CpuTuning("channels_last", channels_last=True))
+    pipeline.set_progress_bar_config(disable=True)
+    loaded_at = time.perf_counter()
+
+    with torch.inference_mode():
+        pipeline("sofa", num_inference_steps=2, height=128, width=128)
+        depth(torch.zeros(1, 3, 16, 16))
+    generated_at = time.perf_counter()
+
+    loaded.wait()
+    results.put({
+        'import': imported - started,
+        'load': loaded_at - imported,
+        'first_generation': generated_at - loaded_at,
+        **memory_mb(),
+    })
+    done.wait()
+
+
+def run_mode(context, mode, workers, store_root, pipeline_dir, checkpoint):
+    loaded = context.Barrier(workers)
+    done = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(mode, store_root, pipeline_dir, checkpoint, loaded, done, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get() for _ in processes]
+    done.wait()
+    for process in processes:
+        process.join()
+    report = {
+        name: summarize([entry[name] for entry in reports])
+        for name in ('import', 'load', 'first_generation')
+    }
+    for name in ('rss_anon_mb', 'rss_file_mb', 'pss_mb'):
+        report[name] = round(sum(entry[name] for entry in reports) / workers, 1)
+    report['total_pss_mb'] = round(sum(entry['pss_mb'] for entry in reports), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--unet-channels", default="128,256,512,512")
+    args = parser.parse_args()
+
+    from model_store import VERIFY_CHANGED, VERIFY_FULL, ModelStore
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        channels = tuple(int(value) for value in args.unet_channels.split(","))
+        pipeline_dir, checkpoint = write_stand_ins(directory, channels)
+        store_root = os.path.join(directory, "store")
+        store = ModelStore(store_root)
+        report = {
+            'workers': args.workers,
+            'stand_in_mb': round(sum(
+                os.path.getsize(os.path.join(folder, name))
+                for folder, _, names in os.walk(os.path.join(directory, "hub")) for name in names
+            ) / 1024 / 1024, 1),
+            'convert_s': convert(store, pipeline_dir, checkpoint),
+        }
+        for verify in (VERIFY_FULL, VERIFY_CHANGED):
+            check = ModelStore(store_root, verify=verify)
+            started = time.perf_counter()
+            for model_id in ("stand-in/pipeline", "stand-in/depth"):
+                check.resolve(model_id)
+            report[f'verify_{verify}_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+        for mode in ("pickle", "pickle_copied", "store", "store+channels_last"):
+            report[mode] = run_mode(context, mode, args.workers, store_root, pipeline_dir, checkpoint)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
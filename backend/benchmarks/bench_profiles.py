@@ -0,0 +1,77 @@
+"""Wall time per inference profile on CPU with tiny randomly initialised pipelines.
+
+Runs the real two-stage room flow and the layout call for every profile
+(scheduler, step counts, stage-2 on/off) against the tiny SD 1.x-shaped
+models from tiny_sd.py, then shows the load-aware policy downgrading
+requests as the backlog grows. Absolute times are far below the real
+models; the ratios between profiles are what carries over.
+
+    python benchmarks/bench_profiles.py --size 256 --repeats 2
+"""
+import argparse
+import json
+import os
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+os.environ.setdefault("RESULT_CACHE_DISK", "false")
+os.environ.setdefault("DESIGN_BATCH_WINDOW_MS", "0")
+
+from common import summarize, time_call  # noqa: E402
+
+from PIL import Image  # noqa: E402
+import torch  # noqa: E402
+
+import app  # noqa: E402
+import tiny_sd  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    tiny_sd.install(app)
+    room = Image.new("RGB", (args.size, args.size), (170, 160, 150))
+    prompt = app.build_structured_prompt("sofa, rug, floor lamp", "living room", "modern")
+
+    report = {'threads': args.threads, 'size': args.size, 'profiles': {}}
+    for profile in app.INFERENCE_PROFILES:
+        def design():
+            return app.two_stage_generation(room, prompt, app.NEGATIVE_PROMPT, seed=1, profile=profile)
+
+        def layout():
+            return app.run_layout_pipeline(
+                app.build_layout_prompt(1000, "2 BHK"), seed=1, profile=profile, size=(args.size, args.size)
+            )
+
+        _, design_timings = time_call(design, repeats=args.repeats)
+        _, layout_timings = time_call(layout, repeats=args.repeats)
+        report['profiles'][profile.name] = {
+            'settings': profile.to_dict(),
+            'design': summarize(design_timings),
+            'layout': summarize(layout_timings),
+        }
+
+    quality = report['profiles']['quality']
+    for name, entry in report['profiles'].items():
+        entry['design_speedup_vs_quality'] = round(quality['design']['p50_ms'] / entry['design']['p50_ms'], 2)
+        entry['layout_speedup_vs_quality'] = round(quality['layout']['p50_ms'] / entry['layout']['p50_ms'], 2)
+
+    backlog = {'depth': 0}
+    app.profile_policy.load = lambda: backlog['depth']
+    choices = {}
+    for depth in range(0, app.PROFILE_DOWNGRADE_DEPTH + 2):
+        backlog['depth'] = depth
+        profile, downgraded = app.profile_policy.choose("quality")
+        choices[f"backlog_{depth}"] = {'profile': profile.name, 'downgraded': downgraded}
+    report['quality_request_under_load'] = choices
+    report['policy'] = app.profile_policy.stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
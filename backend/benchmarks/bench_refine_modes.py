@@ -0,0 +1,62 @@
+"""Compare stage-2 refinement modes of two_stage_generation.
+
+Runs the full two-stage flow once per refine mode with the same seed and
+reports latency plus SSIM against the ``recompute`` output (the original
+behaviour). Needs the real models, so run from backend/ with
+USE_LOCAL_MODEL enabled:
+
+    python benchmarks/bench_refine_modes.py --image uploads/room.jpg
+"""
+import argparse
+import json
+import os
+
+os.environ.setdefault("DESIGN_BATCH_WINDOW_MS", "0")
+
+from common import summarize, ssim, time_call  # noqa: E402
+
+from PIL import Image  # noqa: E402
+import torch  # noqa: E402
+
+import app  # noqa: E402
+
+
+def run_mode(image, prompt, mode, seed):
+    # Drop cached depth maps so every mode pays for stage-1 MiDaS equally.
+    app.depth_cache.memory.clear()
+    torch.manual_seed(seed)
+    return app.two_stage_generation(image, prompt, app.NEGATIVE_PROMPT, refine_mode=mode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--image", required=True, help="room photo to refine")
+    parser.add_argument("--prompt", default="sofa, coffee table, floor lamp, rug")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--repeats", type=int, default=2)
+    args = parser.parse_args()
+
+    if app.design_pipe is None:
+        raise SystemExit("design pipeline not loaded; set USE_LOCAL_MODEL=true")
+
+    image = Image.open(args.image).convert("RGB").resize((512, 512))
+    prompt = app.build_structured_prompt(args.prompt, "living room", "modern")
+
+    outputs = {}
+    report = {}
+    for mode in (app.REFINE_MODE_RECOMPUTE, app.REFINE_MODE_REUSE, app.REFINE_MODE_IMG2IMG):
+        outputs[mode], timings = time_call(
+            lambda: run_mode(image, prompt, mode, args.seed),
+            repeats=args.repeats,
+        )
+        report[mode] = summarize(timings)
+
+    reference = outputs[app.REFINE_MODE_RECOMPUTE]
+    for mode, output in outputs.items():
+        report[mode]['ssim_vs_recompute'] = round(ssim(reference, output), 4)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
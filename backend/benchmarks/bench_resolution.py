@@ -0,0 +1,119 @@
+"""Latency and peak memory per resolution bucket on CPU with tiny pipelines.
+
+Posts landscape, portrait, wide and square room photos to /api/generate at
+every resolution tier, plus the draft tier with ``upscale`` (under a
+profile that runs stage 2, which does the upscaled refinement), and asks
+/api/generate-layout for every tier, against the tiny SD 1.x-shaped models
+from tiny_sd.py. Prints the bucket each request landed in and the
+per-bucket latency and peak RSS that /api/metrics reports, then shows the
+load cap turning a "large" request into the capped tier.
+
+    python benchmarks/bench_resolution.py --profile fast
+"""
+import argparse
+from io import BytesIO
+import json
+import os
+import time
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+os.environ.setdefault("RESULT_CACHE_DISK", "false")
+os.environ.setdefault("DESIGN_BATCH_WINDOW_MS", "0")
+os.environ.setdefault("PROFILE_DOWNGRADE_DEPTH", "0")
+
+from common import summarize  # noqa: E402
+
+from PIL import Image  # noqa: E402
+import torch  # noqa: E402
+
+import app  # noqa: E402
+import tiny_sd  # noqa: E402
+
+SHAPES = {'landscape_4x3': (1600, 1200), 'portrait_3x4': (1200, 1600), 'wide_16x9': (1920, 1080), 'square': (1200, 1200)}
+
+
+def upload(width, height):
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (170, 160, 150)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def generate(client, data, seed, **form):
+    started = time.perf_counter()
+    response = client.post('/api/generate', data={
+        'image': (BytesIO(data), 'room.jpg'),
+        'prompt': 'sofa, rug, floor lamp',
+        'seed': str(seed),
+        **form,
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    body = response.get_json()
+    return body, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="fast")
+    parser.add_argument("--upscale-profile", default="balanced")
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    tiny_sd.install(app)
+    app.layout_model_ready = lambda: True
+    client = app.app.test_client()
+    report = {'threads': args.threads, 'profile': args.profile, 'room': {}, 'layout': {}}
+
+    seed = 1
+    smallest = min(app.RESOLUTION_TIERS, key=app.RESOLUTION_TIERS.get)
+    runs = [(tier, {'resolution': tier, 'profile': args.profile}) for tier in app.RESOLUTION_TIERS]
+    # Upscaling refines in stage 2, so it needs a profile that runs one.
+    runs.append((f"{smallest}+upscale ({args.upscale_profile})",
+                 {'resolution': smallest, 'upscale': 'true', 'profile': args.upscale_profile}))
+    for label, form in runs:
+        report['room'][label] = {}
+        for shape, (width, height) in SHAPES.items():
+            body, seconds = generate(client, upload(width, height), seed, **form)
+            seed += 1
+            report['room'][label][shape] = {'output': f"{body['width']}x{body['height']}", 'ms': round(seconds * 1000)}
+
+    for tier in app.RESOLUTION_TIERS:
+        timings = []
+        for _ in range(2):
+            started = time.perf_counter()
+            response = client.post('/api/generate-layout', json={
+                'total_area': 1000, 'room_count': '2 BHK', 'seed': seed, 'resolution': tier, 'profile': args.profile,
+            })
+            assert response.status_code == 200, response.get_data(as_text=True)
+            timings.append(time.perf_counter() - started)
+            seed += 1
+        body = response.get_json()
+        report['layout'][tier] = {'output': f"{body['width']}x{body['height']}", **summarize(timings)}
+
+    # Deep backlog: "large" requests are capped to RESOLUTION_LOAD_MAX_TIER.
+    app.resolution_policy.load_depth = 1
+    app.resolution_policy.load = lambda: 5
+    body, _ = generate(client, upload(*SHAPES['landscape_4x3']), seed, profile=args.profile, resolution='large')
+    report['under_load'] = {
+        'requested': 'large', 'resolution': body['resolution'], 'resolution_capped': body['resolution_capped'],
+        'output': f"{body['width']}x{body['height']}",
+    }
+
+    stats = app.resolution_policy.stats()
+    report['buckets'] = {
+        pipeline: {
+            label: {
+                'count': entry['count'],
+                'mean_ms': round(entry['latency_ms']['mean']),
+                'peak_memory_mb': entry['peak_memory_mb'],
+            }
+            for label, entry in buckets.items()
+        }
+        for pipeline, buckets in stats['buckets'].items()
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
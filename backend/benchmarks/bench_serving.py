@@ -0,0 +1,162 @@
+"""Health and pricing latency while stub generations run, dev server vs serve.py setup.
+
+Starts the API on a local port twice: once like ``python app.py`` (Werkzeug,
+a thread per request, no endpoint caps, pre/post-processing inline) and once
+like ``serve.py`` (waitress, the CPU pool and per-endpoint caps). Each run
+has ``--generators`` clients posting large uploads to /api/generate back to
+back against a stub pipeline that burns CPU for ``--step-ms`` per step. The
+probe clients meanwhile time /api/health and /api/suggest-furniture, and
+the script reports their p50/p99 next to an idle baseline.
+
+    python benchmarks/bench_serving.py --seconds 10 --generators 12
+"""
+import argparse
+from io import BytesIO
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+os.environ.setdefault("RESULT_CACHE_DISK", "false")
+os.environ.setdefault("PROFILE_DOWNGRADE_DEPTH", "0")
+
+import common  # noqa: E402,F401  (puts backend/ on sys.path)
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+import requests  # noqa: E402
+from waitress.server import create_server  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import app  # noqa: E402
+from bench_generate_stream import FakeDesignPipeline  # noqa: E402
+from serving import CpuPool, EndpointLimits  # noqa: E402
+import serve  # noqa: E402
+
+
+class BusyDesignPipeline(FakeDesignPipeline):
+    """Fake design pipeline whose steps keep a core busy instead of sleeping."""
+
+    def __call__(self, image, num_inference_steps, strength, callback_on_step_end=None, **kwargs):
+        self.calls += 1
+        self.num_timesteps = max(1, int(num_inference_steps * strength))
+        matrix = np.random.default_rng(self.calls).standard_normal((256, 256)).astype(np.float32)
+        for _ in range(self.num_timesteps):
+            deadline = time.perf_counter() + self.step_seconds
+            while time.perf_counter() < deadline:
+                matrix = np.tanh(matrix @ matrix)
+            self.steps += 1
+        return type("Output", (), {'images': list(image)})()
+
+
+def large_upload(width=3000, height=2000):
+    buffer = BytesIO()
+    noise = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    Image.fromarray(noise).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1) if ordered else None
+
+
+def probe(base_url, stop, results):
+    session = requests.Session()
+    budget = {'room_type': 'living_room', 'budget': 150000}
+    while not stop.is_set():
+        for name, call in (
+            ('health', lambda: session.get(f"{base_url}/api/health", timeout=60)),
+            ('suggest_furniture', lambda: session.post(f"{base_url}/api/suggest-furniture", json=budget, timeout=60)),
+        ):
+            started = time.perf_counter()
+            response = call()
+            assert response.status_code == 200, response.text
+            results[name].append(time.perf_counter() - started)
+
+
+def generate(base_url, upload, stop, counts):
+    session = requests.Session()
+    while not stop.is_set():
+        response = session.post(
+            f"{base_url}/api/generate",
+            files={'image': ('room.jpg', upload, 'image/jpeg')},
+            data={'prompt': 'sofa, rug, floor lamp', 'output': 'data_url'},
+            timeout=600,
+        )
+        counts[response.status_code] = counts.get(response.status_code, 0) + 1
+        if response.status_code == 429:
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+
+
+def run(base_url, seconds, generators, probes, upload):
+    stop = threading.Event()
+    results = {'health': [], 'suggest_furniture': []}
+    counts = {}
+    threads = [threading.Thread(target=generate, args=(base_url, upload, stop, counts)) for _ in range(generators)]
+    threads += [threading.Thread(target=probe, args=(base_url, stop, results)) for _ in range(probes)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        **{
+            name: {'requests': len(timings), 'p50_ms': percentile(timings, 0.5), 'p99_ms': percentile(timings, 0.99)}
+            for name, timings in results.items()
+        },
+        'generate_responses': {str(status): count for status, count in sorted(counts.items())},
+    }
+
+
+def start(server, serve_forever):
+    thread = threading.Thread(target=serve_forever, daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--generators", type=int, default=12)
+    parser.add_argument("--probes", type=int, default=2)
+    parser.add_argument("--step-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    fake = BusyDesignPipeline(args.step_ms / 1000)
+    app.design_pipe = app.refine_pipe = fake
+    app.depth_estimator = lambda image: image.convert("L").convert("RGB")
+    app.design_models_ready = lambda: True
+    upload = large_upload()
+    serve_limits, serve_pool = app.endpoint_limits, app.cpu_pool
+    report = {'cpu_count': os.cpu_count(), 'upload_bytes': len(upload), 'step_ms': args.step_ms}
+
+    # Like `python app.py`: Werkzeug thread per request, no caps, inline processing.
+    app.endpoint_limits, app.cpu_pool = EndpointLimits({}), CpuPool(0)
+    dev = make_server("127.0.0.1", 0, app.app, threaded=True)
+    start(dev, dev.serve_forever)
+    dev_url = f"http://127.0.0.1:{dev.server_port}"
+    report['dev_idle'] = run(dev_url, args.seconds / 2, 0, args.probes, upload)
+    report['dev_generating'] = run(dev_url, args.seconds, args.generators, args.probes, upload)
+    dev.shutdown()
+
+    # Like serve.py: waitress with SERVE_THREADS, endpoint caps and the CPU pool.
+    app.endpoint_limits, app.cpu_pool = serve_limits, serve_pool
+    production = create_server(app.app, host="127.0.0.1", port=0, threads=serve.SERVE_THREADS)
+    start(production, production.run)
+    serve_url = f"http://127.0.0.1:{production.effective_port}"
+    report['serve_idle'] = run(serve_url, args.seconds / 2, 0, args.probes, upload)
+    report['serve_generating'] = run(serve_url, args.seconds, args.generators, args.probes, upload)
+    production.close()
+
+    report['design_calls'] = fake.calls
+    report['endpoint_limits'] = app.endpoint_limits.stats()
+    report['cpu_pool'] = app.cpu_pool.stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
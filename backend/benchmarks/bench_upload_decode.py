@@ -0,0 +1,136 @@
+"""Upload decoding: time and peak RSS of the old full decode vs upload_decoder.
+
+Writes synthetic phone-sized photos (24 and 12 MP JPEG, one with EXIF
+orientation 6; 12 MP PNG; 12 MP WebP standing in for HEIC, which Pillow
+cannot read without a plugin) and decodes each to the 512x512 model input
+twice: the old ``Image.open().convert('RGB').resize()`` and
+``decode_upload``. Every measurement runs in a fresh process so its peak
+RSS is its own. SSIM is against a full-resolution, EXIF-corrected Lanczos
+reference, so the old path scores low on the rotated photo.
+
+    python benchmarks/bench_upload_decode.py --repeats 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import tempfile
+
+from common import summarize, ssim, time_call
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from upload_decoder import EXIF_ORIENTATION, decode_upload
+
+TARGET = (512, 512)
+MAX_PIXELS = 64_000_000
+
+
+def legacy_decode(path):
+    return Image.open(path).convert('RGB').resize(TARGET)
+
+
+def bounded_decode(path):
+    with open(path, 'rb') as stream:
+        return decode_upload(stream, TARGET, MAX_PIXELS)
+
+
+def reference_decode(path):
+    return ImageOps.exif_transpose(Image.open(path)).convert('RGB').resize(TARGET, Image.Resampling.LANCZOS)
+
+
+DECODERS = {'legacy': legacy_decode, 'bounded': bounded_decode}
+
+
+def synthetic_photo(width, height, seed=0):
+    """Smooth gradients with mild noise and a few hard edges, roughly photo-like to the codecs."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    channels = [
+        128 + 90 * np.sin(x / (width / (2 + c)) + c) * np.cos(y / (height / (3 + c)))
+        for c in range(3)
+    ]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 6, (height, width, 1))
+    pixels[height // 3:height // 3 + height // 20] = 40
+    pixels[:, width // 2:width // 2 + width // 30] = 220
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def write_inputs(directory):
+    inputs = {}
+    large = synthetic_photo(6000, 4000)
+    path = os.path.join(directory, 'jpeg_24mp.jpg')
+    large.save(path, quality=90)
+    inputs['jpeg_24mp'] = path
+
+    medium = synthetic_photo(4000, 3000, seed=1)
+    path = os.path.join(directory, 'jpeg_12mp.jpg')
+    medium.save(path, quality=90)
+    inputs['jpeg_12mp'] = path
+
+    # Portrait photo stored sideways, as phones do.
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    path = os.path.join(directory, 'jpeg_12mp_rotated.jpg')
+    medium.save(path, quality=90, exif=exif)
+    inputs['jpeg_12mp_rotated'] = path
+
+    path = os.path.join(directory, 'png_12mp.png')
+    medium.save(path, compress_level=1)
+    inputs['png_12mp'] = path
+
+    path = os.path.join(directory, 'webp_12mp.webp')
+    medium.save(path, quality=85, method=0)
+    inputs['webp_12mp'] = path
+    return inputs
+
+
+def peak_rss_kb():
+    # VmHWM starts afresh in a spawned process; ru_maxrss inherits the parent's peak on Linux.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(decoder, path, repeats):
+    """Runs in a fresh process: peak RSS growth of the first decode, then timings."""
+    baseline = peak_rss_kb()
+    result = DECODERS[decoder](path)
+    peak_kb = peak_rss_kb() - baseline
+    _, timings = time_call(lambda: DECODERS[decoder](path), repeats=repeats, warmup=0)
+    return {
+        **summarize(timings),
+        'peak_rss_growth_mb': round(peak_kb / 1024, 1),
+        'ssim_vs_reference': round(ssim(reference_decode(path), result), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, path in write_inputs(directory).items():
+            report[name] = {'file_mb': round(os.path.getsize(path) / 1024 / 1024, 2)}
+            with Image.open(path) as image:
+                report[name]['size'] = '%dx%d' % image.size
+            for decoder in DECODERS:
+                with context.Pool(1) as pool:
+                    report[name][decoder] = pool.apply(measure, (decoder, path, args.repeats))
+            report[name]['speedup'] = round(report[name]['legacy']['mean_ms'] / report[name]['bounded']['mean_ms'], 2)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
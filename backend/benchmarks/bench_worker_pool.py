@@ -0,0 +1,196 @@
+"""Inference worker processes with stub pipelines: throughput, crash recovery, cancel.
+
+Each worker process imports the app and installs stub pipelines that sleep
+``--step-ms`` per denoising step (standing in for an accelerator), so the
+whole path runs on CPU without weights: /api/generate and
+/api/generate-layout in this process, IPC to the workers, two-stage flow and
+layout call in the workers. Runs a mixed room + layout load in-process and
+with several worker layouts, then kills a design worker mid-request,
+cancels a request running in a worker and streams one through a worker.
+
+    python benchmarks/bench_worker_pool.py --step-ms 20 --requests 6
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import signal
+import time
+
+os.environ.setdefault("USE_LOCAL_MODEL", "false")
+os.environ.setdefault("MODEL_LOAD_MODE", "lazy")
+os.environ.setdefault("RESULT_CACHE_DISK", "false")
+os.environ.setdefault("DESIGN_BATCH_WINDOW_MS", "0")
+# One request per pipeline call in every mode; sleeping stubs would make batches free.
+os.environ.setdefault("DESIGN_MAX_BATCH_SIZE", "1")
+# Same work per request however deep the backlog gets.
+os.environ.setdefault("PROFILE_DOWNGRADE_DEPTH", "0")
+os.environ.setdefault("BENCH_STEP_MS", "20")
+
+from common import summarize  # noqa: E402
+
+from PIL import Image  # noqa: E402
+
+import app  # noqa: E402
+from bench_generate_stream import FakeDesignPipeline, install_fake_pipeline, post_generate, read_stream  # noqa: E402
+from worker_pool import WorkerPool, WorkerSpec  # noqa: E402
+
+
+class FakeLayoutPipeline(FakeDesignPipeline):
+    """Text-to-image stand-in for the layout pipeline."""
+
+    def __call__(self, num_images_per_prompt, num_inference_steps, width, height, **kwargs):
+        self.calls += 1
+        self.num_timesteps = num_inference_steps
+        for _ in range(num_inference_steps):
+            time.sleep(self.step_seconds)
+            self.steps += 1
+        images = [Image.new("RGB", (width, height), (240, 240, 240)) for _ in range(num_images_per_prompt)]
+        return type("Output", (), {'images': images})()
+
+
+def install_stubs():
+    step_seconds = float(os.environ["BENCH_STEP_MS"]) / 1000
+    install_fake_pipeline(step_seconds)
+    app.layout_pipe = FakeLayoutPipeline(step_seconds)
+    app.layout_model_ready = lambda: True
+
+
+def init_stub_worker(pipelines, threads):
+    """INFERENCE_WORKER_INIT for the benchmark: stub pipelines instead of real models."""
+    install_stubs()
+    return app.inference_worker_handlers()
+
+
+def start_pool(layout, restart_delay=0.5):
+    pool = WorkerPool(
+        [WorkerSpec(f"{index}-{'+'.join(pipelines)}", pipelines) for index, pipelines in enumerate(layout)],
+        "bench_worker_pool:init_stub_worker",
+        restart_delay=restart_delay,
+    )
+    started = time.perf_counter()
+    pool.start()
+    while not pool.settled():
+        time.sleep(0.05)
+    app.worker_pool = pool
+    app.USE_LOCAL_MODEL = True
+    return pool, time.perf_counter() - started
+
+
+def room_request(**form):
+    return post_generate(app.app.test_client(), **form)
+
+
+def layout_request(seed):
+    return app.app.test_client().post('/api/generate-layout', json={
+        'total_area': 1000, 'room_count': '2 BHK', 'seed': seed,
+    })
+
+
+def mixed_load(requests, concurrency, seed):
+    """``requests`` room and ``requests`` layout calls at once; returns wall time and latencies."""
+    def timed(call):
+        started = time.perf_counter()
+        response = call()
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return time.perf_counter() - started
+
+    calls = [room_request for _ in range(requests)]
+    calls += [lambda index=index: layout_request(seed + index) for index in range(requests)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(timed, calls))
+    wall = time.perf_counter() - started
+    return {
+        'wall_s': round(wall, 2),
+        'requests_per_s': round(len(calls) / wall, 2),
+        'latency': summarize(latencies),
+    }
+
+
+def crash_recovery(pool):
+    """Kill one design worker while it runs a request; the others carry on."""
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(room_request) for _ in range(4)]
+        victim = None
+        while victim is None:
+            time.sleep(0.05)
+            victim = next(
+                (worker for worker in pool.stats()['workers'] if 'design' in worker['pipelines'] and worker['running']),
+                None,
+            )
+        os.kill(victim['pid'], signal.SIGKILL)
+        statuses = sorted(future.result().status_code for future in futures)
+
+    while not pool.settled():
+        time.sleep(0.05)
+    after = room_request().status_code
+    return {
+        'killed': victim['name'],
+        'statuses': statuses,
+        'status_after_restart': after,
+        'pool': pool.stats(),
+    }
+
+
+def cancel_in_worker():
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(room_request, request_id="bench-worker-cancel")
+        time.sleep(0.5)
+        started = time.perf_counter()
+        cancel = app.app.test_client().post('/api/generate/bench-worker-cancel/cancel')
+        response = future.result()
+    return {
+        'cancel_status': cancel.status_code,
+        'generate_status': response.status_code,
+        'stopped_after_ms': round((time.perf_counter() - started) * 1000),
+    }
+
+
+def stream_through_worker():
+    events, first_event, first_preview = read_stream(room_request(stream='sse'))
+    return {
+        'events': len(events),
+        'last_event': events[-1][0],
+        'previews': sum(1 for _, data in events if 'preview' in data),
+        'first_progress_ms': round(first_event * 1000) if first_event else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--step-ms", type=float, default=float(os.environ["BENCH_STEP_MS"]))
+    parser.add_argument("--requests", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=6)
+    args = parser.parse_args()
+    # Workers read the step time from the environment they inherit.
+    os.environ["BENCH_STEP_MS"] = str(args.step_ms)
+
+    report = {'cpu_count': os.cpu_count(), 'step_ms': args.step_ms, 'load': {}}
+    install_stubs()
+    app.USE_LOCAL_MODEL = True
+    report['load']['in_process'] = mixed_load(args.requests, args.concurrency, seed=1000)
+
+    for layout in (
+        [("design", "layout")],
+        [("design",), ("layout",)],
+        [("design",), ("design",), ("layout",)],
+    ):
+        pool, startup = start_pool(layout)
+        label = ",".join("+".join(pipelines) for pipelines in layout)
+        report['load'][label] = {
+            'startup_s': round(startup, 2),
+            **mixed_load(args.requests, args.concurrency, seed=2000 + len(report['load']) * 100),
+        }
+        if len(layout) == 3:
+            report['crash_recovery'] = crash_recovery(pool)
+            report['cancel_in_worker'] = cancel_in_worker()
+            report['stream_through_worker'] = stream_through_worker()
+        pool.stop()
+        app.worker_pool = None
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Shared helpers for the backend benchmark scripts."""
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def time_call(fn, repeats=3, warmup=1):
+    """Return (last result, list of wall times in seconds) for ``fn()``."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return result, timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return {
+        'mean_ms': round(statistics.mean(ordered) * 1000, 2),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+        'min_ms': round(ordered[0] * 1000, 2),
+    }
+
+
+def _box_filter(values, window):
+    padded = np.pad(values, ((1, 0), (1, 0)))
+    integral = padded.cumsum(0).cumsum(1)
+    return (
+        integral[window:, window:] - integral[:-window, window:]
+        - integral[window:, :-window] + integral[:-window, :-window]
+    ) / (window * window)
+
+
+def ssim(image_a, image_b, window=7):
+    """Mean structural similarity of two PIL images on their luma channel."""
+    a = np.asarray(image_a.convert("L"), dtype=np.float64)
+    b = np.asarray(image_b.convert("L").resize(image_a.size), dtype=np.float64)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+
+    mu_a = _box_filter(a, window)
+    mu_b = _box_filter(b, window)
+    var_a = _box_filter(a * a, window) - mu_a ** 2
+    var_b = _box_filter(b * b, window) - mu_b ** 2
+    cov = _box_filter(a * b, window) - mu_a * mu_b
+
+    score = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / (
+        (mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2)
+    )
+    return float(score.mean())
@@ -0,0 +1,120 @@
+"""Tiny randomly initialised Stable Diffusion pipelines for CPU benchmarks.
+
+The models have the same architecture as SD 1.x (UNet with cross-attention,
+KL VAE with an 8x latent scale, CLIP text encoder, depth ControlNet) but only
+a few channels, so whole two-stage runs take seconds on a CPU and need no
+downloads. Output images are noise; only timings and call counts matter.
+"""
+import json
+import os
+import string
+import tempfile
+
+import torch
+from diffusers import (
+    AutoencoderKL,
+    ControlNetModel,
+    PNDMScheduler,
+    StableDiffusionControlNetImg2ImgPipeline,
+    StableDiffusionPipeline,
+    UNet2DConditionModel,
+)
+from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+CROSS_ATTENTION_DIM = 32
+BLOCK_CHANNELS = (32, 64)
+
+
+def tiny_tokenizer():
+    """Character-level CLIP tokenizer written to a temp dir (no merges)."""
+    directory = tempfile.mkdtemp(prefix="tiny-clip-")
+    tokens = ["<|startoftext|>", "<|endoftext|>"]
+    for char in string.ascii_lowercase + string.digits + string.punctuation:
+        tokens += [char, f"{char}</w>"]
+    vocab_path = os.path.join(directory, "vocab.json")
+    merges_path = os.path.join(directory, "merges.txt")
+    with open(vocab_path, "w") as handle:
+        json.dump({token: index for index, token in enumerate(tokens)}, handle)
+    with open(merges_path, "w") as handle:
+        handle.write("#version: 0.2\n")
+    return CLIPTokenizer(vocab_path, merges_path, model_max_length=77)
+
+
+def tiny_components(seed=0):
+    torch.manual_seed(seed)
+    unet = UNet2DConditionModel(
+        sample_size=32,
+        in_channels=4,
+        out_channels=4,
+        layers_per_block=1,
+        block_out_channels=BLOCK_CHANNELS,
+        down_block_types=("CrossAttnDownBlock2D", "DownBlock2D"),
+        up_block_types=("UpBlock2D", "CrossAttnUpBlock2D"),
+        cross_attention_dim=CROSS_ATTENTION_DIM,
+        norm_num_groups=8,
+    )
+    vae = AutoencoderKL(
+        in_channels=3,
+        out_channels=3,
+        block_out_channels=(8, 16, 16, 16),
+        down_block_types=("DownEncoderBlock2D",) * 4,
+        up_block_types=("UpDecoderBlock2D",) * 4,
+        latent_channels=4,
+        norm_num_groups=8,
+        layers_per_block=1,
+    )
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=256,
+        hidden_size=CROSS_ATTENTION_DIM,
+        intermediate_size=64,
+        num_attention_heads=4,
+        num_hidden_layers=2,
+        max_position_embeddings=77,
+        bos_token_id=0,
+        eos_token_id=1,
+        pad_token_id=1,
+    ))
+    controlnet = ControlNetModel(
+        in_channels=4,
+        layers_per_block=1,
+        block_out_channels=BLOCK_CHANNELS,
+        down_block_types=("CrossAttnDownBlock2D", "DownBlock2D"),
+        cross_attention_dim=CROSS_ATTENTION_DIM,
+        conditioning_embedding_out_channels=(8, 16, 16, 16),
+        norm_num_groups=8,
+    )
+    scheduler = PNDMScheduler(skip_prk_steps=True, steps_offset=1)
+    for module in (unet, vae, text_encoder, controlnet):
+        module.eval()
+    return {
+        'unet': unet,
+        'vae': vae,
+        'text_encoder': text_encoder,
+        'tokenizer': tiny_tokenizer(),
+        'controlnet': controlnet,
+        'scheduler': scheduler,
+    }
+
+
+def tiny_pipelines(seed=0):
+    """(design pipeline, layout pipeline) sharing one set of tiny components."""
+    parts = tiny_components(seed)
+    common = dict(safety_checker=None, feature_extractor=None, requires_safety_checker=False)
+    design = StableDiffusionControlNetImg2ImgPipeline(**parts, **common)
+    layout = StableDiffusionPipeline(
+        **{key: value for key, value in parts.items() if key != 'controlnet'}, **common
+    )
+    for pipeline in (design, layout):
+        pipeline.set_progress_bar_config(disable=True)
+    return design, layout
+
+
+def install(app, seed=0):
+    """Point ``app`` at tiny pipelines and a trivial depth estimator; returns them."""
+    design, layout = tiny_pipelines(seed)
+    app.design_pipe = design
+    app.refine_pipe = None
+    app.layout_pipe = layout
+    app.depth_estimator = lambda image: image.convert("L").convert("RGB")
+    app.design_models_ready = lambda: True
+    return design, layout
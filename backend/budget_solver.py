@@ -0,0 +1,266 @@
+"""Priority-weighted furniture bundles for a budget.
+
+Each room type gets a precomputed multiple-choice knapsack table over price
+units: every item in the room's priority list contributes 0..max_quantity
+copies. An item is worth more the higher it ranks, each extra copy is worth
+half the previous one, and the first copy of an essential outweighs all
+optional picks together. The table keeps the
+top-K bundle scores for every budget up to the room's total cost, so a
+solve is a lookup at the budget column plus a walk back through the
+choice arrays.
+
+Scores are ``value * scale + cost_units``: bundle value always wins, and
+among equally valuable bundles the one that uses more of the budget ranks
+first. Only the cheapest SKU of an item takes part in the knapsack; money
+left over afterwards upgrades chosen items to pricier SKUs in priority
+order.
+"""
+from collections import OrderedDict
+import math
+import threading
+
+import numpy as np
+
+NO_BUNDLE = np.iinfo(np.int64).min // 4
+
+
+class BudgetSolver:
+    """Top-K furniture bundles per room type.
+
+    ``skus(key)`` returns the SKU dicts (at least ``name`` and ``price``)
+    for an item, cheapest first, or an empty list for unknown items.
+    ``room_items(room_type)`` returns item keys, most important first; the
+    first ``essential_count`` are essentials. Prices are rounded up to
+    ``price_unit`` rupees, so a returned bundle never exceeds the budget.
+    Call ``invalidate`` after the catalog changes.
+    """
+
+    def __init__(self, skus, room_items, quantity_limits=None, price_unit=100,
+                 max_budget=1_000_000, top_k=3, essential_count=4, max_cached_tables=32):
+        self.skus = skus
+        self.room_items = room_items
+        self.quantity_limits = quantity_limits or {}
+        self.price_unit = price_unit
+        self.max_units = max_budget // price_unit
+        self.top_k = top_k
+        self.essential_count = essential_count
+        self.max_cached_tables = max_cached_tables
+        self.tables_built = 0
+        self._generation = 0
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def precompute(self, room_types):
+        for room_type in room_types:
+            self._table(room_type, frozenset(), 0)
+
+    def invalidate(self, room_types=None):
+        """Drop cached tables for ``room_types`` (all tables when None)."""
+        with self._lock:
+            self._generation += 1
+            for cache_key in list(self._tables):
+                if room_types is None or cache_key[0] in room_types:
+                    del self._tables[cache_key]
+
+    def solve(self, room_type, budget, must_have=(), top_k=None):
+        """Return up to ``top_k`` bundles, best first.
+
+        A bundle is ``{'items': [...], 'cost': int, 'value': int}`` where each
+        item is ``{'key', 'sku', 'quantity', 'priority'}``. An empty list
+        means the must-have items alone do not fit the budget.
+        """
+        must_have = frozenset(must_have)
+        unknown = sorted(key for key in must_have if not self.skus(key))
+        if unknown:
+            raise ValueError(f"Unknown furniture items: {', '.join(unknown)}")
+        top_k = min(top_k or self.top_k, self.top_k)
+
+        budget_units = int(budget // self.price_unit)
+        table = self._table(room_type, must_have, budget_units)
+        column = min(budget_units, table.capacity)
+
+        bundles = []
+        for layer in range(top_k):
+            if table.scores[layer, column] < 0:
+                break
+            bundles.append(self._bundle(table, layer, column, budget))
+        return bundles
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tables': len(self._tables),
+                'tables_built': self.tables_built,
+                'table_bytes': sum(table.nbytes() for table in self._tables.values()),
+                'price_unit': self.price_unit,
+                'top_k': self.top_k,
+            }
+
+    # ─── Table construction ────────────────────────────────────────────────
+
+    def _groups(self, room_type, must_have):
+        keys = list(self.room_items(room_type))
+        keys += sorted(must_have - set(keys))
+        cheapest = {}
+        for key in keys:
+            skus = self.skus(key)
+            if skus:
+                cheapest[key] = skus[0]
+        keys = [key for key in keys if key in cheapest]
+
+        # Copy values per item: rank weight, halved for each extra copy.
+        copy_values = []
+        for rank, key in enumerate(keys):
+            weight = len(keys) - rank
+            copies = self.quantity_limits.get(key, 1)
+            copy_values.append([max(weight >> copy, 1) for copy in range(copies)])
+        # The first copy of an essential outweighs every optional pick combined.
+        essential_bonus = 1 + sum(
+            sum(values[1:] if rank < self.essential_count else values)
+            for rank, values in enumerate(copy_values)
+        )
+
+        groups = []
+        for rank, key in enumerate(keys):
+            if rank < self.essential_count:
+                copy_values[rank][0] += essential_bonus
+            unit_cost = self._units(cheapest[key]['price'])
+            options = []
+            value = 0
+            for copy, copy_value in enumerate(copy_values[rank]):
+                value += copy_value
+                options.append((unit_cost * (copy + 1), value))
+            groups.append(_Group(key, cheapest[key], rank, key in must_have, options))
+        return groups
+
+    def _table(self, room_type, must_have, budget_units):
+        cache_key = (room_type, must_have)
+        with self._lock:
+            table = self._tables.get(cache_key)
+            if table is not None:
+                self._tables.move_to_end(cache_key)
+                if budget_units <= table.capacity or table.complete:
+                    return table
+            generation = self._generation
+
+        groups = self._groups(room_type, must_have)
+        total_units = sum(group.options[-1][0] for group in groups)
+        capacity = min(total_units, max(self.max_units, budget_units))
+        table = _build_table(groups, capacity, self.top_k)
+        table.complete = capacity == total_units
+
+        # Tables for budgets above max_budget are used once and not kept,
+        # and neither are tables built while the catalog was changing.
+        with self._lock:
+            self.tables_built += 1
+            if generation == self._generation and (capacity <= self.max_units or table.complete):
+                self._tables[cache_key] = table
+                while len(self._tables) > self.max_cached_tables:
+                    self._tables.popitem(last=False)
+        return table
+
+    def _units(self, price):
+        return max(1, math.ceil(price / self.price_unit))
+
+    # ─── Bundle reconstruction ─────────────────────────────────────────────
+
+    def _bundle(self, table, layer, column, budget):
+        chosen = []
+        for index in range(len(table.groups) - 1, -1, -1):
+            group = table.groups[index]
+            option = int(table.options[index][layer, column])
+            layer = int(table.layers[index][layer, column])
+            if option:
+                column -= group.options[option - 1][0]
+                chosen.append((group, option))
+        chosen.reverse()
+
+        items = []
+        for group, quantity in chosen:
+            items.append({
+                'key': group.key,
+                'sku': group.sku,
+                'quantity': quantity,
+                'priority': 'essential' if group.rank < self.essential_count else 'optional',
+            })
+        self._upgrade(items, budget)
+        return {
+            'items': items,
+            'cost': sum(item['sku']['price'] * item['quantity'] for item in items),
+            'value': sum(group.options[quantity - 1][1] for group, quantity in chosen),
+        }
+
+    def _upgrade(self, items, budget):
+        """Spend what is left on pricier SKUs, highest priority first."""
+        remaining = budget - sum(item['sku']['price'] * item['quantity'] for item in items)
+        for item in items:
+            current = item['sku']
+            for sku in reversed(self.skus(item['key'])):
+                extra = (sku['price'] - current['price']) * item['quantity']
+                if extra <= 0:
+                    break
+                if extra <= remaining:
+                    item['sku'] = sku
+                    remaining -= extra
+                    break
+
+
+class _Group:
+    __slots__ = ("key", "sku", "rank", "required", "options")
+
+    def __init__(self, key, sku, rank, required, options):
+        self.key = key
+        self.sku = sku
+        self.rank = rank
+        self.required = required
+        self.options = options  # [(cost units, value)] for 1..n copies
+
+
+class _Table:
+    def __init__(self, groups, capacity, scores, options, layers):
+        self.groups = groups
+        self.capacity = capacity
+        self.scores = scores
+        self.options = options
+        self.layers = layers
+        self.complete = False
+
+    def nbytes(self):
+        return self.scores.nbytes + sum(a.nbytes for a in self.options) + sum(a.nbytes for a in self.layers)
+
+
+def _build_table(groups, capacity, top_k):
+    """Top-K multiple-choice knapsack, vectorized over budget columns.
+
+    ``scores[l, c]`` is the l-th best score with at most ``c`` units spent.
+    For each group, ``options[g][l, c]`` records how many copies that entry
+    took and ``layers[g][l, c]`` which entry of the previous group it
+    extended.
+    """
+    columns = capacity + 1
+    scale = columns
+    scores = np.full((top_k, columns), NO_BUNDLE, dtype=np.int64)
+    scores[0, :] = 0
+    option_arrays = []
+    layer_arrays = []
+    # The smallest unsigned type that holds every index, so top_k or
+    # quantity limits above 127 cannot wrap.
+    layer_dtype = np.min_scalar_type(top_k - 1)
+
+    for group in groups:
+        candidates = [] if group.required else [scores]
+        for units, value in group.options:
+            shifted = np.full_like(scores, NO_BUNDLE)
+            if units < columns:
+                shifted[:, units:] = scores[:, :columns - units] + (value * scale + units)
+            candidates.append(shifted)
+        stacked = np.concatenate(candidates)
+        order = np.argsort(-stacked, axis=0, kind="stable")[:top_k]
+        scores = np.take_along_axis(stacked, order, axis=0)
+        scores[scores < 0] = NO_BUNDLE
+
+        first_option = 0 if group.required else -1
+        option_arrays.append((order // top_k + first_option + 1).astype(np.min_scalar_type(len(group.options))))
+        layer_arrays.append((order % top_k).astype(layer_dtype))
+
+    return _Table(groups, capacity, scores, option_arrays, layer_arrays)
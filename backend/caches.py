@@ -0,0 +1,326 @@
+"""In-memory and on-disk caches for expensive inference intermediates."""
+from collections import OrderedDict
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+
+def image_content_hash(image):
+    """Hash the normalized RGB pixels (and size) of a PIL image."""
+    rgb = image if image.mode == "RGB" else image.convert("RGB")
+    digest = hashlib.sha256()
+    digest.update(f"{rgb.size[0]}x{rgb.size[1]}".encode())
+    digest.update(rgb.tobytes())
+    return digest.hexdigest()
+
+
+def image_nbytes(image):
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+def tensor_nbytes(tensor):
+    return tensor.numel() * tensor.element_size()
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by total size in bytes.
+
+    ``sizeof`` returns the size of a stored value. Evicted entries are passed
+    to ``on_evict(key, value)`` when given.
+    """
+
+    def __init__(self, max_bytes, sizeof, on_evict=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return False
+
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                old_key, (old_value, old_size) = self._entries.popitem(last=False)
+                self.current_bytes -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+
+        if self.on_evict is not None:
+            for old_key, old_value in evicted:
+                self.on_evict(old_key, old_value)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DiskTier:
+    """Directory of cache files pruned oldest-first to stay under ``max_bytes``."""
+
+    def __init__(self, directory, max_bytes, suffix):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def exists(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def touch(self, key):
+        try:
+            os.utime(self.path_for(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        with self._lock:
+            files = []
+            for name in os.listdir(self.directory):
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def stats(self):
+        total = 0
+        count = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffix):
+                count += 1
+                total += os.path.getsize(os.path.join(self.directory, name))
+        return {'files': count, 'bytes': total, 'max_bytes': self.max_bytes}
+
+
+class DepthCache:
+    """Depth maps keyed by the depth model and the content hash of the image they were computed from.
+
+    Entries live in a byte-budgeted LRU; with ``disk_dir`` set, maps are also
+    written there as PNG and read back on a memory miss. ``model_id`` keeps
+    maps from a different depth model, left on disk, from being reused.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=256 * 1024 * 1024, model_id=None):
+        self.model_id = model_id
+        self.memory = LRUCache(max_bytes, image_nbytes)
+        self.disk = DiskTier(disk_dir, disk_max_bytes, ".png") if disk_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, image, compute):
+        key = result_cache_key(self.model_id, image_content_hash(image))
+        depth = self.memory.get(key)
+        if depth is not None:
+            self.hits += 1
+            return depth
+
+        if self.disk is not None and self.disk.exists(key):
+            try:
+                with Image.open(self.disk.path_for(key)) as stored:
+                    depth = stored.copy()
+                self.disk.touch(key)
+                self.disk_hits += 1
+                self.memory.put(key, depth)
+                return depth
+            except OSError:
+                pass
+
+        self.misses += 1
+        depth = compute(image)
+        self.memory.put(key, depth)
+        if self.disk is not None:
+            try:
+                depth.save(self.disk.path_for(key), format="PNG")
+                self.disk.prune()
+            except OSError as exc:
+                print(f"Depth cache disk write failed: {exc}")
+        return depth
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0,
+            'entries': len(self.memory),
+            'bytes': self.memory.current_bytes,
+            'max_bytes': self.memory.max_bytes,
+            'evictions': self.memory.evictions,
+            'disk': self.disk.stats() if self.disk is not None else None,
+        }
+
+
+class PromptEmbeddingCache:
+    """Text-encoder outputs keyed by (model id, prompt).
+
+    Constant prompts can be pinned so they are never evicted; everything
+    else shares a byte-budgeted LRU.
+    """
+
+    def __init__(self, max_bytes):
+        self.memory = LRUCache(max_bytes, tensor_nbytes)
+        self._pinned = {}
+        self.pinned_hits = 0
+        self.hits = 0
+        self.misses = 0
+
+    def pin(self, model_id, prompt, encode):
+        self._pinned[(model_id, prompt)] = encode(prompt)
+
+    def get_or_encode(self, model_id, prompt, encode):
+        key = (model_id, prompt)
+        embeds = self._pinned.get(key)
+        if embeds is not None:
+            self.pinned_hits += 1
+            return embeds
+
+        embeds = self.memory.get(key)
+        if embeds is not None:
+            self.hits += 1
+            return embeds
+
+        self.misses += 1
+        embeds = encode(prompt)
+        self.memory.put(key, embeds)
+        return embeds
+
+    def stats(self):
+        lookups = self.pinned_hits + self.hits + self.misses
+        return {
+            'pinned': len(self._pinned),
+            'pinned_hits': self.pinned_hits,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round((self.pinned_hits + self.hits) / lookups, 3) if lookups else 0,
+            'entries': len(self.memory),
+            'bytes': self.memory.current_bytes,
+            'max_bytes': self.memory.max_bytes,
+            'evictions': self.memory.evictions,
+        }
+
+
+def result_cache_key(*parts):
+    """Stable hash of everything that determines a generation result."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Finished generations (lists of PIL images) for seeded, repeatable requests.
+
+    Keys come from result_cache_key. Images live in a byte-budgeted LRU and,
+    with ``disk_dir`` set, as PNGs named ``<key>-<index>.png`` that are read
+    back on a memory miss.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        self.memory = LRUCache(max_bytes, lambda images: sum(image_nbytes(image) for image in images))
+        self.disk = DiskTier(disk_dir, disk_max_bytes, ".png") if disk_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key, count=1):
+        images = self.memory.get(key)
+        if images is not None:
+            self.hits += 1
+            return images
+
+        if self.disk is not None:
+            images = self._read_disk(key, count)
+            if images is not None:
+                self.disk_hits += 1
+                self.memory.put(key, images)
+                return images
+
+        self.misses += 1
+        return None
+
+    def put(self, key, images):
+        images = list(images)
+        self.memory.put(key, images)
+        if self.disk is None:
+            return
+        try:
+            for index, image in enumerate(images):
+                image.save(self.disk.path_for(f"{key}-{index}"), format="PNG", compress_level=1)
+            self.disk.prune()
+        except OSError as exc:
+            print(f"Result cache disk write failed: {exc}")
+
+    def _read_disk(self, key, count):
+        images = []
+        for index in range(count):
+            part = f"{key}-{index}"
+            if not self.disk.exists(part):
+                return None
+            try:
+                with Image.open(self.disk.path_for(part)) as stored:
+                    images.append(stored.convert("RGB"))
+            except OSError:
+                return None
+        for index in range(count):
+            self.disk.touch(f"{key}-{index}")
+        return images
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0,
+            'entries': len(self.memory),
+            'bytes': self.memory.current_bytes,
+            'max_bytes': self.memory.max_bytes,
+            'evictions': self.memory.evictions,
+            'disk': self.disk.stats() if self.disk is not None else None,
+        }
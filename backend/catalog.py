@@ -0,0 +1,350 @@
+"""SQLite-backed furniture catalog.
+
+Items, synonyms, purchase links and per-room priority lists live in one
+SQLite file, indexed by item key, synonym, room type and price. Every
+write bumps a catalog revision and stamps the rows it touched (deleted
+items are kept as tombstones), so a running server can ask for just the
+keys and rooms that changed since the revision it last saw.
+
+Item rows and links are served from bounded LRU caches; the full catalog
+is never held in memory.
+
+Import or update items from a JSON file with the same layout as
+catalog_seed.json while the server is running:
+
+    python catalog.py import new_items.json [--db catalog.db]
+"""
+from collections import OrderedDict
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS items (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    price INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS items_price ON items (price) WHERE deleted = 0;
+CREATE INDEX IF NOT EXISTS items_revision ON items (revision);
+CREATE TABLE IF NOT EXISTS synonyms (
+    key TEXT NOT NULL,
+    phrase TEXT NOT NULL,
+    PRIMARY KEY (key, phrase)
+);
+CREATE INDEX IF NOT EXISTS synonyms_phrase ON synonyms (phrase);
+CREATE TABLE IF NOT EXISTS links (
+    key TEXT NOT NULL,
+    store TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (key, store)
+);
+CREATE TABLE IF NOT EXISTS rooms (room_type TEXT PRIMARY KEY, revision INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS room_items (
+    room_type TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (room_type, rank)
+);
+CREATE INDEX IF NOT EXISTS room_items_key ON room_items (key);
+"""
+
+
+class CatalogChanges:
+    """Keys and room types touched between two revisions."""
+
+    def __init__(self, revision, updated=(), removed=(), rooms=()):
+        self.revision = revision
+        self.updated = set(updated)
+        self.removed = set(removed)
+        self.rooms = set(rooms)
+
+    def __bool__(self):
+        return bool(self.updated or self.removed or self.rooms)
+
+    def __repr__(self):
+        return (f"CatalogChanges(revision={self.revision}, updated={len(self.updated)}, "
+                f"removed={len(self.removed)}, rooms={sorted(self.rooms)})")
+
+
+class _BoundedCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MISSING = object()
+
+
+class CatalogStore:
+    """Read side used by the app, plus the writes behind imports.
+
+    ``fallback_links(key)`` builds links for items without stored ones; the
+    result is cached alongside stored links. The database is created and
+    filled from ``seed_path`` when it has no items yet.
+    """
+
+    def __init__(self, path, seed_path=None, cache_entries=4096, fallback_links=None):
+        self.path = path
+        self.fallback_links = fallback_links
+        self.reloads = 0
+        self._items = _BoundedCache(cache_entries)
+        self._links = _BoundedCache(cache_entries)
+        # Keyed by the requested room type, which clients choose.
+        self._rooms = _BoundedCache(cache_entries)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            empty = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0] == 0
+        if empty and seed_path and os.path.exists(seed_path):
+            with open(seed_path, encoding="utf-8") as handle:
+                self.import_data(json.load(handle))
+        self.revision = self.current_revision()
+
+    # ─── Reads ─────────────────────────────────────────────────────────────
+
+    def get(self, key):
+        """Return ``{'key', 'name', 'price'}`` or None."""
+        item = self._items.get(key, _MISSING)
+        if item is _MISSING:
+            row = self._connection().execute(
+                "SELECT name, price FROM items WHERE key = ? AND deleted = 0", (key,)
+            ).fetchone()
+            item = {'key': key, 'name': row[0], 'price': row[1]} if row else None
+            self._items.put(key, item)
+        return item
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def skus(self, key):
+        """Purchasable variants of ``key``, cheapest first (one per item for now)."""
+        item = self.get(key)
+        return [item] if item else []
+
+    def links(self, key):
+        links = self._links.get(key)
+        if links is None:
+            rows = self._connection().execute(
+                "SELECT store, url FROM links WHERE key = ?", (key,)
+            ).fetchall()
+            links = dict(rows)
+            if not links and self.fallback_links is not None:
+                links = self.fallback_links(key)
+            self._links.put(key, links)
+        return links
+
+    def synonyms(self, key):
+        rows = self._connection().execute(
+            "SELECT phrase FROM synonyms WHERE key = ? ORDER BY phrase", (key,)
+        ).fetchall()
+        return [phrase for (phrase,) in rows]
+
+    def all_synonyms(self):
+        """Yield (key, [phrases]) for every live item, including those without synonyms."""
+        rows = self._connection().execute(
+            "SELECT items.key, synonyms.phrase FROM items "
+            "LEFT JOIN synonyms ON synonyms.key = items.key "
+            "WHERE items.deleted = 0 ORDER BY items.rowid, synonyms.phrase"
+        )
+        current, phrases = None, []
+        for key, phrase in rows:
+            if key != current:
+                if current is not None:
+                    yield current, phrases
+                current, phrases = key, []
+            if phrase is not None:
+                phrases.append(phrase)
+        if current is not None:
+            yield current, phrases
+
+    def keys_for_synonym(self, phrase):
+        rows = self._connection().execute(
+            "SELECT synonyms.key FROM synonyms JOIN items ON items.key = synonyms.key "
+            "WHERE synonyms.phrase = ? AND items.deleted = 0", (phrase,)
+        ).fetchall()
+        return [key for (key,) in rows]
+
+    def room_types(self):
+        rows = self._connection().execute("SELECT room_type FROM rooms ORDER BY room_type").fetchall()
+        return [room_type for (room_type,) in rows]
+
+    def room_items(self, room_type):
+        """Item keys for ``room_type``, most important first."""
+        keys = self._rooms.get(room_type)
+        if keys is None:
+            rows = self._connection().execute(
+                "SELECT room_items.key FROM room_items JOIN items ON items.key = room_items.key "
+                "WHERE room_items.room_type = ? AND items.deleted = 0 ORDER BY room_items.rank",
+                (room_type,),
+            ).fetchall()
+            keys = [key for (key,) in rows]
+            self._rooms.put(room_type, keys)
+        return keys
+
+    def items_in_price_range(self, low=None, high=None, room_type=None, limit=100):
+        sql = "SELECT items.key, items.name, items.price FROM items"
+        params = []
+        if room_type:
+            sql += " JOIN room_items ON room_items.key = items.key AND room_items.room_type = ?"
+            params.append(room_type)
+        sql += " WHERE items.deleted = 0"
+        if low is not None:
+            sql += " AND items.price >= ?"
+            params.append(low)
+        if high is not None:
+            sql += " AND items.price <= ?"
+            params.append(high)
+        sql += " ORDER BY items.price LIMIT ?"
+        params.append(limit)
+        rows = self._connection().execute(sql, params).fetchall()
+        return [{'key': key, 'name': name, 'price': price} for key, name, price in rows]
+
+    def current_revision(self):
+        row = self._connection().execute("SELECT value FROM meta WHERE name = 'revision'").fetchone()
+        return row[0] if row else 0
+
+    # ─── Hot reload ────────────────────────────────────────────────────────
+
+    def reload(self):
+        """Pick up writes made since the last reload; returns CatalogChanges or None."""
+        revision = self.current_revision()
+        if revision == self.revision:
+            return None
+
+        conn = self._connection()
+        updated, removed = set(), set()
+        for key, deleted in conn.execute(
+            "SELECT key, deleted FROM items WHERE revision > ?", (self.revision,)
+        ):
+            (removed if deleted else updated).add(key)
+        rooms = {room for (room,) in conn.execute(
+            "SELECT room_type FROM rooms WHERE revision > ?", (self.revision,)
+        )}
+        # Rooms listing a changed item are affected without their own revision bump.
+        changed = updated | removed
+        for key in changed:
+            rooms.update(room for (room,) in conn.execute(
+                "SELECT room_type FROM room_items WHERE key = ?", (key,)
+            ))
+
+        self._items.discard(changed)
+        self._links.discard(changed)
+        self._rooms.discard(rooms)
+        self.revision = revision
+        self.reloads += 1
+        return CatalogChanges(revision, updated, removed, rooms)
+
+    # ─── Writes ────────────────────────────────────────────────────────────
+
+    def import_data(self, data):
+        """Upsert ``{'items': {key: {...}}, 'rooms': {room: [keys]}}`` in one revision.
+
+        Item entries take ``name``, ``price`` and optional ``synonyms``
+        (list), ``links`` (store -> url) and ``deleted`` (true removes it).
+        """
+        with self._write_lock, self._connection() as conn:
+            revision = self._bump(conn)
+            for key, entry in data.get('items', {}).items():
+                if entry.get('deleted'):
+                    conn.execute("UPDATE items SET deleted = 1, revision = ? WHERE key = ?", (revision, key))
+                    continue
+                conn.execute(
+                    "INSERT INTO items (key, name, price, revision, deleted) VALUES (?, ?, ?, ?, 0) "
+                    "ON CONFLICT (key) DO UPDATE SET name = excluded.name, price = excluded.price, "
+                    "revision = excluded.revision, deleted = 0",
+                    (key, entry['name'], int(entry['price']), revision),
+                )
+                if 'synonyms' in entry:
+                    conn.execute("DELETE FROM synonyms WHERE key = ?", (key,))
+                    conn.executemany("INSERT OR IGNORE INTO synonyms (key, phrase) VALUES (?, ?)",
+                                     [(key, phrase) for phrase in entry['synonyms']])
+                if 'links' in entry:
+                    conn.execute("DELETE FROM links WHERE key = ?", (key,))
+                    conn.executemany("INSERT INTO links (key, store, url) VALUES (?, ?, ?)",
+                                     [(key, store, url) for store, url in entry['links'].items()])
+            for room_type, keys in data.get('rooms', {}).items():
+                conn.execute("INSERT OR REPLACE INTO rooms (room_type, revision) VALUES (?, ?)",
+                             (room_type, revision))
+                conn.execute("DELETE FROM room_items WHERE room_type = ?", (room_type,))
+                conn.executemany("INSERT INTO room_items (room_type, rank, key) VALUES (?, ?, ?)",
+                                 [(room_type, rank, key) for rank, key in enumerate(keys)])
+        return revision
+
+    def stats(self):
+        conn = self._connection()
+        return {
+            'path': self.path,
+            'revision': self.revision,
+            'items': conn.execute("SELECT COUNT(*) FROM items WHERE deleted = 0").fetchone()[0],
+            'room_types': conn.execute("SELECT COUNT(*) FROM rooms").fetchone()[0],
+            'cached_items': len(self._items),
+            'cached_links': len(self._links),
+            'cached_rooms': len(self._rooms),
+            'reloads': self.reloads,
+        }
+
+    def _bump(self, conn):
+        conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('revision', 0)")
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'revision'")
+        return conn.execute("SELECT value FROM meta WHERE name = 'revision'").fetchone()[0]
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Furniture catalog maintenance")
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("path", help="JSON file laid out like catalog_seed.json")
+    parser.add_argument("--db", default=os.environ.get("CATALOG_DB", "catalog.db"))
+    args = parser.parse_args()
+
+    store = CatalogStore(args.db)
+    with open(args.path, encoding="utf-8") as handle:
+        revision = store.import_data(json.load(handle))
+    print(f"Catalog {args.db} now at revision {revision}")
+
+
+if __name__ == "__main__":
+    main()
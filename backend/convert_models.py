@@ -0,0 +1,33 @@
+"""Fill MODEL_STORE_DIR with safetensors copies of every configured model.
+
+    MODEL_STORE_DIR=/srv/models python convert_models.py
+
+Converts MODEL_ID, CONTROLNET_MODEL_ID, LAYOUT_MODEL_ID, the MiDaS depth
+checkpoint and FLOORPLAN_LORA_ID (when set), in the dtype this machine
+runs them in (float16 on CUDA, float32 on CPU). Models already in the
+store are skipped unless --force is given. This is the only step that
+needs the network; the server then loads everything from the store.
+"""
+import argparse
+import os
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=os.environ.get("MODEL_STORE_DIR"))
+    parser.add_argument("--force", action="store_true", help="convert models that are already stored")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("set MODEL_STORE_DIR or pass --store")
+
+    os.environ["MODEL_STORE_DIR"] = args.store
+    # Demo mode keeps the import from warming up models or starting workers.
+    os.environ["USE_LOCAL_MODEL"] = "false"
+    import app
+
+    os.makedirs(args.store, exist_ok=True)
+    app.convert_model_store(force=args.force)
+
+
+if __name__ == "__main__":
+    main()
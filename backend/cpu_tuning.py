@@ -0,0 +1,140 @@
+"""CPU inference tuning: torch threads, memory format, attention, autocast, VAE tiling, compile.
+
+On CUDA the pipelines get xFormers and slicing; on CPU they used to run
+with whatever torch and diffusers picked. A ``CpuTuning`` bundles the
+settings for one CPU deployment. ``apply_threads`` configures torch once
+per process, ``tune_pipeline`` prepares a loaded pipeline and ``autocast``
+wraps the pipeline calls. Each returns what actually took effect, so
+/api/health can report it.
+"""
+import contextlib
+
+import torch
+
+ATTENTION_AUTO = "auto"
+ATTENTION_SDPA = "sdpa"
+ATTENTION_SLICED = "sliced"
+ATTENTION_MODES = (ATTENTION_AUTO, ATTENTION_SDPA, ATTENTION_SLICED)
+TUNED_ROLES = ("unet", "controlnet", "vae")
+
+
+class CpuTuning:
+    """Settings for CPU inference.
+
+    ``threads`` and ``interop_threads`` of 0 keep torch's defaults.
+    ``channels_last`` stores UNet, ControlNet and VAE weights NHWC, which
+    oneDNN convolutions prefer. ``bf16_autocast`` runs pipeline calls under
+    bfloat16 autocast (fast on CPUs with AVX512-BF16 or AMX, slower
+    elsewhere). ``vae_tile_size`` encodes and decodes images larger than
+    that many pixels in overlapping tiles (0 disables). ``attention`` is one
+    of ATTENTION_MODES; "auto" keeps the processor diffusers chose.
+    ``compile_unet`` wraps the UNet in torch.compile (compiled on the first
+    call; falls back to eager if compilation fails).
+    """
+
+    def __init__(self, name, threads=0, interop_threads=0, channels_last=False, bf16_autocast=False,
+                 vae_tile_size=0, attention=ATTENTION_AUTO, compile_unet=False):
+        if attention not in ATTENTION_MODES:
+            raise ValueError(f"attention must be one of: {', '.join(ATTENTION_MODES)}")
+        self.name = name
+        self.threads = threads
+        self.interop_threads = interop_threads
+        self.channels_last = channels_last
+        self.bf16_autocast = bf16_autocast
+        self.vae_tile_size = vae_tile_size
+        self.attention = attention
+        self.compile_unet = compile_unet
+
+    def replace(self, **overrides):
+        """A copy with some settings changed (keeps the name)."""
+        return CpuTuning(**{**self.to_dict(), **overrides})
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'threads': self.threads,
+            'interop_threads': self.interop_threads,
+            'channels_last': self.channels_last,
+            'bf16_autocast': self.bf16_autocast,
+            'vae_tile_size': self.vae_tile_size,
+            'attention': self.attention,
+            'compile_unet': self.compile_unet,
+        }
+
+
+def apply_threads(tuning):
+    """Set torch's thread pools; returns the counts in effect and any error."""
+    error = None
+    if tuning.threads > 0:
+        torch.set_num_threads(tuning.threads)
+    if tuning.interop_threads > 0 and torch.get_num_interop_threads() != tuning.interop_threads:
+        try:
+            torch.set_num_interop_threads(tuning.interop_threads)
+        except RuntimeError as e:
+            # Only possible before the first inter-op parallel work in the process.
+            error = str(e)
+    return {
+        'threads': torch.get_num_threads(),
+        'interop_threads': torch.get_num_interop_threads(),
+        'error': error,
+    }
+
+
+def tune_pipeline(pipeline, tuning):
+    """Apply ``tuning`` to a loaded pipeline in place; returns what was applied."""
+    modules = {role: getattr(pipeline, role) for role in TUNED_ROLES if getattr(pipeline, role, None) is not None}
+    applied = {'channels_last': False, 'attention': ATTENTION_AUTO, 'vae_tiling': False, 'compiled_unet': False}
+
+    if tuning.channels_last:
+        for module in modules.values():
+            module.to(memory_format=torch.channels_last)
+        applied['channels_last'] = True
+
+    if tuning.attention == ATTENTION_SDPA:
+        from diffusers.models.attention_processor import AttnProcessor2_0
+        for module in modules.values():
+            if hasattr(module, "set_attn_processor"):
+                module.set_attn_processor(AttnProcessor2_0())
+        applied['attention'] = ATTENTION_SDPA
+    elif tuning.attention == ATTENTION_SLICED:
+        pipeline.enable_attention_slicing()
+        applied['attention'] = ATTENTION_SLICED
+
+    vae = modules.get("vae")
+    if tuning.vae_tile_size > 0 and vae is not None:
+        vae.enable_tiling()
+        scale = 2 ** (len(vae.config.block_out_channels) - 1)
+        vae.tile_sample_min_size = tuning.vae_tile_size
+        vae.tile_latent_min_size = tuning.vae_tile_size // scale
+        applied['vae_tiling'] = True
+
+    unet = modules.get("unet")
+    if tuning.compile_unet and unet is not None:
+        if not hasattr(unet, "_orig_mod"):
+            from torch._dynamo import config as dynamo_config
+            dynamo_config.suppress_errors = True
+            pipeline.unet = torch.compile(unet)
+        applied['compiled_unet'] = True
+
+    return applied
+
+
+def autocast(tuning):
+    """Context for one pipeline call: bfloat16 autocast when enabled."""
+    if tuning.bf16_autocast:
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+# Named starting points; app.py picks one with CPU_TUNING_PROFILE and applies
+# per-setting overrides. VAE tiling only kicks in above the standard buckets.
+# None of them change torch's thread pools; CPU_THREADS and
+# CPU_INTEROP_THREADS do.
+CPU_TUNING_PROFILES = {
+    tuning.name: tuning for tuning in (
+        CpuTuning("none"),
+        CpuTuning("standard", channels_last=True, vae_tile_size=768, attention=ATTENTION_SDPA),
+        CpuTuning("bf16", channels_last=True, bf16_autocast=True, vae_tile_size=768, attention=ATTENTION_SDPA),
+        CpuTuning("compiled", channels_last=True, vae_tile_size=768, attention=ATTENTION_SDPA, compile_unet=True),
+    )
+}
@@ -0,0 +1,93 @@
+"""Output image encoders and format negotiation.
+
+Format names:
+    png            RGB PNG at PNG_COMPRESS_LEVEL, no optimize pass
+    png-palette    adaptive 16-colour palette PNG (floor plans)
+    png-1bit       thresholded black/white PNG (floor plans)
+    jpeg           baseline JPEG at ``quality``
+    webp           lossy WebP at ``quality``
+    webp-lossless  lossless WebP
+"""
+from io import BytesIO
+import os
+
+from PIL import Image
+
+PNG_COMPRESS_LEVEL = int(os.environ.get("PNG_COMPRESS_LEVEL", 1))
+WEBP_METHOD = int(os.environ.get("WEBP_METHOD", 4))
+DEFAULT_QUALITY = int(os.environ.get("OUTPUT_QUALITY", 85))
+PALETTE_COLORS = 16
+ONE_BIT_THRESHOLD = 160
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "png-palette": "image/png",
+    "png-1bit": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "webp-lossless": "image/webp",
+}
+OUTPUT_FORMATS = tuple(CONTENT_TYPES)
+
+
+def encode(image, fmt="png", quality=None):
+    """Encode ``image`` as ``fmt``; returns (bytes, content type)."""
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Unknown output format: {fmt}")
+    quality = DEFAULT_QUALITY if quality is None else quality
+    buffered = BytesIO()
+
+    if fmt == "png":
+        image.save(buffered, format="PNG", compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+    elif fmt == "png-palette":
+        paletted = image.convert("RGB").quantize(colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+        paletted.save(buffered, format="PNG", compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+    elif fmt == "png-1bit":
+        bilevel = image.convert("L").point(lambda value: 255 if value > ONE_BIT_THRESHOLD else 0, mode="1")
+        bilevel.save(buffered, format="PNG", compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+    elif fmt == "jpeg":
+        image.convert("RGB").save(buffered, format="JPEG", quality=quality)
+    elif fmt == "webp":
+        image.save(buffered, format="WEBP", quality=quality, method=WEBP_METHOD)
+    else:
+        image.save(buffered, format="WEBP", lossless=True, quality=quality, method=WEBP_METHOD)
+
+    return buffered.getvalue(), CONTENT_TYPES[fmt]
+
+
+def negotiate(requested, accept_mimetypes, default, png_variant="png"):
+    """Pick an output format.
+
+    An explicit ``requested`` format wins. Otherwise the Accept header is
+    honoured when it names a specific image type, and ``default`` is used for
+    wildcard or missing headers. ``png_variant`` is what image/png maps to.
+    """
+    if requested:
+        if requested not in CONTENT_TYPES:
+            raise ValueError(f"format must be one of: {', '.join(OUTPUT_FORMATS)}")
+        return requested
+
+    by_content_type = {
+        "image/webp": "webp",
+        "image/jpeg": "jpeg",
+        "image/png": png_variant,
+    }
+    # The default goes first so wildcards resolve to it.
+    default_type = CONTENT_TYPES[default]
+    candidates = [default_type] + [ct for ct in by_content_type if ct != default_type]
+    best = accept_mimetypes.best_match(candidates) if accept_mimetypes else None
+    if best is None or best == default_type:
+        return default
+    return by_content_type[best]
+
+
+def parse_quality(value):
+    if value in (None, ''):
+        return None
+    try:
+        quality = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("quality must be an integer")
+    if not 1 <= quality <= 100:
+        raise ValueError("quality must be between 1 and 100")
+    return quality
@@ -0,0 +1,121 @@
+"""Single-pass furniture phrase matching over normalized prompt text.
+
+All synonyms are compiled into one token trie, so a prompt is scanned once
+regardless of catalog size. At each position the longest phrase wins
+("coffee table" beats "table", "artificial plant" beats "plant") and
+matches never overlap.
+"""
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+_KEY = object()
+
+
+class FurnitureMatch:
+    __slots__ = ("key", "phrase", "start", "end")
+
+    def __init__(self, key, phrase, start, end):
+        self.key = key
+        self.phrase = phrase
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"FurnitureMatch({self.key!r}, {self.phrase!r}, {self.start}, {self.end})"
+
+
+class FurnitureMatcher:
+    """Longest-match phrase finder built from ``{item_key: [phrases]}``.
+
+    Phrases must already be normalized (see normalize_prompt_text). Keys are
+    reported in the order of ``synonyms``. ``add`` and ``remove`` update the
+    trie in place, so a catalog reload only touches the items that changed.
+    """
+
+    def __init__(self, synonyms):
+        self._root = {}
+        self._order = {}
+        self._phrases = {}
+        # Item keys using each phrase, oldest first; the newest one is matched.
+        self._owners = {}
+        self.phrase_count = 0
+        for item_key, phrases in synonyms.items():
+            self.add(item_key, phrases)
+
+    def add(self, item_key, phrases):
+        self._order.setdefault(item_key, len(self._order))
+        for phrase in phrases:
+            tokens = TOKEN_PATTERN.findall(phrase)
+            if not tokens:
+                continue
+            node = self._root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            if _KEY not in node:
+                self.phrase_count += 1
+            node[_KEY] = (item_key, " ".join(tokens))
+            owners = self._owners.setdefault(tuple(tokens), [])
+            if item_key in owners:
+                owners.remove(item_key)
+            owners.append(item_key)
+            self._phrases.setdefault(item_key, set()).add(tuple(tokens))
+
+    def remove(self, item_key):
+        """Drop ``item_key``'s phrases; a phrase another item still uses then matches that item."""
+        for tokens in self._phrases.pop(item_key, ()):
+            owners = self._owners.get(tokens, [])
+            if item_key in owners:
+                owners.remove(item_key)
+            path = [self._root]
+            for token in tokens:
+                node = path[-1].get(token)
+                if node is None:
+                    break
+                path.append(node)
+            else:
+                node = path[-1]
+                if owners:
+                    node[_KEY] = (owners[-1], node[_KEY][1])
+                    continue
+                self._owners.pop(tokens, None)
+                del node[_KEY]
+                self.phrase_count -= 1
+                # Prune branches that no longer lead to any phrase.
+                for depth in range(len(tokens), 0, -1):
+                    if path[depth]:
+                        break
+                    del path[depth - 1][tokens[depth - 1]]
+
+    def find(self, normalized_text):
+        """Return non-overlapping longest matches in ``normalized_text``."""
+        tokens = list(TOKEN_PATTERN.finditer(normalized_text))
+        matches = []
+        index = 0
+        while index < len(tokens):
+            node = self._root
+            best = None
+            cursor = index
+            while cursor < len(tokens):
+                node = node.get(tokens[cursor].group())
+                if node is None:
+                    break
+                if _KEY in node:
+                    best = (cursor, node[_KEY])
+                cursor += 1
+
+            if best is None:
+                index += 1
+                continue
+
+            last, (item_key, phrase) = best
+            matches.append(FurnitureMatch(item_key, phrase, tokens[index].start(), tokens[last].end()))
+            index = last + 1
+        return matches
+
+    def detect(self, normalized_text):
+        """Return (item keys in catalog order, set of matched phrases)."""
+        matches = self.find(normalized_text)
+        keys = sorted({match.key for match in matches}, key=lambda key: self._order.get(key, 0))
+        return keys, {match.phrase for match in matches}
+
@@ -0,0 +1,60 @@
+"""Content-addressed store for encoded result images served by /api/images."""
+import hashlib
+import os
+import re
+import threading
+
+from caches import DiskTier
+
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".jpg": "image/jpeg",
+}
+EXTENSIONS = {content_type: ext for ext, content_type in CONTENT_TYPES.items()}
+IMAGE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+class ImageStore:
+    """Encoded images on disk, named by the hash of their bytes.
+
+    The id doubles as a strong ETag because stored bytes never change.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = os.path.abspath(directory)
+        self.disk = DiskTier(self.directory, max_bytes, tuple(CONTENT_TYPES))
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def put(self, data, content_type):
+        image_id = hashlib.sha256(data).hexdigest()[:32]
+        filename = image_id + EXTENSIONS[content_type]
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+            self.disk.prune()
+        with self._lock:
+            self._index[image_id] = filename
+        return image_id
+
+    def lookup(self, image_id):
+        """Return (path, content_type) for a stored image, or None."""
+        if not IMAGE_ID_PATTERN.fullmatch(image_id):
+            return None
+        with self._lock:
+            filename = self._index.get(image_id)
+        candidates = [filename] if filename else [image_id + ext for ext in CONTENT_TYPES]
+        for name in candidates:
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                return path, CONTENT_TYPES[os.path.splitext(name)[1]]
+        with self._lock:
+            self._index.pop(image_id, None)
+        return None
+
+    def stats(self):
+        return self.disk.stats()
@@ -0,0 +1,245 @@
+"""Background job queue for long-running generation requests.
+
+Jobs are submitted by the HTTP layer, drained by a worker thread and kept
+around for a limited time so clients can poll for status and results.
+Synchronous and streamed generations use a ``CancelToken`` instead, found
+by request id through a ``CancelRegistry``.
+"""
+import queue
+import threading
+import time
+import uuid
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = {JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED}
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has reached its configured depth."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled."""
+
+
+class Job:
+    def __init__(self, kind, payload):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.cancelled_at = None
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def raise_if_cancelled(self):
+        """Cooperative cancellation point for handlers."""
+        if self.cancel_event.is_set():
+            raise JobCancelled(self.id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+        }
+
+
+class CancelToken:
+    """Cancellation flag for one generation that is not a queued job."""
+
+    def __init__(self):
+        self.reason = None
+        self.cancelled_at = None
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason):
+        if not self._event.is_set():
+            self.reason = reason
+            self.cancelled_at = time.time()
+            self._event.set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
+
+
+class CancelRegistry:
+    """In-flight generations by client-supplied request id, for explicit cancel calls."""
+
+    def __init__(self):
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def register(self, request_id, token):
+        with self._lock:
+            if request_id in self._tokens:
+                raise ValueError(f"request_id {request_id} is already running")
+            self._tokens[request_id] = token
+
+    def unregister(self, request_id):
+        with self._lock:
+            self._tokens.pop(request_id, None)
+
+    def cancel(self, request_id, reason="explicit"):
+        """Cancel a running generation. Returns its token, or None if unknown."""
+        with self._lock:
+            token = self._tokens.get(request_id)
+        if token is not None:
+            token.cancel(reason)
+        return token
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tokens)
+
+
+class JobQueue:
+    """Bounded FIFO of jobs drained by a single worker thread.
+
+    ``handlers`` maps a job kind to a callable taking the ``Job`` and
+    returning its result. Finished jobs are evicted ``ttl_seconds`` after
+    they complete. ``max_depth`` bounds the jobs still waiting to run;
+    cancelled jobs stop counting as soon as they are cancelled, even
+    before the worker dequeues and skips them.
+    """
+
+    def __init__(self, handlers, max_depth=8, ttl_seconds=600):
+        self.handlers = dict(handlers)
+        self.max_depth = max_depth
+        self.ttl_seconds = ttl_seconds
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def start(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="job-worker", daemon=True)
+            self._worker.start()
+
+    def submit(self, kind, payload):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self.evict_expired()
+        job = Job(kind, payload)
+        with self._lock:
+            if self._pending >= self.max_depth:
+                raise QueueFullError(f"Job queue is full ({self.max_depth} pending)")
+            self._pending += 1
+            self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        self.start()
+        return job
+
+    def get(self, job_id):
+        self.evict_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns the job, or None if unknown."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        with self._lock:
+            if job.status in FINISHED_STATES:
+                return job
+            job.cancelled_at = time.time()
+            job.cancel_event.set()
+            if job.status == JOB_QUEUED:
+                # The worker skips it when dequeued; mark it finished now so
+                # pollers see the outcome immediately.
+                job.status = JOB_CANCELLED
+                job.finished_at = time.time()
+                self._pending -= 1
+        return job
+
+    def depth(self):
+        """Jobs waiting to run, not counting cancelled ones."""
+        with self._lock:
+            return self._pending
+
+    def evict_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            'depth': self.depth(),
+            'max_depth': self.max_depth,
+            'ttl_seconds': self.ttl_seconds,
+            'jobs': counts,
+        }
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._execute(job)
+            finally:
+                self._queue.task_done()
+
+    def _execute(self, job):
+        with self._lock:
+            if job.cancelled:
+                return
+            self._pending -= 1
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+
+        try:
+            result = self.handlers[job.kind](job)
+            job.raise_if_cancelled()
+        except JobCancelled:
+            status, result, error = JOB_CANCELLED, None, None
+        except Exception as exc:
+            print(f"Job {job.id} failed: {exc}")
+            status, result, error = JOB_FAILED, None, str(exc)
+        else:
+            status, error = JOB_SUCCEEDED, None
+
+        with self._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            # Free the uploaded image as soon as the job is done.
+            job.payload = None
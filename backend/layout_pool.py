@@ -0,0 +1,197 @@
+"""Ready-made floor-plan variants for popular (area bucket, room count) requests.
+
+Areas are bucketed by ``bucket_edges``; every bucket is generated at its
+midpoint area. Each (bucket, room count) slot keeps up to ``size`` seeded
+variants on disk as ``<directory>/<slot>/<seed>-<index>.png``. A request
+takes (and removes) one variant, and a background thread generates
+replacements whenever ``is_idle()`` says the inference worker is free.
+
+``generate`` may raise JobCancelled to give the inference worker back to
+a request; that refill is dropped and retried once the worker is idle.
+Only slots that have been requested, or are listed in ``warm``, are
+refilled. ``priority`` orders the refill work: "demand" serves the most
+requested slots first, "warm" serves the ``warm`` list in order first.
+"""
+from collections import Counter, deque
+import os
+import random
+import re
+import threading
+import time
+
+from PIL import Image
+
+from jobs import JobCancelled
+
+PRIORITY_DEMAND = "demand"
+PRIORITY_WARM = "warm"
+MAX_SEED = 2 ** 32 - 1
+
+
+class LayoutPool:
+    def __init__(self, directory, generate, bucket_edges, room_counts, size=2, image_count=4,
+                 is_idle=None, warm=(), priority=PRIORITY_DEMAND, idle_poll_seconds=2.0):
+        """``generate(total_area, room_count, seed)`` returns a list of images.
+
+        ``room_counts`` are the recognised room-count labels; anything else
+        shares the "" (let the model decide) slot.
+        """
+        self.directory = directory
+        self.generate = generate
+        self.bucket_edges = sorted(bucket_edges)
+        self.room_counts = set(room_counts) | {''}
+        self.size = size
+        self.image_count = image_count
+        self.is_idle = is_idle or (lambda: True)
+        self.priority = priority
+        self.idle_poll_seconds = idle_poll_seconds
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.yielded = 0
+        self._warm = []
+        self._demand = Counter()
+        self._ready = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+        for total_area, room_count in warm:
+            slot = self.slot_for(total_area, room_count)
+            if slot is not None and slot not in self._warm:
+                self._warm.append(slot)
+        self._scan()
+
+    def slot_for(self, total_area, room_count):
+        """(bucket area, room count) for a request, or None outside the buckets."""
+        for low, high in zip(self.bucket_edges, self.bucket_edges[1:]):
+            if low <= total_area < high:
+                return (low + high) // 2, room_count if room_count in self.room_counts else ''
+        return None
+
+    def take(self, total_area, room_count):
+        """Return (images, seed, bucket area) for a pooled variant, or None."""
+        slot = self.slot_for(total_area, room_count)
+        if slot is None:
+            return None
+        with self._lock:
+            self._demand[slot] += 1
+            seeds = self._ready.get(slot)
+            seed = seeds.popleft() if seeds else None
+        if seed is None:
+            self.misses += 1
+            return None
+
+        paths = [self._path(slot, seed, index) for index in range(self.image_count)]
+        try:
+            images = []
+            for path in paths:
+                with Image.open(path) as stored:
+                    images.append(stored.convert("RGB"))
+        except OSError:
+            self.misses += 1
+            return None
+        finally:
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.hits += 1
+        return images, seed, slot[0]
+
+    def refill_once(self):
+        """Generate one variant for the neediest slot; returns False when nothing is missing."""
+        slot = self._next_slot()
+        if slot is None:
+            return False
+
+        seed = random.randint(0, MAX_SEED)
+        images = self.generate(slot[0], slot[1], seed)
+        os.makedirs(self._slot_dir(slot), exist_ok=True)
+        for index, image in enumerate(images[:self.image_count]):
+            path = self._path(slot, seed, index)
+            tmp_path = f"{path}.tmp"
+            image.save(tmp_path, format="PNG", compress_level=1)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._ready.setdefault(slot, deque()).append(seed)
+        self.generated += 1
+        return True
+
+    def start(self):
+        if self._thread is None and self.size > 0:
+            self._thread = threading.Thread(target=self._refill_loop, name="layout-pool", daemon=True)
+            self._thread.start()
+
+    def stats(self):
+        with self._lock:
+            slots = set(self._ready) | set(self._demand) | set(self._warm)
+            return {
+                'size': self.size,
+                'bucket_edges': self.bucket_edges,
+                'priority': self.priority,
+                'hits': self.hits,
+                'misses': self.misses,
+                'generated': self.generated,
+                'yielded': self.yielded,
+                'slots': [
+                    {
+                        'area': slot[0],
+                        'room_count': slot[1],
+                        'ready': len(self._ready.get(slot, ())),
+                        'requests': self._demand[slot],
+                    }
+                    for slot in sorted(slots)
+                ],
+            }
+
+    def _refill_loop(self):
+        while True:
+            worked = False
+            if self.is_idle():
+                try:
+                    worked = self.refill_once()
+                except JobCancelled:
+                    self.yielded += 1
+                except Exception as exc:
+                    print(f"Layout pool refill failed: {exc}")
+            if not worked:
+                time.sleep(self.idle_poll_seconds)
+
+    def _next_slot(self):
+        with self._lock:
+            by_demand = sorted(self._demand, key=lambda slot: -self._demand[slot])
+            if self.priority == PRIORITY_WARM:
+                order = self._warm + [slot for slot in by_demand if slot not in self._warm]
+            else:
+                order = by_demand + [slot for slot in self._warm if slot not in self._demand]
+            for slot in order:
+                if len(self._ready.get(slot, ())) < self.size:
+                    return slot
+        return None
+
+    def _slot_dir(self, slot):
+        room_slug = re.sub(r"[^a-z0-9]+", "-", slot[1].lower()).strip("-") or "any"
+        return os.path.join(self.directory, f"{slot[0]}_{room_slug}")
+
+    def _path(self, slot, seed, index):
+        return os.path.join(self._slot_dir(slot), f"{seed}-{index}.png")
+
+    def _scan(self):
+        """Rebuild the ready index from variants left on disk by an earlier run."""
+        slots = {}
+        for low, high in zip(self.bucket_edges, self.bucket_edges[1:]):
+            for room_count in self.room_counts:
+                slot = ((low + high) // 2, room_count)
+                slots[self._slot_dir(slot)] = slot
+        for name in os.listdir(self.directory):
+            slot = slots.get(os.path.join(self.directory, name))
+            if slot is None:
+                continue
+            files = set(os.listdir(os.path.join(self.directory, name)))
+            seeds = {int(f.split("-")[0]) for f in files if re.fullmatch(r"\d+-\d+\.png", f)}
+            complete = [seed for seed in sorted(seeds)
+                        if all(f"{seed}-{index}.png" in files for index in range(self.image_count))]
+            if complete:
+                self._ready[slot] = deque(complete[:self.size])
@@ -0,0 +1,70 @@
+"""Lightweight in-process metrics used by the inference subsystems."""
+import bisect
+import threading
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``bounds`` are inclusive upper edges."""
+
+    def __init__(self, bounds):
+        self.bounds = sorted(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {f"le_{bound:g}": count for bound, count in zip(self.bounds, self._counts)}
+            buckets["le_inf"] = self._counts[-1]
+            return {
+                'count': self._count,
+                'sum': round(self._sum, 3),
+                'mean': round(self._sum / self._count, 3) if self._count else 0,
+                'buckets': buckets,
+            }
+
+
+class CounterSet:
+    """Named counters that only go up."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def reset_peak_rss():
+    """Restart this process's peak-RSS watermark (Linux); returns False where unsupported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    """Peak resident set size since start or the last reset_peak_rss(), or None if unknown."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
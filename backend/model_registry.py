@@ -0,0 +1,109 @@
+"""On-demand model loading with per-model readiness tracking."""
+import threading
+import time
+
+MODEL_NOT_LOADED = "not_loaded"
+MODEL_LOADING = "loading"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
+
+
+class ModelUnavailable(RuntimeError):
+    """A model a request needs failed to load."""
+
+
+class _Entry:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = MODEL_NOT_LOADED
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Loads each registered model the first time it is requested.
+
+    ``loader`` callables return the loaded object. A failed load is
+    remembered and reported instead of being retried on every request.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._warmup_thread = None
+
+    def register(self, name, loader):
+        self._entries[name] = _Entry(name, loader)
+
+    def names(self):
+        return list(self._entries)
+
+    def get(self, name):
+        entry = self._entries[name]
+        if entry.state == MODEL_READY:
+            return entry.value
+
+        with entry.lock:
+            if entry.state == MODEL_NOT_LOADED:
+                self._load(entry)
+            return entry.value
+
+    def require(self, *names):
+        """Load ``names`` and return them; raises ModelUnavailable with the load error of one that failed."""
+        values = []
+        for name in names:
+            value = self.get(name)
+            if value is None:
+                error = self._entries[name].error or "the loader returned nothing"
+                raise ModelUnavailable(f"{name} model failed to load: {error}")
+            values.append(value)
+        return values
+
+    def is_ready(self, *names):
+        return all(self._entries[name].state == MODEL_READY for name in names)
+
+    def warm_up(self, names=None, background=True):
+        """Load ``names`` (default: all) now, or in a daemon thread."""
+        names = list(names or self._entries)
+
+        def run():
+            for name in names:
+                self.get(name)
+
+        if not background:
+            run()
+            return None
+
+        self._warmup_thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def status(self):
+        return {
+            name: {
+                'state': entry.state,
+                'load_seconds': round(entry.load_seconds, 2) if entry.load_seconds is not None else None,
+                'loaded_at': entry.loaded_at,
+                'error': entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def _load(self, entry):
+        entry.state = MODEL_LOADING
+        started = time.perf_counter()
+        try:
+            entry.value = entry.loader()
+        except Exception as exc:
+            print(f"[{entry.name}] model loading failed: {exc}")
+            import traceback
+            traceback.print_exc()
+            entry.error = str(exc)
+            entry.state = MODEL_FAILED
+        else:
+            entry.state = MODEL_READY if entry.value is not None else MODEL_FAILED
+            entry.loaded_at = time.time()
+        entry.load_seconds = time.perf_counter() - started
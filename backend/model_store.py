@@ -0,0 +1,250 @@
+"""Offline model store: safetensors copies of every model, hash-checked and memory-mapped.
+
+``ModelStore.convert`` writes a model once (from the hub or a checkpoint)
+into ``root/<model id>/`` with only safetensors weights, in the dtype it
+will run in, plus a manifest of file sizes and sha256 hashes. Loading from
+there with ``from_pretrained(..., local_files_only=True)`` maps the weights
+instead of copying them, so worker processes on one machine share the
+page cache and nothing reaches the network. ``resolve`` checks a model
+against its manifest before it is loaded: sizes always, hashes on every
+load ("full") or when a file's size or mtime changed since it was last
+hashed ("changed").
+"""
+import hashlib
+import itertools
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+from safetensors.torch import load_file, save_file
+import torch
+
+MANIFEST = "manifest.json"
+# Size and mtime of each file when it last matched its hash.
+VERIFIED = ".verified.json"
+VERIFY_FULL = "full"
+VERIFY_CHANGED = "changed"
+VERIFY_OFF = "off"
+VERIFY_MODES = (VERIFY_FULL, VERIFY_CHANGED, VERIFY_OFF)
+PICKLE_SUFFIXES = (".bin", ".pt", ".pth", ".ckpt", ".pkl")
+
+
+class ModelStoreError(RuntimeError):
+    """A model is missing from the store or does not match its manifest."""
+
+
+def model_slug(model_id):
+    """Directory name for a hub id or path ("org/name" -> "org--name")."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "--", model_id).strip("-.") or "model"
+
+
+def dtype_name(dtype):
+    return str(dtype).replace("torch.", "") if dtype is not None else None
+
+
+def file_sha256(path, chunk_size=8 * 1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch_file(model_id, filename):
+    """Local path of ``filename`` from a model directory or hub repo (downloaded into the hub cache)."""
+    if os.path.isdir(model_id):
+        return os.path.join(model_id, filename)
+    from huggingface_hub import hf_hub_download
+    return hf_hub_download(model_id, filename)
+
+
+def checkpoint_to_safetensors(source, destination):
+    """Write a weights file as safetensors: copied if it already is one, else converted from a torch pickle."""
+    if source.endswith(".safetensors"):
+        shutil.copyfile(source, destination)
+        return
+    state = torch.load(source, map_location="cpu", weights_only=True)
+    if "optimizer" in state:
+        # Training checkpoints keep the weights under "model".
+        state = state["model"]
+    save_file({name: tensor.contiguous() for name, tensor in state.items()}, destination, metadata={"format": "pt"})
+
+
+def mmap_module(build, weights_path):
+    """Build a module with ``build()`` and point its weights at the memory-mapped safetensors file.
+
+    The module is built on the meta device so its random initial weights
+    are never allocated; if that leaves non-persistent buffers unset, it
+    is built again on the CPU.
+    """
+    state = load_file(weights_path)
+    with torch.device("meta"):
+        module = build()
+    module.load_state_dict(state, assign=True)
+    if any(tensor.is_meta for tensor in itertools.chain(module.parameters(), module.buffers())):
+        module = build()
+        module.load_state_dict(state, assign=True)
+    return module.eval()
+
+
+class ModelStore:
+    """Safetensors copies of models under ``root``, one directory per model id."""
+
+    def __init__(self, root, verify=VERIFY_CHANGED):
+        if verify not in VERIFY_MODES:
+            raise ValueError(f"verify must be one of: {', '.join(VERIFY_MODES)}")
+        self.root = root
+        self.verify_mode = verify
+        self._resolved = {}
+        self.hashed_bytes = 0
+        self.verify_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def path(self, model_id):
+        return os.path.join(self.root, model_slug(model_id))
+
+    def manifest(self, model_id):
+        """The model's manifest, or None if it has not been converted."""
+        try:
+            with open(os.path.join(self.path(model_id), MANIFEST)) as handle:
+                return json.load(handle)
+        except FileNotFoundError:
+            return None
+
+    def convert(self, model_id, write, dtype=None, force=False):
+        """Store ``model_id`` by calling ``write(directory)``; returns False if it was already stored.
+
+        The files are written to a staging directory that replaces the
+        model's directory only once they are complete and hashed.
+        """
+        directory = self.path(model_id)
+        if not force and self.manifest(model_id) is not None:
+            return False
+        staging = f"{directory}.partial-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            write(staging)
+            files = {}
+            for folder, _, names in os.walk(staging):
+                for name in names:
+                    path = os.path.join(folder, name)
+                    relpath = os.path.relpath(path, staging).replace(os.sep, "/")
+                    if name.endswith(PICKLE_SUFFIXES):
+                        raise ModelStoreError(
+                            f"{model_id} wrote pickle weights ({relpath}); only safetensors are stored"
+                        )
+                    files[relpath] = {'bytes': os.path.getsize(path), 'sha256': file_sha256(path)}
+            with open(os.path.join(staging, MANIFEST), "w") as handle:
+                json.dump({
+                    'model_id': model_id,
+                    'dtype': dtype_name(dtype),
+                    'created': time.time(),
+                    'files': dict(sorted(files.items())),
+                }, handle, indent=2)
+            self._write_verified(staging, {
+                relpath: self._signature(os.path.join(staging, relpath)) for relpath in files
+            })
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        with self._lock:
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(staging, directory)
+            self._resolved.pop(model_id, None)
+        return True
+
+    def resolve(self, model_id, dtype=None):
+        """Directory to load ``model_id`` from, after checking it against its manifest.
+
+        Raises ModelStoreError if the model was never converted or a file
+        is missing, has the wrong size or does not match its hash.
+        """
+        with self._lock:
+            if model_id in self._resolved:
+                return self._resolved[model_id]
+            manifest = self.manifest(model_id)
+            if manifest is None:
+                raise ModelStoreError(
+                    f"{model_id} is not in the model store at {self.root}; run convert_models.py first"
+                )
+            directory = self.path(model_id)
+            if self.verify_mode != VERIFY_OFF:
+                self._verify(model_id, directory, manifest)
+            stored_dtype = manifest.get('dtype')
+            if dtype is not None and stored_dtype is not None and stored_dtype != dtype_name(dtype):
+                print(f"[model store] {model_id} is stored as {stored_dtype}; loading it as {dtype_name(dtype)} "
+                      "copies the weights instead of mapping them")
+            self._resolved[model_id] = directory
+            return directory
+
+    def _verify(self, model_id, directory, manifest):
+        started = time.perf_counter()
+        verified = self._read_verified(directory)
+        changed = False
+        for relpath, expected in manifest['files'].items():
+            path = os.path.join(directory, relpath)
+            try:
+                signature = self._signature(path)
+            except FileNotFoundError:
+                raise ModelStoreError(f"{model_id}: {relpath} is missing from the model store") from None
+            if signature[0] != expected['bytes']:
+                raise ModelStoreError(f"{model_id}: {relpath} is {signature[0]} bytes, expected {expected['bytes']}")
+            if self.verify_mode == VERIFY_CHANGED and verified.get(relpath) == signature:
+                continue
+            if file_sha256(path) != expected['sha256']:
+                raise ModelStoreError(f"{model_id}: {relpath} does not match its sha256; convert the model again")
+            self.hashed_bytes += signature[0]
+            if verified.get(relpath) != signature:
+                verified[relpath] = signature
+                changed = True
+        if changed:
+            self._write_verified(directory, verified)
+        self.verify_seconds += time.perf_counter() - started
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def _read_verified(directory):
+        try:
+            with open(os.path.join(directory, VERIFIED)) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_verified(directory, verified):
+        path = os.path.join(directory, VERIFIED)
+        try:
+            with open(f"{path}.{os.getpid()}", "w") as handle:
+                json.dump(verified, handle)
+            os.replace(f"{path}.{os.getpid()}", path)
+        except OSError:
+            # A read-only store is hashed again on the next start.
+            pass
+
+    def stats(self):
+        with self._lock:
+            resolved = list(self._resolved)
+        models = {}
+        for model_id in resolved:
+            manifest = self.manifest(model_id) or {'files': {}}
+            models[model_id] = {
+                'path': self.path(model_id),
+                'dtype': manifest.get('dtype'),
+                'files': len(manifest['files']),
+                'bytes': sum(entry['bytes'] for entry in manifest['files'].values()),
+            }
+        return {
+            'root': self.root,
+            'verify': self.verify_mode,
+            'models': models,
+            'hashed_mb': round(self.hashed_bytes / 1024 / 1024, 1),
+            'verify_seconds': round(self.verify_seconds, 2),
+        }
@@ -0,0 +1,122 @@
+"""Named inference profiles and the load-aware policy that picks one per request.
+
+A profile bundles the sampler, step counts, guidance scales, how long
+classifier-free guidance stays on and whether the stage-2 refinement pass
+runs, for both the room-design and layout pipelines. ``ProfilePolicy``
+resolves the profile a request asked for (or the default) and downgrades it
+to a cheaper one while the inference backlog is at or above
+``downgrade_depth``.
+"""
+import threading
+
+SCHEDULER_DEFAULT = "default"
+SCHEDULER_DPMPP = "dpm++"
+SCHEDULER_UNIPC = "unipc"
+SCHEDULERS = (SCHEDULER_DEFAULT, SCHEDULER_DPMPP, SCHEDULER_UNIPC)
+
+
+class InferenceProfile:
+    """Sampler settings for one quality/latency trade-off.
+
+    ``scheduler`` is one of SCHEDULERS; "default" keeps the scheduler the
+    checkpoint ships with. ``cfg_cutoff`` is the fraction of denoising
+    steps that use classifier-free guidance; the rest run the conditional
+    branch alone (1.0 keeps guidance on throughout).
+    """
+
+    def __init__(self, name, scheduler, design_steps, design_guidance, refine,
+                 refine_steps, refine_guidance, layout_steps, layout_guidance, cfg_cutoff=1.0):
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler: {scheduler}")
+        if not 0 < cfg_cutoff <= 1:
+            raise ValueError(f"cfg_cutoff must be in (0, 1], got {cfg_cutoff}")
+        self.name = name
+        self.scheduler = scheduler
+        self.design_steps = design_steps
+        self.design_guidance = design_guidance
+        self.refine = refine
+        self.refine_steps = refine_steps
+        self.refine_guidance = refine_guidance
+        self.layout_steps = layout_steps
+        self.layout_guidance = layout_guidance
+        self.cfg_cutoff = cfg_cutoff
+
+    def design_key(self):
+        """Everything that changes a room-design result, for cache keys."""
+        return (self.scheduler, self.design_steps, self.design_guidance,
+                self.refine, self.refine_steps, self.refine_guidance, self.cfg_cutoff)
+
+    def layout_key(self):
+        return (self.scheduler, self.layout_steps, self.layout_guidance, self.cfg_cutoff)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'scheduler': self.scheduler,
+            'design_steps': self.design_steps,
+            'design_guidance': self.design_guidance,
+            'refine': self.refine,
+            'refine_steps': self.refine_steps,
+            'refine_guidance': self.refine_guidance,
+            'layout_steps': self.layout_steps,
+            'layout_guidance': self.layout_guidance,
+            'cfg_cutoff': self.cfg_cutoff,
+        }
+
+
+class ProfilePolicy:
+    """Pick the profile for a request, downgrading under load.
+
+    ``profiles`` are ordered cheapest first. ``load()`` returns the current
+    backlog; once it reaches ``downgrade_depth`` (0 disables) any profile
+    costlier than ``downgrade_to`` is replaced by it.
+    """
+
+    def __init__(self, profiles, default, downgrade_depth=0, downgrade_to=None, load=None):
+        self.profiles = {profile.name: profile for profile in profiles}
+        self._rank = {profile.name: rank for rank, profile in enumerate(profiles)}
+        if default not in self.profiles:
+            raise ValueError(f"Unknown default profile: {default}")
+        self.default = default
+        self.downgrade_depth = downgrade_depth
+        self.downgrade_to = downgrade_to or profiles[0].name
+        self.load = load or (lambda: 0)
+        self.downgrades = 0
+        self._chosen = {name: 0 for name in self.profiles}
+        self._lock = threading.Lock()
+
+    def get(self, name=None):
+        """The named profile (default when None); raises ValueError if unknown."""
+        name = name or self.default
+        if name not in self.profiles:
+            raise ValueError(f"profile must be one of: {', '.join(self.profiles)}")
+        return self.profiles[name]
+
+    def choose(self, requested=None):
+        """Return (profile, downgraded) for a request about to run."""
+        profile = self.get(requested)
+        downgraded = (
+            self.downgrade_depth > 0
+            and self._rank[profile.name] > self._rank[self.downgrade_to]
+            and self.load() >= self.downgrade_depth
+        )
+        if downgraded:
+            profile = self.profiles[self.downgrade_to]
+        with self._lock:
+            self._chosen[profile.name] += 1
+            if downgraded:
+                self.downgrades += 1
+        return profile, downgraded
+
+    def stats(self):
+        with self._lock:
+            chosen = dict(self._chosen)
+            downgrades = self.downgrades
+        return {
+            'default': self.default,
+            'downgrade_depth': self.downgrade_depth,
+            'downgrade_to': self.downgrade_to,
+            'load': self.load(),
+            'chosen': chosen,
+            'downgrades': downgrades,
+        }
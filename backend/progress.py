@@ -0,0 +1,132 @@
+"""Step progress and cheap latent previews for streamed generations.
+
+A ``ProgressStream`` sits between the thread running a generation and the
+HTTP response streaming it. The pipelines report steps through
+``step(stage, step, total, latents)`` (wired to the diffusers
+``callback_on_step_end``); every ``preview_every`` steps the current latents
+are turned into a small RGB preview with a fixed linear projection instead
+of the VAE decoder. ``events()`` yields the queued events as Server-Sent
+Events or NDJSON lines and ends after the final ``result`` or ``error``.
+"""
+import json
+import queue
+import time
+
+import numpy as np
+from PIL import Image
+
+from jobs import CancelToken
+
+FORMAT_SSE = "sse"
+FORMAT_NDJSON = "ndjson"
+STREAM_FORMATS = (FORMAT_SSE, FORMAT_NDJSON)
+
+# Least-squares fit of SD 1.x VAE latents (4 channels) to RGB in [-1, 1].
+SD_LATENT_RGB_FACTORS = np.array([
+    [0.298, 0.207, 0.208],
+    [0.187, 0.286, 0.173],
+    [-0.158, 0.189, 0.264],
+    [-0.184, -0.271, -0.473],
+], dtype=np.float32)
+
+_CLOSE = object()
+
+
+def latents_to_preview(latents, size=None):
+    """Approximate RGB image for one latent of shape (4, h, w) or (1, 4, h, w)."""
+    if hasattr(latents, "detach"):
+        latents = latents.detach().float().cpu().numpy()
+    latents = np.asarray(latents, dtype=np.float32)
+    if latents.ndim == 4:
+        latents = latents[0]
+
+    rgb = np.tensordot(latents, SD_LATENT_RGB_FACTORS, axes=([0], [0]))
+    pixels = np.clip((rgb + 1.0) * 127.5, 0, 255).astype(np.uint8)
+    image = Image.fromarray(pixels, "RGB")
+    if size and max(image.size) != size:
+        scale = size / max(image.size)
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.BILINEAR,
+        )
+    return image
+
+
+def format_event(event, data, stream_format=FORMAT_SSE):
+    if stream_format == FORMAT_NDJSON:
+        return json.dumps({'event': event, **data}) + "\n"
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class ProgressStream:
+    """Events for one streamed request, produced by one generation thread.
+
+    ``encode_preview(image)`` turns a preview image into something JSON-safe
+    (the app uses a small JPEG data URL). ``preview_every=0`` disables
+    previews. Closing the consumer (client disconnect) cancels ``token`` so
+    the producer stops at its next cancellation check.
+    """
+
+    def __init__(self, preview_every=5, preview_size=128, encode_preview=None,
+                 stream_format=FORMAT_SSE, heartbeat_seconds=15.0, token=None):
+        self.preview_every = preview_every
+        self.preview_size = preview_size
+        self.encode_preview = encode_preview
+        self.stream_format = stream_format
+        self.heartbeat_seconds = heartbeat_seconds
+        self.started_at = time.monotonic()
+        self.previews = 0
+        self.token = token or CancelToken()
+        self._events = queue.Queue()
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def cancel(self, reason="disconnect"):
+        self.token.cancel(reason)
+
+    def raise_if_cancelled(self):
+        self.token.raise_if_cancelled()
+
+    def emit(self, event, data):
+        self._events.put((event, data))
+
+    def step(self, stage, step, total, latents=None):
+        """Step callback: queue a progress event, with a preview every ``preview_every`` steps."""
+        data = {
+            'stage': stage,
+            'step': step,
+            'total': total,
+            'elapsed_ms': round((time.monotonic() - self.started_at) * 1000),
+        }
+        if (latents is not None and self.preview_every and self.encode_preview is not None
+                and (step % self.preview_every == 0 or step == total)):
+            data['preview'] = self.encode_preview(latents_to_preview(latents, self.preview_size))
+            self.previews += 1
+        self.emit('progress', data)
+
+    def finish(self, result):
+        self.emit('result', result)
+        self._events.put(_CLOSE)
+
+    def fail(self, error, status=500):
+        self.emit('error', {'error': error, 'status': status})
+        self._events.put(_CLOSE)
+
+    def events(self):
+        """Yield formatted events until the result; a keep-alive is sent while idle."""
+        try:
+            while True:
+                try:
+                    item = self._events.get(timeout=self.heartbeat_seconds)
+                except queue.Empty:
+                    # Writing something is also how a dropped client is noticed.
+                    yield ": keep-alive\n\n" if self.stream_format == FORMAT_SSE else "\n"
+                    continue
+                if item is _CLOSE:
+                    return
+                yield format_event(*item, stream_format=self.stream_format)
+        except GeneratorExit:
+            self.cancel()
+            raise
@@ -0,0 +1,233 @@
+"""Component-level device residency for several diffusion pipelines.
+
+Pipelines register their large modules (UNet, VAE, text encoder,
+ControlNet). Modules with identical weights are shared between pipelines,
+and activating a pipeline moves only its missing modules onto the device,
+evicting least-recently-used modules of other pipelines when the memory
+budget would be exceeded.
+"""
+from contextlib import contextmanager
+import hashlib
+import itertools
+import threading
+import time
+
+
+def module_nbytes(module):
+    tensors = itertools.chain(module.parameters(), module.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def module_fingerprint(module):
+    """Hash of a module's state dict (names, shapes, dtypes and values)."""
+    digest = hashlib.sha1()
+    for name, tensor in module.state_dict().items():
+        tensor = tensor.detach().cpu().contiguous()
+        digest.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+        try:
+            digest.update(tensor.numpy().tobytes())
+        except TypeError:
+            # bfloat16 and friends have no numpy equivalent.
+            digest.update(tensor.float().numpy().tobytes())
+    return digest.hexdigest()
+
+
+class _Component:
+    def __init__(self, component_id, role, module, size):
+        self.id = component_id
+        self.role = role
+        self.module = module
+        self.size = size
+        self.owners = set()
+        self.resident = False
+        self.last_used = 0.0
+        self._fingerprint = None
+
+    def fingerprint(self, fingerprint_fn):
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint_fn(self.module)
+        return self._fingerprint
+
+
+class ResidencyManager:
+    """Keeps the components of the active pipeline on ``device``.
+
+    ``budget_bytes`` of None means no limit. ``sizeof`` and ``fingerprint``
+    can be swapped out for modules that are not torch modules.
+    """
+
+    def __init__(self, device, budget_bytes=None, offload_device="cpu",
+                 sizeof=module_nbytes, fingerprint=module_fingerprint,
+                 share_components=True, after_evict=None):
+        self.device = device
+        self.budget_bytes = budget_bytes
+        self.offload_device = offload_device
+        self.sizeof = sizeof
+        self.fingerprint = fingerprint
+        self.share_components = share_components
+        self.after_evict = after_evict
+        self.loads = 0
+        self.evictions = 0
+        self.shared = 0
+        self._components = {}
+        self._pipelines = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def register_pipeline(self, name, modules):
+        """Track ``modules`` (role -> module) for pipeline ``name``.
+
+        Returns role -> module, where a module may be replaced by an
+        identical one already registered for another pipeline.
+        """
+        with self._lock:
+            resolved = {}
+            component_ids = {}
+            for role, module in modules.items():
+                component = self._find_identical(role, module)
+                if component is None:
+                    component = _Component(next(self._ids), role, module, self.sizeof(module))
+                    self._components[component.id] = component
+                else:
+                    self.shared += 1
+                component.owners.add(name)
+                component_ids[role] = component.id
+                resolved[role] = component.module
+            self._pipelines[name] = component_ids
+            return resolved
+
+    def activate(self, name):
+        """Make every component of pipeline ``name`` resident on the device."""
+        with self._lock:
+            needed = [self._components[cid] for cid in self._pipelines.get(name, {}).values()]
+            needed_ids = {component.id for component in needed}
+            missing = [component for component in needed if not component.resident]
+
+            evicted = False
+            if missing and self.budget_bytes is not None:
+                incoming = sum(component.size for component in missing)
+                candidates = sorted(
+                    (c for c in self._components.values() if c.resident and c.id not in needed_ids),
+                    key=lambda c: c.last_used,
+                )
+                for component in candidates:
+                    if self.resident_bytes() + incoming <= self.budget_bytes:
+                        break
+                    component.module.to(self.offload_device)
+                    component.resident = False
+                    self.evictions += 1
+                    evicted = True
+
+            if evicted and self.after_evict is not None:
+                self.after_evict()
+
+            for component in missing:
+                component.module.to(self.device)
+                component.resident = True
+                self.loads += 1
+
+            now = time.monotonic()
+            for component in needed:
+                component.last_used = now
+
+    def resident_bytes(self):
+        return sum(c.size for c in self._components.values() if c.resident)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'device': self.device,
+                'budget_bytes': self.budget_bytes,
+                'resident_bytes': self.resident_bytes(),
+                'loads': self.loads,
+                'evictions': self.evictions,
+                'shared_components': self.shared,
+                'components': [
+                    {
+                        'role': c.role,
+                        'owners': sorted(c.owners),
+                        'bytes': c.size,
+                        'resident': c.resident,
+                    }
+                    for c in self._components.values()
+                ],
+            }
+
+    def _find_identical(self, role, module):
+        if not self.share_components:
+            return None
+        size = None
+        for component in self._components.values():
+            if component.role != role:
+                continue
+            if component.module is module:
+                return component
+            # Only hash weights when sizes already match.
+            if size is None:
+                size = self.sizeof(module)
+            if component.size != size:
+                continue
+            if component.fingerprint(self.fingerprint) == self.fingerprint(module):
+                return component
+        return None
+
+
+class PipelineGate:
+    """Exclusive inference access that groups waiters by pipeline.
+
+    When the gate frees up, the oldest waiter for the pipeline that just ran
+    goes next, so alternating traffic does not swap weights on every call.
+    After ``max_consecutive`` turns in a row the oldest waiter overall wins,
+    which bounds how long the other pipeline can be starved.
+    """
+
+    def __init__(self, max_consecutive=4):
+        self.max_consecutive = max(1, max_consecutive)
+        self.reordered = 0
+        self._cond = threading.Condition()
+        self._busy = False
+        self._waiters = []
+        self._current = None
+        self._streak = 0
+        self._seq = itertools.count()
+
+    @contextmanager
+    def hold(self, pipeline_name):
+        ticket = (next(self._seq), pipeline_name)
+        with self._cond:
+            self._waiters.append(ticket)
+            while self._busy or self._choose() is not ticket:
+                self._cond.wait()
+            if ticket is not self._waiters[0]:
+                self.reordered += 1
+            self._waiters.remove(ticket)
+            self._busy = True
+            if pipeline_name == self._current:
+                self._streak += 1
+            else:
+                self._current = pipeline_name
+                self._streak = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'busy': self._busy,
+                'waiting': len(self._waiters),
+                'current_pipeline': self._current,
+                'reordered': self.reordered,
+            }
+
+    def _choose(self):
+        if not self._waiters:
+            return None
+        if self._streak < self.max_consecutive:
+            for ticket in self._waiters:
+                if ticket[1] == self._current:
+                    return ticket
+        return self._waiters[0]
@@ -0,0 +1,149 @@
+"""Aspect-preserving resolution buckets and the load-aware policy that picks a tier.
+
+A tier ("draft", "standard", "large") is an area budget of side x side
+pixels. Its buckets are the width x height pairs, both multiples of 64,
+that fill the budget as closely as the multiples allow. An image goes to
+the bucket whose aspect ratio is closest to its own (clamped to
+MAX_ASPECT), so rooms keep their shape instead of being squashed square,
+and requests in the same bucket can share a pipeline batch and cache
+entries. ``ResolutionPolicy`` resolves the tier a request asked for, caps
+it at ``max_tier`` (and at ``load_max_tier`` while the inference backlog
+is at or above ``load_depth``) and records latency and peak memory per
+bucket.
+"""
+import math
+import threading
+
+from metrics import Histogram
+
+BUCKET_MULTIPLE = 64
+# Wider rooms are squashed to this aspect ratio; SD 1.5 composes poorly beyond it.
+MAX_ASPECT = 2.0
+LATENCY_MS_BOUNDS = [250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000]
+
+
+def tier_buckets(side, multiple=BUCKET_MULTIPLE):
+    """Every (width, height) in multiples of ``multiple`` with width * height <= side²
+    that cannot grow in either dimension without going over."""
+    area = side * side
+    buckets = []
+    for width in range(multiple, area // multiple + 1, multiple):
+        height = area // width // multiple * multiple
+        if height < multiple:
+            break
+        if (width + multiple) * height > area:
+            buckets.append((width, height))
+    return buckets
+
+
+def nearest_bucket(buckets, width, height, max_aspect=MAX_ASPECT):
+    """The bucket closest in aspect ratio to width x height (larger area on ties)."""
+    aspect = min(max(width / height, 1 / max_aspect), max_aspect)
+    target = math.log(aspect)
+    return min(buckets, key=lambda bucket: (abs(math.log(bucket[0] / bucket[1]) - target), -bucket[0] * bucket[1]))
+
+
+def bucket_label(size):
+    return f"{size[0]}x{size[1]}"
+
+
+class ResolutionPolicy:
+    """Pick the resolution tier for a request and map images to its buckets.
+
+    ``tiers`` maps tier names to their side length, smallest first.
+    Requests above ``max_tier`` are capped to it; while ``load()`` is at or
+    above ``load_depth`` (0 disables) they are capped to ``load_max_tier``.
+    ``upscale_to`` is the tier a low-resolution result is upscaled to when
+    the request asks for it.
+    """
+
+    def __init__(self, tiers, default, max_tier=None, load_max_tier=None, load_depth=0, load=None,
+                 upscale_to=None):
+        self.tiers = dict(tiers)
+        self._rank = {name: rank for rank, name in enumerate(self.tiers)}
+        for name in (default, max_tier, load_max_tier, upscale_to):
+            if name is not None and name not in self.tiers:
+                raise ValueError(f"Unknown resolution tier: {name}")
+        self.default = default
+        self.max_tier = max_tier or list(self.tiers)[-1]
+        self.load_max_tier = load_max_tier or self.max_tier
+        self.load_depth = load_depth
+        self.load = load or (lambda: 0)
+        self.upscale_to = upscale_to or default
+        self._buckets = {name: tier_buckets(side) for name, side in self.tiers.items()}
+        self._chosen = {name: 0 for name in self.tiers}
+        self.capped = 0
+        self._bucket_stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, name=None):
+        """The tier name (default when None); raises ValueError if unknown."""
+        name = name or self.default
+        if name not in self.tiers:
+            raise ValueError(f"resolution must be one of: {', '.join(self.tiers)}")
+        return name
+
+    def cap(self):
+        """The largest tier allowed right now."""
+        if self.load_depth > 0 and self.load() >= self.load_depth:
+            return min(self.max_tier, self.load_max_tier, key=self._rank.get)
+        return self.max_tier
+
+    def choose(self, requested=None):
+        """Return (tier, capped) for a request about to run."""
+        tier = self.get(requested)
+        cap = self.cap()
+        capped = self._rank[tier] > self._rank[cap]
+        if capped:
+            tier = cap
+        with self._lock:
+            self._chosen[tier] += 1
+            if capped:
+                self.capped += 1
+        return tier, capped
+
+    def bucket(self, tier, width, height):
+        """(width, height) of the ``tier`` bucket for an image of width x height."""
+        return nearest_bucket(self._buckets[self.get(tier)], width, height)
+
+    def upscale_size(self, tier, size):
+        """Bucket of the upscale tier with the aspect of ``size``, or None if it is not larger."""
+        target = min(self.upscale_to, self.cap(), key=self._rank.get)
+        if self._rank[target] <= self._rank[self.get(tier)]:
+            return None
+        return self.bucket(target, *size)
+
+    def observe(self, pipeline, label, seconds, peak_bytes=None):
+        """Record one generation of ``pipeline`` in the ``label`` bucket."""
+        with self._lock:
+            stats = self._bucket_stats.setdefault((pipeline, label), {
+                'count': 0, 'latency_ms': Histogram(LATENCY_MS_BOUNDS), 'peak_memory_bytes': None,
+            })
+            stats['count'] += 1
+            if peak_bytes is not None:
+                stats['peak_memory_bytes'] = max(stats['peak_memory_bytes'] or 0, peak_bytes)
+        stats['latency_ms'].observe(seconds * 1000)
+
+    def stats(self):
+        with self._lock:
+            chosen = dict(self._chosen)
+            capped = self.capped
+            buckets = {}
+            for (pipeline, label), stats in sorted(self._bucket_stats.items()):
+                peak = stats['peak_memory_bytes']
+                buckets.setdefault(pipeline, {})[label] = {
+                    'count': stats['count'],
+                    'latency_ms': stats['latency_ms'].snapshot(),
+                    'peak_memory_mb': round(peak / 1024 / 1024, 1) if peak is not None else None,
+                }
+        return {
+            'tiers': self.tiers,
+            'default': self.default,
+            'max_tier': self.max_tier,
+            'load_max_tier': self.load_max_tier,
+            'load_depth': self.load_depth,
+            'current_cap': self.cap(),
+            'chosen': chosen,
+            'capped': capped,
+            'buckets': buckets,
+        }
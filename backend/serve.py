@@ -0,0 +1,50 @@
+"""Production entry point: serves the API with waitress instead of the Flask dev server.
+
+    python serve.py --host 0.0.0.0 --port 5000 --threads 24
+
+``create_app()`` returns the WSGI app for other servers, e.g.
+``gunicorn --workers 1 --threads 24 'serve:create_app()'``. Keep to one
+server process: every process would load its own models. Scale inference
+with INFERENCE_WORKERS instead.
+"""
+import argparse
+import os
+
+from waitress import serve
+
+SERVE_HOST = os.environ.get("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.environ.get("SERVE_PORT", 5000))
+# Request threads; keep them above the sum of ENDPOINT_CONCURRENCY caps so
+# health and pricing requests always find a free thread.
+SERVE_THREADS = int(os.environ.get("SERVE_THREADS", 24))
+
+
+def create_app():
+    """Import the API (which starts model warm-up and any inference workers) and return it."""
+    import app as backend
+    backend.apply_cpu_threads()
+    return backend.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS)
+    args = parser.parse_args()
+
+    application = create_app()
+    from app import ENDPOINT_CONCURRENCY, SERVE_CPU_THREADS, print_startup_banner
+
+    print_startup_banner()
+    capped = sum(limit for limit in ENDPOINT_CONCURRENCY.values() if limit > 0)
+    if capped >= args.threads:
+        print(f"WARNING: endpoint caps add up to {capped} requests but only {args.threads} threads serve them; "
+              "uncapped endpoints may wait for a thread")
+    print(f"Serving on http://{args.host}:{args.port} with {args.threads} threads "
+          f"and {SERVE_CPU_THREADS} CPU pool threads")
+    serve(application, host=args.host, port=args.port, threads=args.threads, ident="homelytics")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Request-side concurrency controls for the API server.
+
+``CpuPool`` runs CPU-bound pre- and post-processing (upload decoding,
+image encoding) on a fixed set of threads, so a burst of uploads cannot
+occupy every core while health checks and pricing wait for the GIL.
+``EndpointLimits`` caps how many requests of each endpoint run at once, so
+long generations cannot take every server thread from the cheap endpoints.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from metrics import Histogram
+
+CPU_WAIT_MS_BOUNDS = [1, 5, 10, 25, 50, 100, 250, 1000]
+CPU_THREAD_PREFIX = "cpu-pool"
+
+
+class CpuPool:
+    """Bounded thread pool for CPU-bound helpers; ``run()`` blocks for the result.
+
+    ``workers=0`` runs everything inline in the calling thread.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.calls = 0
+        self.wait_ms = Histogram(CPU_WAIT_MS_BOUNDS)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix=CPU_THREAD_PREFIX) if workers > 0 else None
+        self._lock = threading.Lock()
+
+    def run(self, fn, *args, **kwargs):
+        # Nested calls from a pool thread run inline instead of deadlocking the pool.
+        if self._executor is None or threading.current_thread().name.startswith(CPU_THREAD_PREFIX):
+            return fn(*args, **kwargs)
+        submitted = time.monotonic()
+
+        def call():
+            self.wait_ms.observe((time.monotonic() - submitted) * 1000)
+            return fn(*args, **kwargs)
+
+        with self._lock:
+            self.calls += 1
+        return self._executor.submit(call).result()
+
+    def stats(self):
+        with self._lock:
+            calls = self.calls
+        return {'workers': self.workers, 'calls': calls, 'wait_ms': self.wait_ms.snapshot()}
+
+
+class _Slot:
+    def __init__(self, release):
+        self._release = release
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._release()
+
+
+class EndpointLimits:
+    """Per-endpoint concurrency caps.
+
+    ``limits`` maps an endpoint name to its maximum number of requests in
+    flight; endpoints not listed are unlimited. A request over the limit
+    waits up to ``wait_seconds`` for a slot before being turned away.
+    """
+
+    def __init__(self, limits, wait_seconds=0.0):
+        self.limits = dict(limits)
+        self.wait_seconds = wait_seconds
+        self._semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in self.limits.items()}
+        self._in_flight = {name: 0 for name in self.limits}
+        self._peak = {name: 0 for name in self.limits}
+        self._rejected = {name: 0 for name in self.limits}
+        self._lock = threading.Lock()
+
+    def try_acquire(self, endpoint):
+        """A slot to ``release()`` when the response is done, or None if the endpoint is full."""
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            return _Slot(lambda: None)
+        if self.wait_seconds > 0:
+            acquired = semaphore.acquire(timeout=self.wait_seconds)
+        else:
+            acquired = semaphore.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self._rejected[endpoint] += 1
+            return None
+        with self._lock:
+            self._in_flight[endpoint] += 1
+            self._peak[endpoint] = max(self._peak[endpoint], self._in_flight[endpoint])
+
+        def release():
+            with self._lock:
+                self._in_flight[endpoint] -= 1
+            semaphore.release()
+
+        return _Slot(release)
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'limit': limit,
+                    'in_flight': self._in_flight[name],
+                    'peak': self._peak[name],
+                    'rejected': self._rejected[name],
+                }
+                for name, limit in self.limits.items()
+            }
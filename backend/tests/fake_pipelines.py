@@ -0,0 +1,51 @@
+"""Fake design pipeline for tests that run /api/generate without models."""
+import io
+import time
+
+import numpy as np
+from PIL import Image
+import torch
+
+STEP_SECONDS = 0.02
+
+
+class FakeDesignPipeline:
+    """Stands in for the ControlNet and img2img pipelines: sleeps per step and calls the step callback."""
+
+    _execution_device = "cpu"
+    scheduler = None
+
+    def __init__(self):
+        self.steps = 0
+        self.num_timesteps = 0
+
+    @classmethod
+    def install(cls, app_module, monkeypatch):
+        """Serve design and refine passes from one fake, with a grayscale stand-in for MiDaS."""
+        pipeline = cls()
+        monkeypatch.setattr(app_module, "design_pipe", pipeline)
+        monkeypatch.setattr(app_module, "refine_pipe", pipeline)
+        monkeypatch.setattr(app_module, "depth_estimator", lambda image: image.convert("L").convert("RGB"))
+        monkeypatch.setattr(app_module, "design_models_ready", lambda: True)
+        return pipeline
+
+    def encode_prompt(self, text, device, count, do_cfg):
+        return torch.zeros(1, 77, 768), None
+
+    def __call__(self, image, num_inference_steps, strength, callback_on_step_end=None, **kwargs):
+        self.num_timesteps = max(1, int(num_inference_steps * strength))
+        width, height = image[0].size
+        latents = np.zeros((len(image), 4, height // 8, width // 8), dtype=np.float32)
+        for step in range(self.num_timesteps):
+            time.sleep(STEP_SECONDS)
+            self.steps += 1
+            if callback_on_step_end is not None:
+                callback_on_step_end(self, step, step, {'latents': latents})
+        return type("Output", (), {'images': list(image)})()
+
+
+def room_form(**fields):
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), (180, 170, 150)).save(buffer, format="PNG")
+    buffer.seek(0)
+    return {'image': (buffer, 'room.png'), 'prompt': 'sofa, rug', **fields}
@@ -0,0 +1,24 @@
+"""Stub INFERENCE_WORKER_INIT for the worker pool tests: no models, just sleeps."""
+import os
+import time
+
+
+def init(pipelines, threads):
+    if "broken" in pipelines:
+        raise OSError("weights not found")
+
+    def pid(payload, progress, cancel_check):
+        return os.getpid()
+
+    def steps(payload, progress, cancel_check):
+        for step in range(payload['steps']):
+            cancel_check()
+            time.sleep(payload.get('step_seconds', 0.05))
+            if progress is not None:
+                progress(step + 1, payload['steps'])
+        return os.getpid()
+
+    def crash(payload, progress, cancel_check):
+        os._exit(3)
+
+    return {'pid': pid, 'steps': steps, 'crash': crash}
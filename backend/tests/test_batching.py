@@ -0,0 +1,132 @@
+import threading
+import time
+
+import numpy as np
+
+from batching import BatchScheduler
+
+
+class FakePipeline:
+    """Stacks each batch like the design pipeline does and records its shape."""
+
+    def __init__(self):
+        self.shapes = []
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, key, items):
+        self.calls += 1
+        self.release.wait(5)
+        batch = np.stack(items)
+        assert batch.shape[1:3] == key
+        self.shapes.append(batch.shape)
+        return list(batch + 1)
+
+
+def image(size, value):
+    return np.full((*size, 3), value, dtype=np.int64)
+
+
+def submit_async(scheduler, size, value, results):
+    def run():
+        results[(size, value)] = scheduler.submit(size, image(size, value))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_groups_compatible_items_and_cuts_at_max_batch_size():
+    pipeline = FakePipeline()
+    scheduler = BatchScheduler(pipeline, window_seconds=0.05, max_batch_size=4)
+    results = {}
+
+    # Hold the dispatcher in a first batch so every later item is queued at once.
+    pipeline.release.clear()
+    threads = [submit_async(scheduler, (8, 8), 0, results)]
+    wait_until(lambda: pipeline.calls == 1)
+    submissions = [((16, 16), value) for value in range(1, 6)] + [((16, 8), value) for value in range(6, 8)]
+    for size, value in submissions:
+        threads.append(submit_async(scheduler, size, value, results))
+        wait_until(lambda: scheduler.queued() == len(threads) - 1)
+    pipeline.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert pipeline.shapes == [(1, 8, 8, 3), (4, 16, 16, 3), (1, 16, 16, 3), (2, 16, 8, 3)]
+    for (size, value), result in results.items():
+        assert result.shape == (*size, 3) and (result == value + 1).all()
+
+    stats = scheduler.stats()
+    assert stats['queued'] == 0
+    assert stats['batch_size']['count'] == 4
+    assert stats['batch_size']['buckets'] == {
+        'le_1': 2, 'le_2': 1, 'le_4': 1, 'le_8': 0, 'le_16': 0, 'le_inf': 0,
+    }
+    assert stats['wait_ms']['count'] == 8
+
+
+def test_waits_up_to_the_window_for_more_items():
+    pipeline = FakePipeline()
+    scheduler = BatchScheduler(pipeline, window_seconds=0.2, max_batch_size=4)
+    results = {}
+
+    started = time.monotonic()
+    threads = [submit_async(scheduler, (8, 8), 0, results)]
+    time.sleep(0.02)
+    threads.append(submit_async(scheduler, (8, 8), 1, results))
+    for thread in threads:
+        thread.join(5)
+    elapsed = time.monotonic() - started
+
+    assert pipeline.shapes == [(2, 8, 8, 3)]
+    assert 0.2 <= elapsed < 1
+    wait_ms = scheduler.stats()['wait_ms']
+    assert wait_ms['count'] == 2
+    # The first item waited the whole window, the second about 20 ms less.
+    assert wait_ms['buckets']['le_250'] == 2
+    assert wait_ms['sum'] >= 2 * 200 - 40
+
+
+def test_single_item_runs_when_the_window_closes():
+    pipeline = FakePipeline()
+    scheduler = BatchScheduler(pipeline, window_seconds=0.05, max_batch_size=4)
+
+    started = time.monotonic()
+    result = scheduler.submit((8, 8), image((8, 8), 3))
+    elapsed = time.monotonic() - started
+
+    assert (result == 4).all()
+    assert pipeline.shapes == [(1, 8, 8, 3)]
+    assert 0.05 <= elapsed < 0.5
+    wait_ms = scheduler.stats()['wait_ms']
+    assert wait_ms['count'] == 1 and 50 <= wait_ms['sum'] < 500
+
+
+def test_runner_errors_reach_every_caller_in_the_batch():
+    def runner(key, items):
+        raise RuntimeError("out of memory")
+
+    scheduler = BatchScheduler(runner, window_seconds=0.01, max_batch_size=2)
+    errors = []
+
+    def run():
+        try:
+            scheduler.submit('key', 'item')
+        except RuntimeError as exc:
+            errors.append(str(exc))
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ["out of memory"] * 2
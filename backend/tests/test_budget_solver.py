@@ -0,0 +1,121 @@
+import random
+
+import pytest
+
+from budget_solver import BudgetSolver
+
+BUDGETS = [random.Random(1).randint(1_000, 400_000) for _ in range(150)]
+
+
+def synthetic_solver(seed, top_k=3):
+    rng = random.Random(seed)
+    catalog = {}
+    for index in range(14):
+        base = rng.randint(500, 60_000)
+        catalog[f"item_{index}"] = sorted(
+            ({'name': f"item_{index} #{sku}", 'price': int(base * rng.uniform(0.6, 2.5))}
+             for sku in range(rng.randint(1, 4))),
+            key=lambda sku: sku['price'],
+        )
+    rooms = {f"room_{room}": rng.sample(sorted(catalog), k=9) for room in range(3)}
+    quantity_limits = {key: rng.choice((1, 1, 2, 3)) for key in catalog}
+    solver = BudgetSolver(lambda key: catalog.get(key, []), lambda room: rooms.get(room, []),
+                          quantity_limits=quantity_limits, max_budget=400_000, top_k=top_k)
+    return solver, sorted(rooms)
+
+
+@pytest.fixture(params=["synthetic-0", "synthetic-1", "builtin"])
+def solver_rooms(request):
+    if request.param == "builtin":
+        app = request.getfixturevalue("app_module")
+        return app.budget_solver, app.catalog.room_types()
+    return synthetic_solver(int(request.param.split("-")[1]))
+
+
+@pytest.fixture
+def solver(solver_rooms):
+    return solver_rooms[0]
+
+
+@pytest.fixture
+def cases(solver_rooms):
+    rng = random.Random(2)
+    return [(rng.choice(solver_rooms[1]), budget) for budget in BUDGETS]
+
+
+def greedy(solver, room_type, budget):
+    """The pre-solver walk: take each priority item once if it still fits."""
+    remaining = budget
+    chosen = {}
+    for key in solver.room_items(room_type):
+        skus = solver.skus(key)
+        if skus and skus[0]['price'] <= remaining:
+            chosen[key] = 1
+            remaining -= skus[0]['price']
+    return chosen
+
+
+def value_of(solver, room_type, quantities):
+    groups = {group.key: group for group in solver._groups(room_type, frozenset())}
+    return sum(groups[key].options[quantity - 1][1] for key, quantity in quantities.items())
+
+
+def test_bundles_stay_within_budget(solver, cases):
+    for room_type, budget in cases:
+        bundles = solver.solve(room_type, budget)
+        assert bundles, (room_type, budget)
+        for bundle in bundles:
+            assert bundle['cost'] <= budget
+            assert bundle['cost'] == sum(item['sku']['price'] * item['quantity'] for item in bundle['items'])
+
+
+def test_alternatives_are_distinct_and_ordered(solver, cases):
+    for room_type, budget in cases:
+        bundles = solver.solve(room_type, budget)
+        values = [bundle['value'] for bundle in bundles]
+        assert values == sorted(values, reverse=True)
+        signatures = {tuple((item['key'], item['quantity']) for item in bundle['items']) for bundle in bundles}
+        assert len(signatures) == len(bundles)
+
+
+def test_must_have_items_are_kept(solver, cases):
+    rng = random.Random(3)
+    for room_type, budget in cases:
+        must_have = rng.sample(solver.room_items(room_type), k=2)
+        bundles = solver.solve(room_type, budget, must_have=must_have)
+        floor = sum(solver.skus(key)[0]['price'] for key in must_have)
+        if floor + len(must_have) * solver.price_unit <= budget:
+            assert bundles, (room_type, budget, must_have)
+        if floor > budget:
+            assert bundles == []
+        for bundle in bundles:
+            assert set(must_have) <= {item['key'] for item in bundle['items']}
+            assert bundle['cost'] <= budget
+
+
+def test_scores_at_least_as_well_as_greedy(solver, cases):
+    for room_type, budget in cases:
+        best = solver.solve(room_type, budget)[0]
+        quantities = {item['key']: item['quantity'] for item in best['items']}
+        assert best['value'] == value_of(solver, room_type, quantities)
+        assert best['value'] >= value_of(solver, room_type, greedy(solver, room_type, budget))
+
+
+def test_unknown_must_have_is_rejected():
+    with pytest.raises(ValueError, match="Unknown furniture items: nope"):
+        synthetic_solver(0)[0].solve("room_0", 100_000, must_have=["nope"])
+
+
+def test_more_alternatives_than_int8_can_index():
+    solver, rooms = synthetic_solver(0, top_k=300)
+    bundles = solver.solve(rooms[0], 250_000)
+    assert len(bundles) == 300
+    values = [bundle['value'] for bundle in bundles]
+    assert values == sorted(values, reverse=True)
+    signatures = set()
+    for bundle in bundles:
+        quantities = {item['key']: item['quantity'] for item in bundle['items']}
+        assert bundle['value'] == value_of(solver, rooms[0], quantities)
+        assert bundle['cost'] <= 250_000
+        signatures.add(tuple(sorted(quantities.items())))
+    assert len(signatures) == 300
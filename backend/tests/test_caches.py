@@ -0,0 +1,28 @@
+from PIL import Image
+
+from caches import DepthCache
+
+
+def depth_of(image):
+    return image.convert("L")
+
+
+def test_disk_entries_are_reused_only_by_the_same_depth_model(tmp_path):
+    room = Image.new("RGB", (32, 32), (120, 80, 40))
+    DepthCache(1024 * 1024, disk_dir=str(tmp_path), model_id="midas/a").get_or_compute(room, depth_of)
+
+    same = DepthCache(1024 * 1024, disk_dir=str(tmp_path), model_id="midas/a")
+    same.get_or_compute(room, depth_of)
+    assert (same.disk_hits, same.misses) == (1, 0)
+
+    other = DepthCache(1024 * 1024, disk_dir=str(tmp_path), model_id="midas/b")
+    other.get_or_compute(room, depth_of)
+    assert (other.disk_hits, other.misses) == (0, 1)
+
+
+def test_disk_tier_is_pruned_to_its_budget(tmp_path):
+    cache = DepthCache(1024 * 1024, disk_dir=str(tmp_path), disk_max_bytes=1, model_id="midas/a")
+    for shade in range(3):
+        cache.get_or_compute(Image.new("RGB", (32, 32), (shade, 0, 0)), depth_of)
+    assert cache.stats()['disk']['files'] == 0
+    assert cache.stats()['disk']['max_bytes'] == 1
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from PIL import Image
+import pytest
+import torch
+
+from fake_pipelines import STEP_SECONDS, FakeDesignPipeline, room_form
+from jobs import JOB_CANCELLED, CancelToken, JobCancelled
+
+
+@pytest.fixture
+def fake(app_module, monkeypatch):
+    return FakeDesignPipeline.install(app_module, monkeypatch)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.002)
+
+
+def cancel_after_steps(fake, steps, cancel, finished):
+    """Cancel once ``steps`` denoising steps ran; returns the steps run after the cancel."""
+    wait_for(lambda: fake.steps >= steps)
+    steps_at_cancel = fake.steps
+    cancel()
+    assert finished.wait(10)
+    # Anything still running would keep stepping.
+    time.sleep(STEP_SECONDS * 5)
+    return fake.steps - steps_at_cancel
+
+
+def test_step_callback_stops_within_one_step(app_module, fake):
+    token = CancelToken()
+    item = {
+        'image': Image.new("RGB", (64, 64)),
+        'control_image': Image.new("RGB", (64, 64)),
+        'prompt': 'sofa',
+        'negative_prompt': '',
+        'seed': 1,
+        'progress': None,
+        'cancel_check': token.raise_if_cancelled,
+    }
+    batch_key = (0.75, 40, 7.5, 0.8, (64, 64), app_module.SCHEDULER_DEFAULT, 1.0)
+    errors = []
+    finished = threading.Event()
+
+    def run():
+        try:
+            app_module.run_design_batch(batch_key, [item])
+        except JobCancelled as exc:
+            errors.append(exc)
+        finally:
+            finished.set()
+
+    threading.Thread(target=run).start()
+    extra = cancel_after_steps(fake, 3, lambda: token.cancel("test"), finished)
+    assert extra <= 1
+    assert len(errors) == 1
+    assert fake.steps < fake.num_timesteps
+    assert app_module.inference_gate.stats()['busy'] is False
+
+
+def test_batch_keeps_running_while_one_request_still_wants_it(app_module):
+    tokens = [CancelToken(), CancelToken()]
+    callback = app_module.design_step_callback(
+        [{'cancel_check': token.raise_if_cancelled} for token in tokens]
+    )
+    pipeline = type("Pipeline", (), {'num_timesteps': 10})()
+    latents = torch.zeros(2, 4, 8, 8)
+    tokens[0].cancel("test")
+    callback(pipeline, 0, 0, {'latents': latents})
+    tokens[1].cancel("test")
+    with pytest.raises(JobCancelled):
+        callback(pipeline, 1, 1, {'latents': latents})
+
+
+def test_explicit_cancel_ends_the_request_with_409(app_module, client, fake):
+    result = {}
+    finished = threading.Event()
+
+    def run():
+        response = app_module.app.test_client().post(
+            '/api/generate', data=room_form(request_id='test-cancel'), content_type='multipart/form-data',
+        )
+        result['status'] = response.status_code
+        finished.set()
+
+    threading.Thread(target=run).start()
+    extra = cancel_after_steps(
+        fake, 3, lambda: client.post('/api/generate/test-cancel/cancel'), finished,
+    )
+    assert extra <= 1
+    assert result['status'] == 409
+
+
+def test_cancelled_job_ends_cancelled_not_failed(app_module, client, fake):
+    response = client.post('/api/jobs/generate', data=room_form(), content_type='multipart/form-data')
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['id']
+    job = app_module.job_queue.get(job_id)
+    finished = threading.Event()
+
+    def watch():
+        wait_for(lambda: job.finished_at is not None)
+        finished.set()
+
+    threading.Thread(target=watch).start()
+    extra = cancel_after_steps(fake, 3, lambda: client.post(f'/api/jobs/{job_id}/cancel'), finished)
+    assert extra <= 1
+    assert job.status == JOB_CANCELLED
+    assert job.error is None
+    assert client.get(f'/api/jobs/{job_id}/result').status_code == 409
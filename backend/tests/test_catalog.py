@@ -0,0 +1,30 @@
+from catalog import CatalogStore
+
+DATA = {
+    'items': {
+        'sofa': {'name': 'Sofa', 'price': 30000, 'synonyms': ['couch']},
+        'rug': {'name': 'Rug', 'price': 4000},
+    },
+    'rooms': {'living_room': ['sofa', 'rug']},
+}
+
+
+def test_room_lists_are_bounded_by_cache_entries(tmp_path):
+    catalog = CatalogStore(str(tmp_path / "catalog.db"), cache_entries=4)
+    catalog.import_data(DATA)
+    for index in range(50):
+        assert catalog.room_items(f"unknown_{index}") == []
+    assert catalog.room_items('living_room') == ['sofa', 'rug']
+    assert catalog.stats()['cached_rooms'] == 4
+
+
+def test_reload_refreshes_changed_rooms(tmp_path):
+    catalog = CatalogStore(str(tmp_path / "catalog.db"))
+    catalog.import_data(DATA)
+    catalog.reload()
+    assert catalog.room_items('living_room') == ['sofa', 'rug']
+
+    catalog.import_data({'items': {'rug': {'deleted': True}}})
+    changes = catalog.reload()
+    assert changes.removed == {'rug'} and changes.rooms == {'living_room'}
+    assert catalog.room_items('living_room') == ['sofa']
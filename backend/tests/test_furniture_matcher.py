@@ -0,0 +1,35 @@
+from furniture_matcher import FurnitureMatcher
+
+
+def keys(matcher, text):
+    return matcher.detect(text)[0]
+
+
+def test_longest_match_wins():
+    matcher = FurnitureMatcher({'table': ['table'], 'coffee_table': ['coffee table']})
+    assert [match.phrase for match in matcher.find("a coffee table and a table")] == ["coffee table", "table"]
+
+
+def test_removing_one_owner_keeps_a_shared_phrase():
+    matcher = FurnitureMatcher({'sofa': ['sofa', 'couch'], 'sectional': ['sectional', 'couch']})
+    assert matcher.phrase_count == 3
+    assert keys(matcher, "big couch") == ['sectional']
+
+    matcher.remove('sectional')
+    assert keys(matcher, "big couch") == ['sofa']
+    assert keys(matcher, "a sectional") == []
+    assert matcher.phrase_count == 2
+
+    matcher.remove('sofa')
+    assert keys(matcher, "big couch") == []
+    assert matcher.phrase_count == 0
+    assert matcher._root == {}
+
+
+def test_removing_the_older_owner_keeps_the_newer_match():
+    matcher = FurnitureMatcher({'sofa': ['couch'], 'sectional': ['couch']})
+    matcher.remove('sofa')
+    assert keys(matcher, "couch") == ['sectional']
+    matcher.add('sofa', ['couch'])
+    assert keys(matcher, "couch") == ['sofa']
+    assert matcher.phrase_count == 1
@@ -0,0 +1,80 @@
+import json
+import time
+
+import pytest
+
+from fake_pipelines import FakeDesignPipeline, room_form
+
+PREVIEW_EVERY = 3
+
+
+@pytest.fixture
+def fake(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "GENERATE_PREVIEW_EVERY", PREVIEW_EVERY)
+    return FakeDesignPipeline.install(app_module, monkeypatch)
+
+
+def post_stream(client, stream_format, **fields):
+    return client.post('/api/generate', data=room_form(stream=stream_format, **fields),
+                       content_type='multipart/form-data', buffered=False)
+
+
+def parse_events(chunks, stream_format):
+    """(event, data) pairs from streamed chunks, in order."""
+    text = "".join(chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in chunks)
+    if stream_format == "ndjson":
+        events = [json.loads(line) for line in text.splitlines() if line.strip()]
+        return [(event.pop('event'), event) for event in events]
+    pairs = []
+    for block in text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if 'event' in fields:
+            pairs.append((fields['event'], json.loads(fields['data'])))
+    return pairs
+
+
+@pytest.mark.parametrize("stream_format, mimetype", [
+    ("sse", "text/event-stream"),
+    ("ndjson", "application/x-ndjson"),
+])
+def test_stream_reports_steps_in_order_with_previews_and_ends_with_result(client, fake, stream_format, mimetype):
+    response = post_stream(client, stream_format)
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    events = parse_events(response.response, stream_format)
+
+    assert events[0][0] == "start" and events[0][1]['preview_every'] == PREVIEW_EVERY
+    assert events[-1][0] == "result"
+    assert events[-1][1]['image_url']
+    progress = [data for event, data in events if event == "progress"]
+    assert progress and [event for event, _ in events[1:-1]] == ["progress"] * len(progress)
+
+    stages = [data['stage'] for data in progress]
+    assert stages == sorted(stages, key=["generate", "refine"].index)
+    for stage in set(stages):
+        steps = [data for data in progress if data['stage'] == stage]
+        assert [data['step'] for data in steps] == list(range(1, steps[0]['total'] + 1))
+        for data in steps:
+            expect_preview = data['step'] % PREVIEW_EVERY == 0 or data['step'] == data['total']
+            assert ('preview' in data) == expect_preview
+            if expect_preview:
+                assert data['preview'].startswith("data:image/jpeg;base64,")
+
+
+def test_client_disconnect_cancels_the_generation(app_module, client, fake):
+    cancelled_before = app_module.cancellations.snapshot().get('disconnect', 0)
+    response = post_stream(client, "ndjson")
+    chunks = iter(response.response)
+    # Read the start event and a few steps, then hang up.
+    for _ in range(3):
+        next(chunks)
+    response.close()
+
+    deadline = time.monotonic() + 10
+    while app_module.cancellations.snapshot().get('disconnect', 0) == cancelled_before:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    steps_at_cancel = fake.steps
+    time.sleep(0.2)
+    assert fake.steps - steps_at_cancel <= 1
+    assert fake.steps < fake.num_timesteps
@@ -0,0 +1,51 @@
+import threading
+
+import pytest
+
+from jobs import JOB_CANCELLED, JOB_SUCCEEDED, JobQueue, QueueFullError
+
+
+def blocked_queue(max_depth):
+    """A queue whose worker is stuck in its first job until ``release`` is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def handler(job):
+        started.set()
+        release.wait(5)
+        return job.payload
+
+    jobs = JobQueue({'work': handler}, max_depth=max_depth)
+    running = jobs.submit('work', 'running')
+    assert started.wait(5)
+    return jobs, running, release
+
+
+def test_cancelled_queued_jobs_free_their_slot():
+    jobs, running, release = blocked_queue(max_depth=2)
+    waiting = [jobs.submit('work', index) for index in range(2)]
+    with pytest.raises(QueueFullError):
+        jobs.submit('work', 'one too many')
+
+    jobs.cancel(waiting[0].id)
+    assert waiting[0].status == JOB_CANCELLED
+    assert jobs.depth() == 1
+    replacement = jobs.submit('work', 'replacement')
+
+    release.set()
+    jobs._queue.join()
+    assert [job.status for job in (running, waiting[1], replacement)] == [JOB_SUCCEEDED] * 3
+    assert waiting[0].status == JOB_CANCELLED
+    assert jobs.depth() == 0
+
+
+def test_cancel_twice_counts_once():
+    jobs, running, release = blocked_queue(max_depth=1)
+    waiting = jobs.submit('work', 'waiting')
+    jobs.cancel(waiting.id)
+    jobs.cancel(waiting.id)
+    assert jobs.depth() == 0
+    jobs.submit('work', 'next')
+    assert jobs.depth() == 1
+    release.set()
+    jobs._queue.join()
+    assert jobs.depth() == 0
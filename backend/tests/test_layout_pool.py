@@ -0,0 +1,92 @@
+import threading
+import time
+
+from PIL import Image
+import pytest
+
+from jobs import JobCancelled
+from layout_pool import LayoutPool
+
+
+def layout_images(count=1):
+    return [Image.new("RGB", (16, 16), "white") for _ in range(count)]
+
+
+def make_pool(directory, generate, **kwargs):
+    return LayoutPool(str(directory), generate, [400, 700, 900], ["2 BHK"], size=1, image_count=1,
+                      warm=[(500, "2 BHK")], idle_poll_seconds=0.01, **kwargs)
+
+
+def test_refill_and_take(tmp_path):
+    pool = make_pool(tmp_path, lambda area, room_count, seed: layout_images())
+    assert pool.refill_once()
+    assert not pool.refill_once()
+    images, _, area = pool.take(520, "2 BHK")
+    assert area == 550 and len(images) == 1
+    assert pool.take(520, "2 BHK") is None
+
+
+def test_yielded_refill_is_counted_and_retried(tmp_path):
+    calls = []
+
+    def generate(area, room_count, seed):
+        calls.append(seed)
+        if len(calls) == 1:
+            raise JobCancelled("yield")
+        return layout_images()
+
+    pool = make_pool(tmp_path, generate)
+    pool.start()
+    deadline = time.monotonic() + 5
+    while pool.stats()['generated'] < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert pool.stats()['yielded'] == 1
+    assert pool.take(520, "2 BHK") is not None
+
+
+def test_layout_step_callback_runs_the_cancel_check(app_module):
+    def cancel_check():
+        raise JobCancelled("stop")
+
+    assert app_module.layout_step_callback(1.0) is None
+    callback = app_module.layout_step_callback(1.0, cancel_check)
+    with pytest.raises(JobCancelled):
+        callback(None, 0, 999, {'latents': None})
+
+
+def test_refill_gives_the_gate_to_a_waiting_request(app_module, tmp_path):
+    gate = app_module.inference_gate
+    steps = []
+
+    def generate(area, room_count, seed):
+        # Stands in for run_layout_pipeline: 30 steps under the gate, checking between steps.
+        with gate.hold("layout"):
+            for step in range(30):
+                app_module.yield_to_requests()
+                steps.append(step)
+                time.sleep(0.05)
+        return layout_images()
+
+    pool = make_pool(tmp_path, generate)
+    outcome = []
+
+    def refill():
+        try:
+            outcome.append(pool.refill_once())
+        except JobCancelled as exc:
+            outcome.append(str(exc))
+
+    thread = threading.Thread(target=refill)
+    thread.start()
+    while not steps:
+        time.sleep(0.005)
+    started = time.monotonic()
+    with gate.hold("design"):
+        waited = time.monotonic() - started
+    thread.join(5)
+
+    assert outcome == ["layout pool refill yielded to a waiting request"]
+    assert waited < 0.5
+    assert len(steps) < 30
+    assert pool.stats()['slots'][0]['ready'] == 0
@@ -0,0 +1,90 @@
+import io
+import threading
+import time
+
+from PIL import Image
+import pytest
+
+from model_registry import MODEL_FAILED, MODEL_LOADING, ModelRegistry, ModelUnavailable
+
+
+def failing_loader():
+    raise OSError("weights not found")
+
+
+def test_require_reports_the_load_error():
+    registry = ModelRegistry()
+    registry.register("ok", lambda: "model")
+    registry.register("broken", failing_loader)
+    assert registry.require("ok") == ["model"]
+    with pytest.raises(ModelUnavailable, match="broken model failed to load: weights not found"):
+        registry.require("ok", "broken")
+    assert registry.status()["broken"]["state"] == MODEL_FAILED
+
+
+@pytest.fixture
+def failed_models(app_module, monkeypatch):
+    registry = ModelRegistry()
+    for name in ("depth_estimator", "design", "layout"):
+        registry.register(name, failing_loader)
+    monkeypatch.setattr(app_module, "model_registry", registry)
+    monkeypatch.setattr(app_module, "worker_pool", None)
+    monkeypatch.setattr(app_module, "USE_LOCAL_MODEL", True)
+
+
+def room_upload():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 180, 160)).save(buffer, format="PNG")
+    buffer.seek(0)
+    return {'image': (buffer, 'room.png'), 'prompt': 'sofa'}
+
+
+def test_generate_answers_503_when_design_models_failed(client, failed_models):
+    response = client.post('/api/generate', data=room_upload(), content_type='multipart/form-data')
+    assert response.status_code == 503
+    assert "failed to load: weights not found" in response.get_json()['error']
+
+
+def test_generate_layout_answers_503_when_layout_model_failed(client, failed_models):
+    response = client.post('/api/generate-layout', json={'total_area': 1000, 'room_count': '2 BHK'})
+    assert response.status_code == 503
+    assert response.get_json()['error'] == "layout model failed to load: weights not found"
+
+
+def test_demo_output_only_without_local_models(client):
+    response = client.post('/api/generate-layout', json={'total_area': 1000, 'room_count': '2 BHK'})
+    assert response.status_code == 200
+    assert response.get_json()['mode'] == 'demo'
+
+
+def test_health_answers_while_models_are_still_loading(app_module, client, monkeypatch):
+    release = threading.Event()
+
+    def blocked_loader():
+        release.wait(10)
+        return "model"
+
+    registry = ModelRegistry()
+    for name in ("depth_estimator", "design", "layout"):
+        registry.register(name, blocked_loader)
+    monkeypatch.setattr(app_module, "model_registry", registry)
+    monkeypatch.setattr(app_module, "worker_pool", None)
+    monkeypatch.setattr(app_module, "USE_LOCAL_MODEL", True)
+    monkeypatch.setattr(app_module, "MODEL_LOAD_MODE", "background")
+    warmup = registry.warm_up()
+    try:
+        deadline = time.monotonic() + 5
+        while registry.status()["depth_estimator"]["state"] != MODEL_LOADING:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        started = time.monotonic()
+        response = client.get('/api/health')
+        assert time.monotonic() - started < 1
+        assert response.status_code == 200
+        assert response.get_json()['ready'] is False
+        assert client.get('/api/ready').status_code == 503
+    finally:
+        release.set()
+        warmup.join(10)
+    assert client.get('/api/health').get_json()['ready'] is True
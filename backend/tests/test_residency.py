@@ -0,0 +1,109 @@
+import threading
+import time
+
+from residency import PipelineGate, ResidencyManager
+
+
+class FakeModule:
+    """Stands in for a torch module: a size, a weights label and a log of .to() calls."""
+
+    def __init__(self, name, size, weights=None, moves=None):
+        self.name = name
+        self.size = size
+        self.weights = weights or name
+        self.moves = moves if moves is not None else []
+
+    def to(self, device):
+        self.moves.append((self.name, device))
+        return self
+
+
+def make_manager(budget_bytes=None):
+    return ResidencyManager("cuda", budget_bytes, sizeof=lambda module: module.size,
+                            fingerprint=lambda module: module.weights)
+
+
+def test_identical_components_are_shared_and_counted_once():
+    moves = []
+    manager = make_manager()
+    vae = FakeModule("design-vae", 100, weights="sd15-vae", moves=moves)
+    manager.register_pipeline("design", {'unet': FakeModule("design-unet", 300, moves=moves), 'vae': vae})
+    resolved = manager.register_pipeline("layout", {
+        'unet': FakeModule("layout-unet", 300, moves=moves),
+        'vae': FakeModule("layout-vae", 100, weights="sd15-vae", moves=moves),
+    })
+    assert resolved['vae'] is vae
+
+    manager.activate("design")
+    manager.activate("layout")
+    assert manager.resident_bytes() == 700
+    assert manager.stats()['shared_components'] == 1
+    assert len(manager.stats()['components']) == 3
+    assert sorted(moves) == [("design-unet", "cuda"), ("design-vae", "cuda"), ("layout-unet", "cuda")]
+
+
+def test_least_recently_used_components_are_evicted_over_budget():
+    moves = []
+    manager = make_manager(budget_bytes=500)
+    manager.register_pipeline("design", {'unet': FakeModule("design-unet", 300, moves=moves)})
+    manager.register_pipeline("layout", {'unet': FakeModule("layout-unet", 200, moves=moves)})
+    manager.register_pipeline("refine", {'unet': FakeModule("refine-unet", 200, moves=moves)})
+
+    manager.activate("design")
+    manager.activate("layout")
+    manager.activate("design")
+    assert moves == [("design-unet", "cuda"), ("layout-unet", "cuda")]
+
+    # layout was used less recently than design, so it makes room for refine.
+    manager.activate("refine")
+    assert moves[2:] == [("layout-unet", "cpu"), ("refine-unet", "cuda")]
+    assert manager.resident_bytes() == 500
+    assert manager.evictions == 1
+
+    manager.activate("layout")
+    assert moves[4:] == [("design-unet", "cpu"), ("layout-unet", "cuda")]
+
+
+def test_gate_runs_waiters_for_the_current_pipeline_first():
+    gate = PipelineGate(max_consecutive=4)
+    order = []
+
+    def run(pipeline):
+        with gate.hold(pipeline):
+            order.append(pipeline)
+
+    threads = []
+    with gate.hold("design"):
+        for pipeline in ("layout", "design", "layout", "design"):
+            thread = threading.Thread(target=run, args=(pipeline,))
+            thread.start()
+            threads.append(thread)
+            while gate.stats()['waiting'] < len(threads):
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["design", "design", "layout", "layout"]
+    assert gate.reordered == 2
+
+
+def test_gate_switches_pipeline_after_max_consecutive_turns():
+    gate = PipelineGate(max_consecutive=2)
+    order = []
+
+    def run(pipeline):
+        with gate.hold(pipeline):
+            order.append(pipeline)
+
+    threads = []
+    with gate.hold("design"):
+        for pipeline in ("layout", "design", "design"):
+            thread = threading.Thread(target=run, args=(pipeline,))
+            thread.start()
+            threads.append(thread)
+            while gate.stats()['waiting'] < len(threads):
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+
+    assert order == ["design", "layout", "design"]
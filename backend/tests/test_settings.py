@@ -0,0 +1,61 @@
+def test_read_env_mapping_skips_bad_entries(app_module, monkeypatch, capsys):
+    monkeypatch.setenv("LAYOUT_POOL_WARM", "1000:2 BHK, abc:3 BHK,,1400")
+    pairs = app_module.read_env_mapping("LAYOUT_POOL_WARM", lambda area, room_count: (int(area), room_count))
+    assert pairs == [(1000, "2 BHK"), (1400, "")]
+    assert "Ignoring LAYOUT_POOL_WARM entry 'abc:3 BHK'" in capsys.readouterr().out
+
+
+def test_read_env_mapping_parses_the_default(app_module, monkeypatch):
+    monkeypatch.delenv("LAYOUT_POOL_WARM", raising=False)
+    assert app_module.read_env_mapping("LAYOUT_POOL_WARM", lambda key, value: (key, value), "a:1") == [("a", "1")]
+
+
+def test_profile_cfg_cutoffs_reject_bad_entries(app_module, monkeypatch, capsys):
+    monkeypatch.setenv("PROFILE_CFG_CUTOFFS", "fast:abc,turbo:0.5,balanced:1.5,Quality:0.8")
+    assert app_module.read_env_mapping("PROFILE_CFG_CUTOFFS", app_module.read_cfg_cutoff) == [("quality", 0.8)]
+    output = capsys.readouterr().out
+    for entry in ("fast:abc", "turbo:0.5", "balanced:1.5"):
+        assert f"Ignoring PROFILE_CFG_CUTOFFS entry '{entry}'" in output
+
+
+def test_endpoint_concurrency_skips_malformed_caps(app_module, monkeypatch, capsys):
+    monkeypatch.setenv("ENDPOINT_CONCURRENCY", "generate_room:abc,generate_layout:-1,:3,suggest_furniture_batch:0")
+    limits = app_module.read_env_mapping("ENDPOINT_CONCURRENCY", app_module.read_endpoint_limit)
+    assert limits == [("suggest_furniture_batch", 0)]
+    output = capsys.readouterr().out
+    for entry in ("generate_room:abc", "generate_layout:-1", ":3"):
+        assert f"Ignoring ENDPOINT_CONCURRENCY entry '{entry}'" in output
+
+
+def test_resolution_tiers_skip_bad_sides(app_module, monkeypatch, capsys):
+    monkeypatch.setenv("RESOLUTION_TIERS", "draft:abc,tiny:0,odd:500,Huge:1024")
+    assert app_module.read_env_mapping("RESOLUTION_TIERS", app_module.read_resolution_tier) == [("huge", 1024)]
+    output = capsys.readouterr().out
+    for entry in ("draft:abc", "tiny:0", "odd:500"):
+        assert f"Ignoring RESOLUTION_TIERS entry '{entry}'" in output
+
+
+def test_layout_pool_buckets_skip_bad_edges(app_module, monkeypatch, capsys):
+    monkeypatch.setenv("LAYOUT_POOL_BUCKETS", "400, 7OO,900,-5,1100")
+    assert app_module.read_env_list("LAYOUT_POOL_BUCKETS", app_module.read_bucket_edge) == [400, 900, 1100]
+    output = capsys.readouterr().out
+    for entry in ("7OO", "-5"):
+        assert f"Ignoring LAYOUT_POOL_BUCKETS entry '{entry}'" in output
+
+
+def test_cpu_threads_are_only_set_at_startup(app_module, monkeypatch):
+    import torch
+    from cpu_tuning import CPU_TUNING_PROFILES
+
+    assert app_module.cpu_threads is None
+    assert all((tuning.threads, tuning.interop_threads) == (0, 0) for tuning in CPU_TUNING_PROFILES.values())
+    monkeypatch.setattr(app_module, "device", "cpu")
+    monkeypatch.setattr(app_module, "cpu_threads", None)
+    before = (torch.get_num_threads(), torch.get_num_interop_threads())
+    try:
+        app_module.apply_cpu_threads()
+        assert (torch.get_num_threads(), torch.get_num_interop_threads()) == before
+        assert app_module.apply_cpu_threads(threads=1)['threads'] == 1
+        assert torch.get_num_threads() == 1
+    finally:
+        torch.set_num_threads(before[0])
@@ -0,0 +1,164 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from jobs import JobCancelled
+from worker_pool import WORKER_FAILED, WORKER_READY, WorkerCrashed, WorkerPool, WorkerSpec
+
+INIT = "stub_workers:init"
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(*specs, restart_delay=0.1, max_requeues=1):
+        pool = WorkerPool([WorkerSpec(name, pipelines) for name, pipelines in specs], INIT,
+                          restart_delay=restart_delay, poll_interval=0.02, max_requeues=max_requeues)
+        pool.start()
+        pools.append(pool)
+        wait_for(lambda: pool.settled())
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.stop()
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def run_in_thread(function, *args, **kwargs):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = function(*args, **kwargs)
+        except Exception as exc:
+            outcome['error'] = exc
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def submit(pool, *args, timeout=20, **kwargs):
+    """pool.submit that fails the test instead of hanging it."""
+    thread, outcome = run_in_thread(pool.submit, *args, **kwargs)
+    thread.join(timeout)
+    assert not thread.is_alive(), "submit did not finish"
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def worker_state(pool, name):
+    return next(worker for worker in pool.stats()['workers'] if worker['name'] == name)
+
+
+def test_routes_by_pipeline_and_forwards_progress(make_pool):
+    pool = make_pool(("design", ("design",)), ("layout", ("layout",)))
+    assert submit(pool, "design", "pid", {}) == worker_state(pool, "design")['pid']
+    assert submit(pool, "layout", "pid", {}) == worker_state(pool, "layout")['pid']
+    reports = []
+    submit(pool, "design", "steps", {'steps': 3, 'step_seconds': 0}, progress=lambda *args: reports.append(args))
+    wait_for(lambda: len(reports) == 3)
+    assert reports == [(1, 3), (2, 3), (3, 3)]
+
+
+def test_crashed_worker_is_restarted_and_its_queued_jobs_rerouted(make_pool):
+    pool = make_pool(("only", ("design",)))
+    first_pid = worker_state(pool, "only")['pid']
+    started = threading.Event()
+
+    running, running_outcome = run_in_thread(
+        pool.submit, "design", "steps", {'steps': 100}, progress=lambda *args: started.set(),
+    )
+    assert started.wait(10)
+    # Queued behind the running job on the same worker, so not started when it dies.
+    queued, queued_outcome = run_in_thread(pool.submit, "design", "pid", {})
+    wait_for(lambda: pool.queued() == 1)
+    os.kill(first_pid, signal.SIGKILL)
+    running.join(20)
+    queued.join(20)
+    assert not running.is_alive() and not queued.is_alive()
+
+    assert isinstance(running_outcome['error'], WorkerCrashed)
+    new_pid = queued_outcome['result']
+    assert new_pid != first_pid
+    state = worker_state(pool, "only")
+    assert state['state'] == WORKER_READY and state['pid'] == new_pid and state['restarts'] == 1
+    assert pool.stats()['crashes'] == 1 and pool.stats()['requeued'] == 1
+    assert submit(pool, "design", "pid", {}) == new_pid
+
+
+def test_queued_job_is_rerouted_at_most_max_requeues_times(make_pool):
+    pool = make_pool(("only", ("design",)), max_requeues=0)
+    started = threading.Event()
+    running, _ = run_in_thread(pool.submit, "design", "steps", {'steps': 100}, progress=lambda *args: started.set())
+    assert started.wait(10)
+    queued, queued_outcome = run_in_thread(pool.submit, "design", "pid", {})
+    wait_for(lambda: pool.queued() == 1)
+    os.kill(worker_state(pool, "only")['pid'], signal.SIGKILL)
+    running.join(20)
+    queued.join(20)
+    assert not queued.is_alive()
+    assert isinstance(queued_outcome['error'], WorkerCrashed)
+    assert pool.stats()['requeued'] == 0
+
+
+def test_job_that_kills_its_worker_fails_and_others_go_elsewhere(make_pool):
+    pool = make_pool(("a", ("design",)), ("b", ("design",)), restart_delay=5)
+    with pytest.raises(WorkerCrashed):
+        submit(pool, "design", "crash", {})
+    # The job had started, so it is not handed to the other worker to kill it too.
+    crashed = next(worker for worker in pool.stats()['workers'] if worker['state'] != WORKER_READY)
+    survivor = next(worker for worker in pool.stats()['workers'] if worker['state'] == WORKER_READY)
+    # While the crashed worker waits to restart, everything runs on the other one.
+    assert {submit(pool, "design", "pid", {}) for _ in range(3)} == {survivor['pid']}
+    assert crashed['restarts'] == 0 and crashed['failed'] == 1
+    assert pool.stats()['crashes'] == 1 and pool.stats()['requeued'] == 0
+
+
+def test_cancel_reaches_the_running_job(make_pool):
+    pool = make_pool(("only", ("design",)))
+    started = threading.Event()
+    cancelled = threading.Event()
+
+    def cancel_check():
+        if cancelled.is_set():
+            raise JobCancelled("test")
+
+    thread, outcome = run_in_thread(
+        pool.submit, "design", "steps", {'steps': 200}, progress=lambda *args: started.set(), cancel_check=cancel_check,
+    )
+    assert started.wait(10)
+    cancelled.set()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert isinstance(outcome['error'], JobCancelled)
+    assert submit(pool, "design", "pid", {}) == worker_state(pool, "only")['pid']
+
+
+def test_worker_whose_models_fail_stays_failed(make_pool):
+    pool = make_pool(("broken", ("broken",)), ("design", ("design",)))
+    assert worker_state(pool, "broken")['state'] == WORKER_FAILED
+    assert pool.unavailable("broken") == "worker broken failed to start: OSError: weights not found"
+    assert pool.unavailable("design") is None
+    assert pool.ready("design") and not pool.ready("broken")
+    assert pool.unavailable("layout") == "no inference worker serves layout"
+    with pytest.raises(RuntimeError, match="No inference worker serves the broken pipeline"):
+        submit(pool, "broken", "pid", {})
+
+
+def test_health_reports_readiness_from_the_workers(make_pool, app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "worker_pool", make_pool(("layout", ("layout",))))
+    health = client.get('/api/health').get_json()
+    assert health['layout_ready'] is True and health['depth_estimator_ready'] is False
@@ -0,0 +1,86 @@
+"""Bounded decoding of uploaded room photos.
+
+``decode_upload`` reads only the image header before deciding to decode,
+so oversized images are rejected without allocating their pixels. JPEGs
+are decoded at a reduced DCT scale close to the target size (``draft``);
+other formats get an integer ``reduce`` before the final resample. The
+EXIF orientation is applied to the small result instead of the full photo.
+The target size can depend on the upright image's shape (resolution buckets).
+"""
+import warnings
+
+from PIL import Image, UnidentifiedImageError
+
+# The final resample starts from at least this multiple of the target size,
+# so the cheap draft / reduce step does not cost visible sharpness.
+REDUCING_GAP = 2.0
+EXIF_ORIENTATION = 0x0112
+# Same transposes as PIL.ImageOps.exif_transpose, applied after resizing.
+ORIENTATION_TRANSPOSES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+SWAPS_AXES = (5, 6, 7, 8)
+
+
+class InvalidUpload(ValueError):
+    """The upload is not an image Pillow can decode."""
+
+
+class UploadTooLarge(ValueError):
+    """The upload's header reports more pixels than allowed."""
+
+
+def open_upload(stream, max_pixels):
+    """Open ``stream`` lazily (header only) and check its pixel count."""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            image = Image.open(stream)
+    except Image.DecompressionBombError as e:
+        raise UploadTooLarge(f"Image exceeds {max_pixels} pixels") from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidUpload("Uploaded file is not a supported image") from e
+    width, height = image.size
+    if width * height > max_pixels:
+        raise UploadTooLarge(f"Image is {width}x{height} ({width * height} pixels); the limit is {max_pixels}")
+    return image
+
+
+def exif_orientation(image):
+    try:
+        return image.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return 1
+
+
+def decode_upload(stream, size, max_pixels, resample=Image.Resampling.BICUBIC):
+    """Decode an uploaded image to an upright RGB image of exactly ``size``.
+
+    ``size`` is a (width, height) pair or a function of the upright image's
+    (width, height) returning one, read from the header before decoding.
+    Raises UploadTooLarge before decoding anything when the image has more
+    than ``max_pixels`` pixels, and InvalidUpload for unreadable files.
+    """
+    image = open_upload(stream, max_pixels)
+    orientation = exif_orientation(image)
+    if callable(size):
+        width, height = image.size
+        size = size(height, width) if orientation in SWAPS_AXES else size(width, height)
+    # Work in the stored orientation and transpose the small result at the end.
+    stored_size = (size[1], size[0]) if orientation in SWAPS_AXES else tuple(size)
+    try:
+        image.draft("RGB", stored_size)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image = image.resize(stored_size, resample, reducing_gap=REDUCING_GAP)
+    except (OSError, SyntaxError) as e:
+        raise InvalidUpload("Uploaded image is truncated or corrupt") from e
+    if orientation in ORIENTATION_TRANSPOSES:
+        image = image.transpose(ORIENTATION_TRANSPOSES[orientation])
+    return image
@@ -0,0 +1,428 @@
+"""Inference worker processes fed over local IPC queues.
+
+With a worker pool the HTTP process keeps request parsing, caching and
+image encoding, and the denoising runs in N worker processes. Each worker
+loads its own pipelines, serves one or more of them ("design", "layout")
+and runs one job at a time with its own torch thread count. A job goes to
+the least busy live worker that serves its pipeline. A supervisor thread
+restarts workers that exit: the job a dead worker was running fails with
+``WorkerCrashed`` and the jobs it had not started yet are routed again,
+at most ``max_requeues`` times each.
+"""
+import functools
+import importlib
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import sys
+import threading
+import time
+import traceback
+
+from jobs import CancelToken, JobCancelled
+
+PROCESS_NAME_PREFIX = "inference-worker-"
+
+WORKER_STARTING = "starting"
+WORKER_READY = "ready"
+WORKER_RESTARTING = "restarting"
+WORKER_FAILED = "failed"
+
+# Exceptions that keep their type across the process boundary; anything
+# else is re-raised in the caller as RuntimeError.
+ERROR_TYPES = {'JobCancelled': JobCancelled, 'ValueError': ValueError}
+
+
+class WorkerCrashed(Exception):
+    """Raised for a job whose worker process died while running it."""
+
+
+def in_worker_process():
+    """True inside a pool worker, already while it re-imports the parent's main module."""
+    return multiprocessing.current_process().name.startswith(PROCESS_NAME_PREFIX)
+
+
+class WorkerSpec:
+    """One worker process: a unique ``name``, the pipelines it serves and its thread count."""
+
+    def __init__(self, name, pipelines, threads=1):
+        self.name = name
+        self.pipelines = tuple(pipelines)
+        self.threads = threads
+
+
+def load_initializer(path):
+    """Resolve a "module:function" initializer inside the worker."""
+    module_name, _, function_name = path.partition(":")
+    # Under "spawn" the parent's main script has already been imported as
+    # __mp_main__; reuse it rather than importing the same file twice.
+    main = sys.modules.get("__mp_main__")
+    main_file = getattr(main, "__file__", None) or ""
+    if os.path.splitext(os.path.basename(main_file))[0] == module_name:
+        sys.modules.setdefault(module_name, main)
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _emit_progress(events, job_id, *args):
+    events.put(('progress', job_id, args))
+
+
+def worker_main(spec, initializer, requests, events, running):
+    """Entry point of a worker process.
+
+    ``initializer(pipelines, threads)`` loads the models and returns
+    ``{kind: handler}``; ``handler(payload, progress, cancel_check)`` runs
+    one job. Requests are ("run", id, kind, payload, wants_progress),
+    ("cancel", id) or None to stop. ``running`` is shared memory holding
+    the id of the job in progress (0 when idle).
+    """
+    try:
+        handlers = load_initializer(initializer)(spec.pipelines, spec.threads)
+    except Exception as exc:
+        traceback.print_exc()
+        events.put(('failed', None, f"{type(exc).__name__}: {exc}"))
+        return
+    events.put(('ready', None, os.getpid()))
+
+    jobs = queue.Queue()
+    tokens = {}
+    lock = threading.Lock()
+
+    def listen():
+        # Runs beside the job loop so a cancel reaches the job in progress.
+        while True:
+            message = requests.get()
+            if message is None:
+                jobs.put(None)
+                return
+            if message[0] == 'run':
+                with lock:
+                    tokens[message[1]] = CancelToken()
+                jobs.put(message)
+            elif message[0] == 'cancel':
+                with lock:
+                    token = tokens.get(message[1])
+                if token is not None:
+                    token.cancel("explicit")
+
+    threading.Thread(target=listen, name="worker-requests", daemon=True).start()
+
+    while True:
+        message = jobs.get()
+        if message is None:
+            return
+        _, job_id, kind, payload, wants_progress = message
+        with lock:
+            token = tokens[job_id]
+        # Written straight to shared memory: the 'started' event goes through
+        # the queue's feeder thread and is lost if the job kills the process.
+        running.value = job_id
+        events.put(('started', job_id, None))
+        progress = functools.partial(_emit_progress, events, job_id) if wants_progress else None
+        try:
+            token.raise_if_cancelled()
+            # Pickle here so an unpicklable result is reported, not lost in the feeder thread.
+            result = pickle.dumps(handlers[kind](payload, progress, token.raise_if_cancelled))
+        except Exception as exc:
+            events.put(('error', job_id, (type(exc).__name__, str(exc))))
+        else:
+            events.put(('result', job_id, result))
+        finally:
+            running.value = 0
+            with lock:
+                tokens.pop(job_id, None)
+
+
+class _Pending:
+    def __init__(self, job_id, progress, attempt):
+        self.id = job_id
+        self.progress = progress
+        self.attempt = attempt
+        self.worker = None
+        self.started = False
+        self.requeue = False
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class _Worker:
+    def __init__(self, spec):
+        self.spec = spec
+        self.process = None
+        self.reader = None
+        self.requests = None
+        self.events = None
+        self.running = None
+        self.state = WORKER_STARTING
+        self.pid = None
+        self.error = None
+        self.jobs = {}
+        self.restart_at = None
+        self.restarts = 0
+        self.completed = 0
+        self.failed = 0
+
+
+class WorkerPool:
+    """Runs jobs in worker processes built from ``specs``.
+
+    ``initializer`` is the "module:function" each worker calls to load its
+    models (see ``worker_main``). A crashed worker is restarted after
+    ``restart_delay`` seconds; one whose initializer raised stays failed.
+    A job the crashed worker had not started is routed again up to
+    ``max_requeues`` times before it fails with ``WorkerCrashed`` too.
+    """
+
+    def __init__(self, specs, initializer, restart_delay=1.0, poll_interval=0.05, start_method="spawn",
+                 max_requeues=1):
+        names = [spec.name for spec in specs]
+        if len(set(names)) != len(names):
+            raise ValueError("Worker names must be unique")
+        self.initializer = initializer
+        self.restart_delay = restart_delay
+        self.poll_interval = poll_interval
+        self.max_requeues = max_requeues
+        self.crashes = 0
+        self.requeued = 0
+        self._context = multiprocessing.get_context(start_method)
+        self._workers = [_Worker(spec) for spec in specs]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._supervisor = None
+
+    def start(self):
+        with self._lock:
+            if self._supervisor is not None:
+                return
+            for worker in self._workers:
+                self._new_queues(worker)
+                self._spawn(worker)
+            self._supervisor = threading.Thread(target=self._supervise, name="worker-supervisor", daemon=True)
+            self._supervisor.start()
+
+    def stop(self, timeout=5.0):
+        self._stopping = True
+        with self._lock:
+            workers = [worker for worker in self._workers if worker.process is not None]
+        for worker in workers:
+            worker.requests.put(None)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def unavailable(self, pipeline):
+        """Why ``pipeline`` cannot be served (no worker for it, or all failed to start), or None."""
+        with self._lock:
+            workers = [worker for worker in self._workers if pipeline in worker.spec.pipelines]
+            if any(worker.state != WORKER_FAILED for worker in workers):
+                return None
+            if not workers:
+                return f"no inference worker serves {pipeline}"
+            return "; ".join(f"worker {worker.spec.name} failed to start: {worker.error}" for worker in workers)
+
+    def ready(self, pipeline):
+        """True if a worker serving ``pipeline`` has loaded its models."""
+        with self._lock:
+            return any(pipeline in worker.spec.pipelines and worker.state == WORKER_READY for worker in self._workers)
+
+    def idle(self, pipeline):
+        """True if a ready worker for ``pipeline`` has nothing to do."""
+        with self._lock:
+            return any(pipeline in worker.spec.pipelines and worker.state == WORKER_READY and not worker.jobs
+                       for worker in self._workers)
+
+    def settled(self):
+        """True once no worker is still loading its models."""
+        with self._lock:
+            return all(worker.state in (WORKER_READY, WORKER_FAILED) for worker in self._workers)
+
+    def queued(self):
+        """Jobs handed to a worker that has not started them yet."""
+        with self._lock:
+            return sum(1 for worker in self._workers for pending in worker.jobs.values() if not pending.started)
+
+    def submit(self, pipeline, kind, payload, progress=None, cancel_check=None):
+        """Run ``kind`` on a worker serving ``pipeline`` and wait for its result.
+
+        ``progress(*args)`` gets whatever the handler reports. ``cancel_check``
+        is polled while waiting; once it raises JobCancelled the cancel is
+        forwarded to the worker, which stops at its next cancellation check.
+        """
+        for attempt in itertools.count():
+            pending = self._dispatch(pipeline, kind, payload, progress, attempt)
+            cancel_sent = False
+            while not pending.done.wait(self.poll_interval if cancel_check is not None else None):
+                if not cancel_sent and self._cancel_requested(cancel_check):
+                    cancel_sent = True
+                    with self._lock:
+                        requests = pending.worker.requests
+                    requests.put(('cancel', pending.id))
+            if pending.requeue:
+                continue
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+    def stats(self):
+        with self._lock:
+            workers = [
+                {
+                    'name': worker.spec.name,
+                    'pipelines': list(worker.spec.pipelines),
+                    'threads': worker.spec.threads,
+                    'pid': worker.pid,
+                    'state': worker.state,
+                    'error': worker.error,
+                    'running': sum(1 for pending in worker.jobs.values() if pending.started),
+                    'queued': sum(1 for pending in worker.jobs.values() if not pending.started),
+                    'completed': worker.completed,
+                    'failed': worker.failed,
+                    'restarts': worker.restarts,
+                }
+                for worker in self._workers
+            ]
+            return {'workers': workers, 'crashes': self.crashes, 'requeued': self.requeued}
+
+    @staticmethod
+    def _cancel_requested(cancel_check):
+        try:
+            cancel_check()
+        except JobCancelled:
+            return True
+        return False
+
+    def _dispatch(self, pipeline, kind, payload, progress, attempt=0):
+        with self._lock:
+            candidates = [
+                worker for worker in self._workers
+                if pipeline in worker.spec.pipelines and worker.state != WORKER_FAILED
+            ]
+            if not candidates:
+                raise RuntimeError(f"No inference worker serves the {pipeline} pipeline")
+            worker = min(candidates, key=lambda worker: (worker.state != WORKER_READY, len(worker.jobs)))
+            pending = _Pending(next(self._ids), progress, attempt)
+            pending.worker = worker
+            worker.jobs[pending.id] = pending
+            worker.requests.put(('run', pending.id, kind, payload, progress is not None))
+            return pending
+
+    def _new_queues(self, worker):
+        # Fresh queues on every restart: a killed process can leave a queue's lock held.
+        worker.requests = self._context.Queue()
+        worker.events = self._context.Queue()
+        worker.running = self._context.RawValue('q', 0)
+
+    def _spawn(self, worker):
+        process = self._context.Process(
+            target=worker_main,
+            args=(worker.spec, self.initializer, worker.requests, worker.events, worker.running),
+            name=PROCESS_NAME_PREFIX + worker.spec.name,
+            daemon=True,
+        )
+        process.start()
+        worker.process = process
+        worker.pid = process.pid
+        worker.state = WORKER_STARTING
+        worker.restart_at = None
+        worker.reader = threading.Thread(
+            target=self._read_events, args=(worker, process, worker.events),
+            name=f"worker-events-{worker.spec.name}", daemon=True,
+        )
+        worker.reader.start()
+
+    def _read_events(self, worker, process, events):
+        while True:
+            try:
+                event, job_id, data = events.get(timeout=0.5)
+            except queue.Empty:
+                if not process.is_alive():
+                    return
+                continue
+            if event == 'progress':
+                with self._lock:
+                    pending = worker.jobs.get(job_id)
+                if pending is not None and pending.progress is not None:
+                    try:
+                        pending.progress(*data)
+                    except Exception as exc:
+                        print(f"Progress callback failed: {exc}")
+                continue
+
+            with self._lock:
+                if event == 'ready':
+                    worker.state = WORKER_READY
+                    print(f"Inference worker {worker.spec.name} ready (pid {data})")
+                elif event == 'failed':
+                    worker.state = WORKER_FAILED
+                    worker.error = data
+                    print(f"Inference worker {worker.spec.name} failed to start: {data}")
+                elif event == 'started':
+                    if job_id in worker.jobs:
+                        worker.jobs[job_id].started = True
+                elif event == 'result':
+                    pending = worker.jobs.pop(job_id, None)
+                    if pending is not None:
+                        worker.completed += 1
+                        pending.finish(result=pickle.loads(data))
+                elif event == 'error':
+                    pending = worker.jobs.pop(job_id, None)
+                    if pending is not None:
+                        worker.failed += 1
+                        name, message = data
+                        pending.finish(error=ERROR_TYPES.get(name, RuntimeError)(message))
+
+    def _supervise(self):
+        while not self._stopping:
+            time.sleep(self.poll_interval)
+            for worker in self._workers:
+                process = worker.process
+                if worker.restart_at is not None:
+                    if time.monotonic() >= worker.restart_at and not self._stopping:
+                        with self._lock:
+                            worker.restarts += 1
+                            self._spawn(worker)
+                    continue
+                if process is None or process.is_alive() or self._stopping:
+                    continue
+                # Let the reader deliver whatever the worker sent before it exited.
+                worker.reader.join()
+                self._handle_exit(worker, process)
+
+    def _handle_exit(self, worker, process):
+        with self._lock:
+            running = worker.jobs.get(worker.running.value)
+            if running is not None:
+                running.started = True
+            orphans = list(worker.jobs.values())
+            worker.jobs.clear()
+            worker.process = None
+            if worker.state == WORKER_FAILED:
+                error = RuntimeError(f"Inference worker {worker.spec.name} failed to start: {worker.error}")
+            else:
+                self.crashes += 1
+                worker.state = WORKER_RESTARTING
+                worker.restart_at = time.monotonic() + self.restart_delay
+                error = WorkerCrashed(
+                    f"Inference worker {worker.spec.name} exited with code {process.exitcode}"
+                )
+                self._new_queues(worker)
+                print(f"{error}; restarting in {self.restart_delay:g}s")
+
+            for pending in orphans:
+                if pending.started or worker.state == WORKER_FAILED or pending.attempt >= self.max_requeues:
+                    worker.failed += 1
+                    pending.finish(error=error)
+                else:
+                    self.requeued += 1
+                    pending.requeue = True
+                    pending.done.set()
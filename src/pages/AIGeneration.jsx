@@ -4,26 +4,16 @@ import { motion } from 'framer-motion'
 import { Upload, Sparkles, Loader2, Download, Share2, IndianRupee } from 'lucide-react'
 import axios from 'axios'
 
-// Utility to convert data URI to blob URL for better performance
-const dataURIToBlob = (dataURI) => {
-  const byteString = atob(dataURI.split(',')[1])
-  const mimeString = dataURI.split(',')[0].match(/:(.*?);/)[1]
-  const ab = new ArrayBuffer(byteString.length)
-  const ia = new Uint8Array(ab)
-  for (let i = 0; i < byteString.length; i++) {
-    ia[i] = byteString.charCodeAt(i)
-  }
-  return new Blob([ab], { type: mimeString })
-}
-
-const dataToBlobURL = (dataURI) => {
-  try {
-    const blob = dataURIToBlob(dataURI)
-    return URL.createObjectURL(blob)
-  } catch (error) {
-    console.error('Error converting data URI to blob URL:', error)
-    return dataURI // Fallback to original data URI
-  }
+const BACKEND_ORIGIN = 'http://localhost:5000'
+
+// Fetch the generated image (stored URL or legacy data URI) into a blob URL
+const fetchImageBlobURL = async (imageRef) => {
+  const url = imageRef.startsWith('data:') ? imageRef : `${BACKEND_ORIGIN}${imageRef}`
+  const blob = await fetch(url).then(r => {
+    if (!r.ok) throw new Error(`Image download failed (${r.status})`)
+    return r.blob()
+  })
+  return URL.createObjectURL(blob)
 }
 
 // Custom Before/After Comparison Component (replaces broken react-compare-image)
@@ -115,6 +105,8 @@ export default function AIGeneration() {
   const [showPricing, setShowPricing] = useState(false)
   const [estimatedPrice, setEstimatedPrice] = useState(null)
   const blobURLRef = useRef(null)
+  // request_id of the generation in flight, so leaving the page can cancel it
+  const generationIdRef = useRef(null)
   
   // Budget feature states
   const [budget, setBudget] = useState(100000)
@@ -136,6 +128,21 @@ export default function AIGeneration() {
     }
   }, [])
 
+  // Stop a running generation on the backend when the user navigates away
+  useEffect(() => {
+    const cancelGeneration = () => {
+      if (generationIdRef.current) {
+        navigator.sendBeacon(`${BACKEND_ORIGIN}/api/generate/${generationIdRef.current}/cancel`)
+        generationIdRef.current = null
+      }
+    }
+    window.addEventListener('pagehide', cancelGeneration)
+    return () => {
+      window.removeEventListener('pagehide', cancelGeneration)
+      cancelGeneration()
+    }
+  }, [])
+
   const roomTypes = [
     'Living Room',
     'Bedroom',
@@ -255,9 +262,11 @@ export default function AIGeneration() {
       formData.append('prompt', finalPrompt)
       formData.append('room_type', roomType)
       formData.append('style', style)
+      generationIdRef.current = crypto.randomUUID()
+      formData.append('request_id', generationIdRef.current)
 
       // LOCAL BACKEND: Running on your RTX 3050 GPU
-      const BACKEND_URL = 'http://localhost:5000/api/generate'
+      const BACKEND_URL = `${BACKEND_ORIGIN}/api/generate`
 
       console.log('Sending generation request...')
       const response = await axios.post(BACKEND_URL, formData, {
@@ -269,7 +278,7 @@ export default function AIGeneration() {
       })
 
       console.log('Response received:', {
-        hasImage: !!response.data?.image,
+        hasImage: !!(response.data?.image_url || response.data?.image),
         hasPricing: !!response.data?.pricing,
         mode: response.data?.mode,
         message: response.data?.message
@@ -280,31 +289,30 @@ export default function AIGeneration() {
         throw new Error(response.data.error)
       }
 
-      if (!response.data?.image) {
+      const imageRef = response.data?.image_url || response.data?.image
+      if (!imageRef) {
         throw new Error('No image in response. Backend may be in demo mode.')
       }
 
-      // Validate that the image data is not empty
-      if (response.data.image.length < 100) {
-        throw new Error('Image data is too small or invalid')
-      }
-
-      console.log(`Image data received: ${response.data.image.substring(0, 50)}...`)
+      console.log(`Image received: ${imageRef.substring(0, 50)}...`)
 
-      // Convert data URI to blob URL for better performance
-      const blobURL = dataToBlobURL(response.data.image)
+      // Download the stored image once as a blob URL for display, download and share
+      const blobURL = await fetchImageBlobURL(imageRef)
       blobURLRef.current = blobURL
 
-      setGeneratedImage(response.data.image) // Keep original for download
-      setGeneratedImageBlobURL(blobURL) // Use blob URL for display
+      setGeneratedImage(blobURL)
+      setGeneratedImageBlobURL(blobURL)
       setEstimatedPrice(response.data.pricing)
       setShowComparison(true)
       console.log('Image display state updated successfully')
     } catch (error) {
+      // Cancelled because the user left the page: nothing to report
+      if (!generationIdRef.current && error.response?.status === 409) return
       console.error('Generation error:', error)
       const errorMsg = error.response?.data?.error || error.message || 'Failed to generate image'
       alert(`Generation failed: ${errorMsg}\n\nMake sure:\n1. Backend server is running\n2. GPU drivers are installed\n3. Models have finished downloading`)
     } finally {
+      generationIdRef.current = null
       setIsGenerating(false)
     }
   }
@@ -314,7 +322,7 @@ export default function AIGeneration() {
 
     try {
       const link = document.createElement('a')
-      link.href = generatedImage // Use original data URI for download
+      link.href = generatedImage
       link.download = `homelytics-design-${Date.now()}.png`
       document.body.appendChild(link)
       link.click()
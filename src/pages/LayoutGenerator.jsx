@@ -4,7 +4,8 @@ import axios from 'axios'
 import { Building2, Download, Loader2, Ruler, Sparkles, Wand2 } from 'lucide-react'
 
 const ROOM_OPTIONS = ['Let AI Decide', 'Studio', '1 BHK', '2 BHK', '3 BHK', '4 BHK', 'Villa']
-const BACKEND_URL = 'http://localhost:5000/api/generate-layout'
+const BACKEND_ORIGIN = 'http://localhost:5000'
+const BACKEND_URL = `${BACKEND_ORIGIN}/api/generate-layout`
 
 export default function LayoutGenerator() {
   const [totalArea, setTotalArea] = useState('')
@@ -30,7 +31,8 @@ export default function LayoutGenerator() {
         room_count: roomCount === 'Let AI Decide' ? null : roomCount,
       })
 
-      setLayouts(response.data.images || [])
+      const imageURLs = (response.data.image_urls || []).map((url) => `${BACKEND_ORIGIN}${url}`)
+      setLayouts(imageURLs.length ? imageURLs : response.data.images || [])
       setPromptUsed(response.data.prompt || '')
     } catch (requestError) {
       console.error('Layout generation error:', requestError)
@@ -40,13 +42,17 @@ export default function LayoutGenerator() {
     }
   }
 
-  const handleDownload = (image, index) => {
+  const handleDownload = async (image, index) => {
+    // Cross-origin URLs ignore the download attribute, so go through a blob URL.
+    const blob = await fetch(image).then((r) => r.blob())
+    const blobURL = URL.createObjectURL(blob)
     const link = document.createElement('a')
-    link.href = image
+    link.href = blobURL
     link.download = `homelytics-layout-${index + 1}-${Date.now()}.png`
     document.body.appendChild(link)
     link.click()
     document.body.removeChild(link)
+    URL.revokeObjectURL(blobURL)
   }
 
   return (